@@ -0,0 +1,247 @@
+import heapq
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Availability works on minutes since midnight, so a day is a list of
+# half-open (start, end) integer intervals
+
+# Slot length of a schedule that doesn't set one, and how long an appointment
+# without its own duration keeps the doctor busy
+DEFAULT_SLOT_MINUTES = 30
+APPOINTMENT_MINUTES = 30
+# Longest appointment, bounds how far back a booking can still block a slot
+MAX_APPOINTMENT_MINUTES = 8 * 60
+
+# Bookings are reserved, and cached availability stored, on a 5 minute grid
+TICK_MINUTES = 5
+
+# Longest date range served by one availability request
+MAX_RANGE_DAYS = 60
+
+Interval = Tuple[int, int]
+
+
+def to_minutes(value) -> int:
+    return value.hour * 60 + value.minute
+
+
+def to_datetime(day: date, minutes: int) -> datetime:
+    return datetime.combine(day, time.min) + timedelta(minutes=minutes)
+
+
+def merge(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort intervals and merge the ones that overlap or touch"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def first_overlap(intervals: Iterable[Interval]) -> Optional[Tuple[Interval, Interval]]:
+    """The first two intervals found to overlap in one sort and sweep, None if none do
+
+    Intervals that only touch don't overlap.
+    """
+    previous = None
+    for interval in sorted(intervals):
+        if previous is not None and interval[0] < previous[1]:
+            return previous, interval
+        if previous is None or interval[1] > previous[1]:
+            previous = interval
+    return None
+
+
+def busy_intervals(booked: Iterable) -> List[Interval]:
+    """Merged intervals covered by (appointment_time, duration_minutes) bookings"""
+    return merge(
+        (to_minutes(start), to_minutes(start) + (duration or APPOINTMENT_MINUTES))
+        for start, duration in booked
+    )
+
+
+def bookings_by_day(booked: Iterable) -> Dict[date, List[Tuple[datetime, int]]]:
+    """(appointment_time, duration) bookings grouped by every day they cover
+
+    A booking that runs past midnight also counts on the next day, as a
+    booking from midnight for the minutes left.
+    """
+    by_day = defaultdict(list)
+    for start, duration in booked:
+        duration = duration or APPOINTMENT_MINUTES
+        by_day[start.date()].append((start, duration))
+        end = start + timedelta(minutes=duration)
+        midnight = to_datetime(start.date() + timedelta(days=1), 0)
+        while midnight < end:
+            by_day[midnight.date()].append((midnight, (end - midnight) // timedelta(minutes=1)))
+            midnight += timedelta(days=1)
+    return by_day
+
+
+def covered_days(start: datetime, duration: Optional[int]) -> List[date]:
+    """Days a booking keeps the doctor busy on"""
+    return list(bookings_by_day([(start, duration)]))
+
+
+def subtract(window: Interval, busy: Sequence[Interval], busy_ends: Sequence[int]) -> List[Interval]:
+    """Parts of `window` not covered by the merged `busy` intervals"""
+    start, end = window
+    free = []
+    # First busy interval that ends after the window starts
+    i = bisect_right(busy_ends, start)
+    while start < end and i < len(busy) and busy[i][0] < end:
+        if busy[i][0] > start:
+            free.append((start, busy[i][0]))
+        start = max(start, busy[i][1])
+        i += 1
+    if start < end:
+        free.append((start, end))
+    return free
+
+
+def slot_starts(free: Interval, origin: int, duration: int):
+    """Starts of `duration` long slots on the grid `origin + k * duration` that fit inside `free`"""
+    start, end = free
+    first = origin + -(-(start - origin) // duration) * duration
+    return range(first, end - duration + 1, duration)
+
+
+def apply_exceptions(schedules, exceptions):
+    """One date's (schedules, blocked intervals) once its schedule exceptions apply
+
+    Extra clinics are added as schedules of their own; a day off without
+    times drops every schedule of the date.
+    """
+    schedules = list(schedules or ())
+    blocked = []
+    for exception in exceptions:
+        if exception.is_available:
+            schedules.append(exception)
+        elif exception.start_time is None:
+            return [], []
+        else:
+            blocked.append((to_minutes(exception.start_time), to_minutes(exception.end_time)))
+    return schedules, blocked
+
+
+def free_slots(schedules, booked, blocked: Iterable[Interval] = ()) -> List[Interval]:
+    """Sorted free (start, end) slots in minutes for one day's schedules and bookings
+
+    The booked intervals are merged once and each schedule window is swept
+    against them, so the cost grows with the number of bookings and slots
+    rather than their product. Slots keep to each schedule's own grid of
+    `slot_duration_minutes`, starting at its start time. `blocked` intervals
+    are treated like bookings.
+    """
+    busy = busy_intervals(booked)
+    if blocked:
+        busy = merge([*busy, *blocked])
+    busy_ends = [end for _, end in busy]
+    slots = set()
+    for schedule in schedules:
+        window = (to_minutes(schedule.start_time), to_minutes(schedule.end_time))
+        duration = schedule.slot_duration_minutes or DEFAULT_SLOT_MINUTES
+        for free in subtract(window, busy, busy_ends):
+            slots.update((start, start + duration) for start in slot_starts(free, window[0], duration))
+    return sorted(slots)
+
+
+def to_slots(day: date, slots: Iterable[Interval]) -> List[Tuple[datetime, datetime]]:
+    """(start, end) datetimes of `day` for slots in minutes"""
+    midnight = to_datetime(day, 0)
+    return [
+        (midnight + timedelta(minutes=start), midnight + timedelta(minutes=end))
+        for start, end in slots
+    ]
+
+
+def available_slots(day: date, schedules, booked, exceptions=()) -> List[Tuple[datetime, datetime]]:
+    """Bookable (start, end) slots of `day` for a doctor's schedules, bookings and schedule exceptions"""
+    blocked = ()
+    if exceptions:
+        schedules, blocked = apply_exceptions(schedules, exceptions)
+    return to_slots(day, free_slots(schedules, booked, blocked))
+
+
+def _day_slots(day: date, schedules_by_weekday, exceptions_by_day, booked_by_day) -> List[Interval]:
+    day_schedules = schedules_by_weekday.get(day.strftime("%A").lower())
+    day_exceptions = exceptions_by_day.get(day)
+    blocked = ()
+    if day_exceptions:
+        day_schedules, blocked = apply_exceptions(day_schedules, day_exceptions)
+    if not day_schedules:
+        return []
+    return free_slots(day_schedules, booked_by_day.get(day, ()), blocked)
+
+
+def free_slots_by_day(days: Iterable[date], schedules, booked, exceptions=()) -> Dict[date, List[Interval]]:
+    """Free slots in minutes for each of `days`
+
+    `schedules` are the doctor's weekly schedules, `booked` every
+    (appointment_time, duration) booking on those days, including ones from
+    the day before that run past midnight, and `exceptions` the schedule
+    exceptions dated on them, all in any order.
+    """
+    schedules_by_weekday = defaultdict(list)
+    for schedule in schedules:
+        schedules_by_weekday[schedule.day].append(schedule)
+    exceptions_by_day = defaultdict(list)
+    for exception in exceptions:
+        exceptions_by_day[exception.date].append(exception)
+    booked_by_day = bookings_by_day(booked)
+
+    return {day: _day_slots(day, schedules_by_weekday, exceptions_by_day, booked_by_day) for day in days}
+
+
+def _doctor_slots(doctor_id: int, first_day: date, last_day: date, schedules_by_weekday, exceptions_by_day,
+                  booked_by_day, not_before: datetime):
+    # Lazily yields (start, end, doctor_id) in time order, one day at a time.
+    # Datetimes are only built for the slots the heap actually pulls.
+    day = first_day
+    while day <= last_day:
+        slots = _day_slots(day, schedules_by_weekday, exceptions_by_day, booked_by_day)
+        if slots:
+            midnight = to_datetime(day, 0)
+            for start, end in slots:
+                slot_start = midnight + timedelta(minutes=start)
+                if slot_start >= not_before:
+                    yield slot_start, midnight + timedelta(minutes=end), doctor_id
+        day += timedelta(days=1)
+
+
+def first_available(first_day: date, last_day: date, not_before: datetime, schedules, booked, limit: int,
+                    exceptions=()):
+    """The `limit` earliest (start, end, doctor_id) slots across doctors
+
+    `schedules` are the doctors' weekly schedules, `booked` their
+    (doctor_id, appointment_time, duration) bookings and `exceptions` their
+    schedule exceptions between the two days. Each doctor's slots are
+    generated lazily and merged on a heap, so only as many days are computed
+    as it takes to fill `limit`.
+    """
+    schedules_by_doctor = defaultdict(lambda: defaultdict(list))
+    for schedule in schedules:
+        schedules_by_doctor[schedule.doctor_id][schedule.day].append(schedule)
+    exceptions_by_doctor = defaultdict(lambda: defaultdict(list))
+    for exception in exceptions:
+        exceptions_by_doctor[exception.doctor_id][exception.date].append(exception)
+        # Doctors with only extra clinics still get a generator
+        schedules_by_doctor[exception.doctor_id]
+    booked_by_doctor = defaultdict(list)
+    for doctor_id, booked_time, duration in booked:
+        booked_by_doctor[doctor_id].append((booked_time, duration))
+
+    generators = [
+        _doctor_slots(
+            doctor_id, first_day, last_day, by_weekday, exceptions_by_doctor.get(doctor_id, {}),
+            bookings_by_day(booked_by_doctor.get(doctor_id, ())), not_before
+        )
+        for doctor_id, by_weekday in schedules_by_doctor.items()
+    ]
+    return list(islice(heapq.merge(*generators), limit))
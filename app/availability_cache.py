@@ -0,0 +1,336 @@
+import logging
+import os
+import threading
+import time
+from datetime import date
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import availability, models
+from app.cache import TTLCache
+from app.database import has_writes
+from app.metrics import Counters
+
+logger = logging.getLogger(__name__)
+
+# Computed availability per doctor-day is kept for this many seconds, 0 disables the cache.
+# Without a shared store, bookings made through other workers show up after at most this long.
+AVAILABILITY_CACHE_TTL = float(os.environ.get("AVAILABILITY_CACHE_TTL", 30))
+AVAILABILITY_CACHE_SIZE = int(os.environ.get("AVAILABILITY_CACHE_SIZE", 50000))
+# Redis URL of a store shared by every worker (needs `pip install redis`)
+AVAILABILITY_CACHE_REDIS_URL = os.environ.get("AVAILABILITY_CACHE_REDIS_URL")
+KEY_PREFIX = "medilink:availability:"
+
+# A day's free slots are stored as one bitmap of 5 minute ticks (36 bytes)
+# per slot length, each set bit marking a slot start
+TICK_MINUTES = availability.TICK_MINUTES
+TICKS_PER_DAY = 24 * 60 // TICK_MINUTES
+BITMAP_BYTES = TICKS_PER_DAY // 8
+LENGTH_BYTES = 2
+
+# How long a worker waits for another worker's recompute of the same doctor
+# before computing itself
+RECOMPUTE_WAIT_SECONDS = 1.0
+RECOMPUTE_POLL_SECONDS = 0.02
+
+counters = Counters("hits", "misses", "recomputes", "invalidations", "errors")
+
+
+def encode(slots: Sequence[Tuple[int, int]]) -> Optional[bytes]:
+    """Bitmaps of (start, end) slots in minutes, or None when a start is off the 5 minute grid"""
+    bits_by_length = {}
+    for start, end in slots:
+        if start % TICK_MINUTES:
+            return None
+        length = end - start
+        bits_by_length[length] = bits_by_length.get(length, 0) | 1 << (start // TICK_MINUTES)
+    return b"".join(
+        length.to_bytes(LENGTH_BYTES, "little") + bits.to_bytes(BITMAP_BYTES, "little")
+        for length, bits in bits_by_length.items()
+    )
+
+
+def decode(data: bytes) -> List[Tuple[int, int]]:
+    """Sorted (start, end) slots in minutes"""
+    slots = []
+    for offset in range(0, len(data), LENGTH_BYTES + BITMAP_BYTES):
+        length = int.from_bytes(data[offset:offset + LENGTH_BYTES], "little")
+        bits = int.from_bytes(data[offset + LENGTH_BYTES:offset + LENGTH_BYTES + BITMAP_BYTES], "little")
+        while bits:
+            lowest = bits & -bits
+            start = (lowest.bit_length() - 1) * TICK_MINUTES
+            slots.append((start, start + length))
+            bits ^= lowest
+    slots.sort()
+    return slots
+
+
+# Every change to a doctor's appointments, schedules or schedule exceptions
+# bumps the doctor's generation. Entries are stored with the generation they
+# were computed under and only served while it is current, so a result
+# computed concurrently with a commit is never served after it.
+
+
+class LocalAvailabilityStore:
+    """Keeps availability in this worker process only"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, doctor_id: int, days: Sequence[date]):
+        generation = self._generations.get(doctor_id, 0)
+        found = {}
+        for day in days:
+            entry = self._entries.get((doctor_id, day))
+            if entry is not None and entry[0] == generation:
+                found[day] = entry[1]
+        return generation, found
+
+    def set(self, doctor_id: int, generation: int, bitmaps: Dict[date, bytes]):
+        for day, bitmap in bitmaps.items():
+            self._entries.set((doctor_id, day), (generation, bitmap))
+
+    def invalidate(self, doctor_ids):
+        with self._lock:
+            for doctor_id in doctor_ids:
+                self._generations[doctor_id] = self._generations.get(doctor_id, 0) + 1
+
+    def acquire(self, doctor_id: int) -> bool:
+        # The in-process single flight already covers this worker
+        return True
+
+    def release(self, doctor_id: int):
+        pass
+
+
+class RedisAvailabilityStore:
+    """Keeps availability in Redis for every worker, one hash per doctor"""
+
+    def __init__(self, url: str, ttl: float):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._ttl = max(1, int(ttl))
+
+    def _key(self, doctor_id: int) -> str:
+        return f"{KEY_PREFIX}{doctor_id}"
+
+    def get(self, doctor_id: int, days: Sequence[date]):
+        values = self._client.hmget(self._key(doctor_id), ["generation", *(day.isoformat() for day in days)])
+        generation = int(values[0] or 0)
+        found = {}
+        for day, value in zip(days, values[1:]):
+            if value is None:
+                continue
+            entry_generation, bitmap = value.split(b":", 1)
+            if int(entry_generation) == generation:
+                found[day] = bitmap
+        return generation, found
+
+    def set(self, doctor_id: int, generation: int, bitmaps: Dict[date, bytes]):
+        key = self._key(doctor_id)
+        pipe = self._client.pipeline()
+        pipe.hset(key, mapping={
+            day.isoformat(): str(generation).encode() + b":" + bitmap
+            for day, bitmap in bitmaps.items()
+        })
+        pipe.expire(key, self._ttl)
+        pipe.execute()
+
+    def invalidate(self, doctor_ids):
+        pipe = self._client.pipeline()
+        for doctor_id in doctor_ids:
+            pipe.hincrby(self._key(doctor_id), "generation", 1)
+            pipe.expire(self._key(doctor_id), self._ttl)
+        pipe.execute()
+
+    def acquire(self, doctor_id: int) -> bool:
+        lock_key = self._key(doctor_id) + ":lock"
+        return bool(self._client.set(lock_key, 1, nx=True, px=int(RECOMPUTE_WAIT_SECONDS * 1000)))
+
+    def release(self, doctor_id: int):
+        self._client.delete(self._key(doctor_id) + ":lock")
+
+
+def _create_store():
+    if AVAILABILITY_CACHE_REDIS_URL:
+        try:
+            return RedisAvailabilityStore(AVAILABILITY_CACHE_REDIS_URL, AVAILABILITY_CACHE_TTL)
+        except ImportError:
+            logger.warning("AVAILABILITY_CACHE_REDIS_URL is set but redis is not installed; availability is cached per worker")
+    return LocalAvailabilityStore(AVAILABILITY_CACHE_SIZE, AVAILABILITY_CACHE_TTL)
+
+
+store = _create_store()
+
+# One recompute per doctor at a time in this worker. Doctors share a fixed
+# set of locks, so it never grows; two doctors on one stripe only wait on
+# each other's recompute.
+FLIGHT_STRIPES = 64
+_flights = [threading.Lock() for _ in range(FLIGHT_STRIPES)]
+
+
+def _flight(doctor_id: int) -> threading.Lock:
+    return _flights[doctor_id % FLIGHT_STRIPES]
+
+
+def _lookup(doctor_id: int, days: Sequence[date]):
+    try:
+        return store.get(doctor_id, days)
+    except Exception:
+        counters.incr("errors")
+        logger.exception("Availability cache lookup failed")
+        return None, {}
+
+
+def _wait_for_other_worker(doctor_id: int, days: Sequence[date]):
+    # Another worker holds the recompute lock, poll for its result
+    deadline = time.monotonic() + RECOMPUTE_WAIT_SECONDS
+    generation, found = _lookup(doctor_id, days)
+    while len(found) < len(days) and time.monotonic() < deadline:
+        time.sleep(RECOMPUTE_POLL_SECONDS)
+        generation, found = _lookup(doctor_id, days)
+    return generation, found
+
+
+def get_or_compute(
+    db: Session,
+    doctor_id: int,
+    days: Sequence[date],
+    compute: Callable[[List[date]], Dict[date, List[Tuple[int, int]]]],
+) -> Dict[date, List[Tuple[int, int]]]:
+    """Free (start, end) slots in minutes for each of the doctor's `days`, computing only the days not cached
+
+    `compute` gets the missing days and returns their slots. A session that
+    has written in its transaction bypasses the cache: its reads see its own
+    uncommitted changes, and the commit below would end its transaction.
+    """
+    if AVAILABILITY_CACHE_TTL <= 0 or db.info.get("unit_of_work") or has_writes(db):
+        return compute(list(days))
+
+    _, found = _lookup(doctor_id, days)
+    if len(found) == len(days):
+        counters.incr("hits", len(days))
+        return {day: decode(found[day]) for day in days}
+    counters.incr("hits", len(found))
+    counters.incr("misses", len(days) - len(found))
+
+    with _flight(doctor_id):
+        # End the read transaction first: the generation must be read before
+        # the snapshot `compute` reads from is taken
+        db.commit()
+        missing = [day for day in days if day not in found]
+        generation, again = _lookup(doctor_id, missing)
+        found.update(again)
+        missing = [day for day in missing if day not in again]
+        if not missing:
+            return {day: decode(found[day]) for day in days}
+
+        acquired = True
+        if generation is not None:
+            try:
+                acquired = store.acquire(doctor_id)
+            except Exception:
+                logger.exception("Availability cache lock failed")
+            if not acquired:
+                generation, again = _wait_for_other_worker(doctor_id, missing)
+                found.update(again)
+                missing = [day for day in missing if day not in again]
+        try:
+            computed = compute(missing) if missing else {}
+            counters.incr("recomputes", len(missing))
+            bitmaps = {day: encode(slots) for day, slots in computed.items()}
+            bitmaps = {day: bitmap for day, bitmap in bitmaps.items() if bitmap is not None}
+            if generation is not None and bitmaps:
+                try:
+                    store.set(doctor_id, generation, bitmaps)
+                except Exception:
+                    counters.incr("errors")
+                    logger.exception("Availability cache store failed")
+        finally:
+            if acquired and generation is not None:
+                try:
+                    store.release(doctor_id)
+                except Exception:
+                    logger.exception("Availability cache unlock failed")
+
+    slots = {day: decode(bitmap) for day, bitmap in found.items()}
+    slots.update(computed)
+    return {day: slots[day] for day in days}
+
+
+def invalidate_doctors(doctor_ids):
+    """Drop the cached availability of these doctors on every day"""
+    doctor_ids = set(doctor_ids)
+    if not doctor_ids:
+        return
+    counters.incr("invalidations", len(doctor_ids))
+    try:
+        store.invalidate(doctor_ids)
+    except Exception:
+        # Other workers fall back to the TTL
+        counters.incr("errors")
+        logger.exception("Availability cache invalidation failed")
+
+
+# Appointment changes that affect which slots are free
+APPOINTMENT_FIELDS = ("doctor_id", "appointment_time", "duration_minutes", "status")
+
+
+def _affected_doctors(instance, fields=None):
+    state = inspect(instance)
+    doctor_ids = {instance.doctor_id}
+    history = state.attrs.doctor_id.history
+    doctor_ids.update(history.deleted or ())
+    if fields is not None and not any(state.attrs[field].history.has_changes() for field in fields):
+        return set()
+    return doctor_ids
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    doctor_ids = set()
+    for instance in session.new:
+        if isinstance(instance, (models.Appointment, models.DoctorSchedule, models.ScheduleException)):
+            doctor_ids |= _affected_doctors(instance)
+    for instance in session.dirty:
+        if isinstance(instance, models.Appointment):
+            doctor_ids |= _affected_doctors(instance, APPOINTMENT_FIELDS)
+        elif isinstance(instance, (models.DoctorSchedule, models.ScheduleException)):
+            doctor_ids |= _affected_doctors(instance, [attr.key for attr in inspect(instance).mapper.column_attrs])
+    for instance in session.deleted:
+        if isinstance(instance, (models.Appointment, models.DoctorSchedule, models.ScheduleException)):
+            doctor_ids |= _affected_doctors(instance)
+    doctor_ids.discard(None)
+    if doctor_ids:
+        invalidate_on_commit(session, doctor_ids)
+
+
+def invalidate_on_commit(session, doctor_ids):
+    """Invalidate these doctors when the session commits, for writes that bypass the unit of work"""
+    session.info.setdefault("invalidate_availability", set()).update(doctor_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    invalidate_doctors(session.info.pop("invalidate_availability", ()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("invalidate_availability", None)
+
+
+def get_availability_cache_stats():
+    data = counters.snapshot()
+    lookups = data["hits"] + data["misses"]
+    data.update(
+        hit_rate=data["hits"] / lookups if lookups else 0.0,
+        ttl_seconds=AVAILABILITY_CACHE_TTL,
+        store=type(store).__name__,
+    )
+    return data
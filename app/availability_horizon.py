@@ -0,0 +1,327 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import bindparam, delete, event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app import availability, availability_cache, models, reservations
+from app.database import engine
+from app.metrics import Counters
+
+logger = logging.getLogger(__name__)
+
+# Free slots of every doctor are kept materialized in availability_days for
+# this many days from today; days further out are computed on request
+AVAILABILITY_HORIZON_DAYS = int(os.environ.get("AVAILABILITY_HORIZON_DAYS", 90))
+# Seconds between refresh passes of an in-process job, 0 disables it. Every
+# worker would run its own, so with several workers leave it off and run
+# `python -m app.availability_horizon` from cron instead
+AVAILABILITY_HORIZON_REFRESH_SECONDS = float(os.environ.get("AVAILABILITY_HORIZON_REFRESH_SECONDS", 0))
+# Most stale doctor-days recomputed per pass
+AVAILABILITY_HORIZON_BATCH = int(os.environ.get("AVAILABILITY_HORIZON_BATCH", 2000))
+# A full refresh gives up after this many passes in a row store nothing,
+# when writes keep outpacing it
+MAX_IDLE_PASSES = 3
+
+counters = Counters("hits", "misses", "refreshed", "conflicts", "marked")
+
+days_table = models.AvailabilityDay.__table__
+
+
+def compute(db, doctor_id: int, days: Sequence[date]) -> Dict[date, List[Tuple[int, int]]]:
+    """Free (start, end) slots in minutes of the doctor's `days`, from schedules, exceptions and appointments
+
+    `db` is a Session or a Connection.
+    """
+    first_day, last_day = min(days), max(days)
+    schedules = db.execute(select(
+        models.DoctorSchedule.day,
+        models.DoctorSchedule.start_time,
+        models.DoctorSchedule.end_time,
+        models.DoctorSchedule.slot_duration_minutes,
+    ).filter(
+        models.DoctorSchedule.doctor_id == doctor_id,
+        models.DoctorSchedule.day.in_({day.strftime("%A").lower() for day in days}),
+        models.DoctorSchedule.is_available == True
+    )).all()
+    exceptions = db.execute(select(
+        models.ScheduleException.date,
+        models.ScheduleException.start_time,
+        models.ScheduleException.end_time,
+        models.ScheduleException.is_available,
+        models.ScheduleException.slot_duration_minutes,
+    ).filter(
+        models.ScheduleException.doctor_id == doctor_id,
+        models.ScheduleException.date >= first_day,
+        models.ScheduleException.date <= last_day
+    )).all()
+    booked = []
+    if schedules or any(exception.is_available for exception in exceptions):
+        booked = db.execute(select(models.Appointment.appointment_time, models.Appointment.duration_minutes).filter(
+            models.Appointment.doctor_id == doctor_id,
+            # Bookings from the evening before can run past midnight
+            models.Appointment.appointment_time >= datetime.combine(first_day, datetime.min.time())
+            - timedelta(minutes=availability.MAX_APPOINTMENT_MINUTES),
+            models.Appointment.appointment_time < datetime.combine(last_day + timedelta(days=1), datetime.min.time()),
+            models.Appointment.status.in_(reservations.ACTIVE_STATUSES)
+        )).all()
+    return availability.free_slots_by_day(days, schedules, booked, exceptions)
+
+
+def free_slots_by_day(db: Session, doctor_id: int, days: Sequence[date]) -> Dict[date, List[Tuple[int, int]]]:
+    """Free slots of the doctor's `days`: materialized days from one primary key range read, the rest computed"""
+    rows = db.execute(select(
+        models.AvailabilityDay.day,
+        models.AvailabilityDay.slots,
+        models.AvailabilityDay.is_stale,
+    ).filter(
+        models.AvailabilityDay.doctor_id == doctor_id,
+        models.AvailabilityDay.day >= min(days),
+        models.AvailabilityDay.day <= max(days)
+    )).all()
+    # Stale rows are skipped here rather than in SQL, so the read stays on the primary key
+    slots = {
+        row.day: availability_cache.decode(row.slots)
+        for row in rows if not row.is_stale and row.slots is not None
+    }
+    missing = [day for day in days if day not in slots]
+    counters.incr("hits", len(days) - len(missing))
+    if missing:
+        counters.incr("misses", len(missing))
+        slots.update(compute(db, doctor_id, missing))
+    return {day: slots[day] for day in days}
+
+
+def mark_stale(connection, doctor_days: Dict[int, set]):
+    """Bump the version of the given doctor-days so refreshes computed before the change are discarded
+
+    An empty set of days marks the doctor's whole horizon.
+    """
+    values = {"is_stale": True, "version": days_table.c.version + 1}
+    statements = []
+    whole_horizon = sorted(doctor_id for doctor_id, days in doctor_days.items() if not days)
+    if whole_horizon:
+        statements.append(update(days_table).where(days_table.c.doctor_id.in_(whole_horizon)))
+    for doctor_id in sorted(doctor_id for doctor_id, days in doctor_days.items() if days):
+        statements.append(update(days_table).where(
+            days_table.c.doctor_id == doctor_id,
+            days_table.c.day.in_(sorted(doctor_days[doctor_id])),
+        ))
+    for statement in statements:
+        result = connection.execute(statement.values(**values))
+        counters.incr("marked", max(result.rowcount, 0))
+
+
+def _insert_ignore():
+    # Rows another worker added meanwhile are left alone
+    return (
+        insert(days_table)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+
+
+def extend(connection, today: date) -> int:
+    """Add stale rows for doctor-days entering the horizon and drop the days before today, returns rows added
+
+    Slot reservations of the days before today are pruned along with them.
+    """
+    connection.execute(delete(days_table).where(days_table.c.day < today))
+    pruned = reservations.prune(connection, datetime.combine(today, datetime.min.time()))
+    if pruned:
+        logger.info(f"Pruned {pruned} past slot reservations")
+    horizon = [today + timedelta(days=offset) for offset in range(AVAILABILITY_HORIZON_DAYS)]
+    counts = dict(connection.execute(
+        select(days_table.c.doctor_id, func.count())
+        .where(days_table.c.day >= today, days_table.c.day <= horizon[-1])
+        .group_by(days_table.c.doctor_id)
+    ).all())
+    added = 0
+    for doctor_id in connection.scalars(select(models.Doctor.doctor_id)).all():
+        if counts.get(doctor_id, 0) >= len(horizon):
+            continue
+        existing = set(connection.scalars(
+            select(days_table.c.day).where(days_table.c.doctor_id == doctor_id, days_table.c.day >= today)
+        ).all())
+        rows = [
+            {"doctor_id": doctor_id, "day": day, "version": 0, "is_stale": True}
+            for day in horizon if day not in existing
+        ]
+        if rows:
+            connection.execute(_insert_ignore(), rows)
+            added += len(rows)
+    return added
+
+
+def refresh_stale(limit: int = AVAILABILITY_HORIZON_BATCH) -> Tuple[int, int]:
+    """Recompute up to `limit` stale doctor-days, returns how many were (picked up, stored)
+
+    Each row is only stored if its version is still the one read before
+    computing it; a change committed meanwhile leaves it stale for the next pass.
+    """
+    with engine.connect() as connection:
+        stale = connection.execute(
+            select(days_table.c.doctor_id, days_table.c.day, days_table.c.version)
+            .where(days_table.c.is_stale == True)
+            .order_by(days_table.c.day)
+            .limit(limit)
+        ).all()
+    versions = defaultdict(dict)
+    for doctor_id, day, version in stale:
+        versions[doctor_id][day] = version
+
+    stored = 0
+    cas = (
+        update(days_table)
+        .where(
+            days_table.c.doctor_id == bindparam("b_doctor_id"),
+            days_table.c.day == bindparam("b_day"),
+            days_table.c.version == bindparam("b_version"),
+        )
+        .values(slots=bindparam("b_slots"), is_stale=False, refreshed_at=bindparam("b_refreshed_at"))
+    )
+    for doctor_id, day_versions in versions.items():
+        # One short transaction per doctor
+        with engine.begin() as connection:
+            days = sorted(day_versions)
+            slots = compute(connection, doctor_id, days)
+            now = datetime.now()
+            params = [
+                {
+                    "b_doctor_id": doctor_id,
+                    "b_day": day,
+                    "b_version": day_versions[day],
+                    "b_slots": availability_cache.encode(slots[day]),
+                    "b_refreshed_at": now,
+                }
+                for day in days
+            ]
+            updated = connection.execute(cas, params).rowcount
+        stored += updated
+        counters.incr("conflicts", len(params) - updated)
+    counters.incr("refreshed", stored)
+    return len(stale), stored
+
+
+def refresh_all(limit: int = AVAILABILITY_HORIZON_BATCH) -> int:
+    """Refresh batches until no stale doctor-day is left, returns how many were stored
+
+    A batch whose rows all lost their version check to concurrent writes
+    stores nothing while rows are still stale, so only running out of stale
+    rows, or MAX_IDLE_PASSES batches in a row without progress, ends the run.
+    """
+    total = 0
+    idle_passes = 0
+    while idle_passes < MAX_IDLE_PASSES:
+        picked, stored = refresh_stale(limit)
+        if not picked:
+            break
+        total += stored
+        idle_passes = 0 if stored else idle_passes + 1
+    return total
+
+
+# (date, number of doctors) the horizon was last extended for in this worker
+_extended_for = None
+
+
+def refresh() -> int:
+    """One pass of the refresh job: extend the horizon when the day or the doctors changed, then refresh
+
+    Returns how many doctor-days were stored.
+    """
+    global _extended_for
+    today = date.today()
+    with engine.begin() as connection:
+        key = (today, connection.scalar(select(func.count()).select_from(models.Doctor)))
+        if key != _extended_for:
+            added = extend(connection, today)
+            if added:
+                logger.info(f"Availability horizon extended by {added} doctor-days")
+    _extended_for = key
+    return refresh_stale()[1]
+
+
+async def run_refresh_loop():
+    """Refresh the horizon every AVAILABILITY_HORIZON_REFRESH_SECONDS until cancelled"""
+    while True:
+        try:
+            await run_in_threadpool(refresh)
+        except Exception:
+            logger.exception("Availability horizon refresh failed")
+        await asyncio.sleep(AVAILABILITY_HORIZON_REFRESH_SECONDS)
+
+
+def _changed_values(state, key):
+    # Current value plus the one a pending change replaces
+    values = {getattr(state.obj(), key)}
+    values.update(state.attrs[key].history.deleted or ())
+    values.discard(None)
+    return values
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_changes(session, flush_context):
+    # Same transaction as the change, so a rollback also undoes the marks
+    doctor_days = defaultdict(set)
+    whole_horizon = set()
+    dirty = session.dirty
+    for instance in [*session.new, *dirty, *session.deleted]:
+        if isinstance(instance, models.DoctorSchedule):
+            whole_horizon |= _changed_values(inspect(instance), "doctor_id")
+        elif isinstance(instance, models.Appointment):
+            state = inspect(instance)
+            if instance in dirty and not any(
+                state.attrs[field].history.has_changes() for field in availability_cache.APPOINTMENT_FIELDS
+            ):
+                continue
+            days = {
+                day
+                for start in _changed_values(state, "appointment_time")
+                for duration in _changed_values(state, "duration_minutes") or {None}
+                for day in availability.covered_days(start, duration)
+            }
+            for doctor_id in _changed_values(state, "doctor_id"):
+                doctor_days[doctor_id] |= days
+        elif isinstance(instance, models.ScheduleException):
+            state = inspect(instance)
+            days = _changed_values(state, "date")
+            for doctor_id in _changed_values(state, "doctor_id"):
+                doctor_days[doctor_id] |= days
+    for doctor_id in whole_horizon:
+        doctor_days[doctor_id] = set()
+    if doctor_days:
+        mark_stale(session.connection(), doctor_days)
+
+
+def get_availability_horizon_stats():
+    data = counters.snapshot()
+    with engine.connect() as connection:
+        data["stale_days"] = connection.scalar(
+            select(func.count()).select_from(days_table).where(days_table.c.is_stale == True)
+        )
+    data.update(
+        horizon_days=AVAILABILITY_HORIZON_DAYS,
+        refresh_seconds=AVAILABILITY_HORIZON_REFRESH_SECONDS,
+    )
+    return data
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Refresh the materialized availability horizon")
+    parser.add_argument("--rebuild", action="store_true", help="mark every doctor-day stale first")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with engine.begin() as connection:
+        extend(connection, date.today())
+        if args.rebuild:
+            connection.execute(update(days_table).values(is_stale=True, version=days_table.c.version + 1))
+    logger.info(f"Refreshed {refresh_all()} doctor-days")
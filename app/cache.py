@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from app.metrics import Counters
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = Counters("hits", "misses", "evictions", "invalidations")
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.counters.incr("hits")
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+        self.counters.incr("misses")
+        return None
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.counters.incr("evictions")
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            removed = self._data.pop(key, None) is not None
+        if removed:
+            self.counters.incr("invalidations")
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def snapshot(self) -> Dict:
+        data = self.counters.snapshot()
+        lookups = data["hits"] + data["misses"]
+        data.update(
+            size=len(self._data),
+            maxsize=self.maxsize,
+            ttl_seconds=self.ttl,
+            hit_rate=data["hits"] / lookups if lookups else 0.0,
+        )
+        return data
+
+
+class LocalInvalidationChannel:
+    """Delivers invalidations inside this process only (single worker, tests)"""
+
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def publish(self, message: str):
+        for callback in self._subscribers:
+            callback(message)
+
+
+class RedisInvalidationChannel:
+    """Delivers invalidations to every worker through Redis pub/sub"""
+
+    def __init__(self, url: str, channel: str):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._channel = channel
+        self._subscribers = []
+        self._thread = None
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+        if self._thread is None:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{self._channel: self._on_message})
+            self._thread = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def _on_message(self, message):
+        data = message["data"].decode()
+        for callback in self._subscribers:
+            callback(data)
+
+    def publish(self, message: str):
+        self._client.publish(self._channel, message)
@@ -1,10 +1,56 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, func, select, insert, delete, update
+from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 
-from app import models, schemas
-from app.security import get_password_hash, verify_password
+from app import availability, availability_cache, availability_horizon, doctor_patients, models, reservations, schemas
+from app.database import has_writes
+from app.security import get_password_hash_pooled, verify_password_pooled
+from app.pagination import page, paginate
+from app.serialization import row_columns
+from app.principal_cache import invalidate_user
+
+# Unit of work: inside `with unit_of_work(db):` the writers below only flush,
+# and the whole block is committed once at the end (or rolled back on error)
+@contextmanager
+def unit_of_work(db: Session):
+    if db.info.get("unit_of_work"):
+        # Already inside a unit of work, the outer block commits
+        yield db
+        return
+    db.info["unit_of_work"] = True
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.info.pop("unit_of_work", None)
+
+def _commit(db: Session):
+    """Commit the pending changes, or only flush them inside a unit of work"""
+    # Sessions don't expire on commit and timestamps are filled on the client,
+    # so the written objects are already complete and need no refresh
+    if db.info.get("unit_of_work"):
+        db.flush()
+    else:
+        db.commit()
+
+def _bulk_insert(db: Session, model, rows):
+    # Rows are not loaded back as objects; reload them through the parent if needed
+    if not rows:
+        return
+    db.execute(insert(model), [row.dict() for row in rows])
+    _commit(db)
+
+def _invalidate_owner(db: Session, profile):
+    # Profiles are cached along with their user by get_current_user
+    if profile.user is not None:
+        invalidate_user(db, profile.user.email)
 
 # User CRUD operations
 def get_user(db: Session, user_id: int):
@@ -13,29 +59,42 @@ def get_user(db: Session, user_id: int):
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).offset(skip).limit(limit).all()
+def get_user_with_profile(db: Session, email: str):
+    """User with its patient, doctor or admin profile loaded in the same query"""
+    return db.query(models.User).options(
+        joinedload(models.User.patient),
+        joinedload(models.User.doctor),
+        joinedload(models.User.admin),
+    ).filter(models.User.email == email).first()
+
+# Sort keys for cursor pagination, the primary key last so the order is total
+USER_SORT = (models.User.user_id,)
+
+def get_users(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    return paginate(db.query(models.User), USER_SORT, skip, limit, cursor)
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, password_hash: Optional[str] = None):
+    # The register_* functions hash beforehand, outside their unit of work
+    hashed_password = password_hash or _hash_password(db, user.password)
     db_user = models.User(
         email=user.email,
         password_hash=hashed_password,
         role=user.role
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    _commit(db)
     return db_user
 
 def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
     db_user = db.query(models.User).filter(models.User.user_id == user_id).first()
     if db_user:
+        old_email = db_user.email
         update_data = user_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_user, key, value)
-        db.commit()
-        db.refresh(db_user)
+        # Deactivation and email changes must apply to the next request
+        invalidate_user(db, old_email, db_user.email)
+        _commit(db)
     return db_user
 
 def delete_user(db: Session, user_id: int):
@@ -54,18 +113,30 @@ def delete_user(db: Session, user_id: int):
             if admin:
                 db.delete(admin)
         db.delete(db_user)
-        db.commit()
+        invalidate_user(db, db_user.email)
+        _commit(db)
         return True
     return False
 
+def _release_connection(db: Session):
+    # Ends a read-only transaction so its pooled connection goes back to the
+    # pool while the request waits on the password hashing pool
+    if not db.info.get("unit_of_work") and not has_writes(db):
+        db.commit()
+
 def authenticate_user(db: Session, email: str, password: str):
     user = get_user_by_email(db, email)
     if not user:
         return False
-    if not verify_password(password, user.password_hash):
+    _release_connection(db)
+    if not verify_password_pooled(password, user.password_hash):
         return False
     return user
 
+def _hash_password(db: Session, password: str):
+    _release_connection(db)
+    return get_password_hash_pooled(password)
+
 # Patient CRUD operations
 def get_patient(db: Session, patient_id: int):
     return db.query(models.Patient).filter(models.Patient.patient_id == patient_id).first()
@@ -73,14 +144,15 @@ def get_patient(db: Session, patient_id: int):
 def get_patient_by_user_id(db: Session, user_id: int):
     return db.query(models.Patient).filter(models.Patient.user_id == user_id).first()
 
-def get_patients(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Patient).offset(skip).limit(limit).all()
+PATIENT_SORT = (models.Patient.patient_id,)
+
+def get_patients(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    return paginate(db.query(models.Patient), PATIENT_SORT, skip, limit, cursor)
 
 def create_patient(db: Session, patient: schemas.PatientCreate):
     db_patient = models.Patient(**patient.dict())
     db.add(db_patient)
-    db.commit()
-    db.refresh(db_patient)
+    _commit(db)
     return db_patient
 
 def update_patient(db: Session, patient_id: int, patient_update: schemas.PatientUpdate):
@@ -89,15 +161,16 @@ def update_patient(db: Session, patient_id: int, patient_update: schemas.Patient
         update_data = patient_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_patient, key, value)
-        db.commit()
-        db.refresh(db_patient)
+        _invalidate_owner(db, db_patient)
+        _commit(db)
     return db_patient
 
 def delete_patient(db: Session, patient_id: int):
     db_patient = db.query(models.Patient).filter(models.Patient.patient_id == patient_id).first()
     if db_patient:
+        _invalidate_owner(db, db_patient)
         db.delete(db_patient)
-        db.commit()
+        _commit(db)
         return True
     return False
 
@@ -108,14 +181,15 @@ def get_doctor(db: Session, doctor_id: int):
 def get_doctor_by_user_id(db: Session, user_id: int):
     return db.query(models.Doctor).filter(models.Doctor.user_id == user_id).first()
 
-def get_doctors(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Doctor).offset(skip).limit(limit).all()
+DOCTOR_SORT = (models.Doctor.doctor_id,)
+
+def get_doctors(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    return paginate(db.query(models.Doctor), DOCTOR_SORT, skip, limit, cursor)
 
 def create_doctor(db: Session, doctor: schemas.DoctorCreate):
     db_doctor = models.Doctor(**doctor.dict())
     db.add(db_doctor)
-    db.commit()
-    db.refresh(db_doctor)
+    _commit(db)
     return db_doctor
 
 def update_doctor(db: Session, doctor_id: int, doctor_update: schemas.DoctorUpdate):
@@ -124,15 +198,17 @@ def update_doctor(db: Session, doctor_id: int, doctor_update: schemas.DoctorUpda
         update_data = doctor_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_doctor, key, value)
-        db.commit()
-        db.refresh(db_doctor)
+        _invalidate_owner(db, db_doctor)
+        _commit(db)
     return db_doctor
 
 def delete_doctor(db: Session, doctor_id: int):
     db_doctor = db.query(models.Doctor).filter(models.Doctor.doctor_id == doctor_id).first()
     if db_doctor:
+        _invalidate_owner(db, db_doctor)
+        db.execute(delete(models.AvailabilityDay).where(models.AvailabilityDay.doctor_id == doctor_id))
         db.delete(db_doctor)
-        db.commit()
+        _commit(db)
         return True
     return False
 
@@ -143,14 +219,15 @@ def get_admin(db: Session, admin_id: int):
 def get_admin_by_user_id(db: Session, user_id: int):
     return db.query(models.Admin).filter(models.Admin.user_id == user_id).first()
 
-def get_admins(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Admin).offset(skip).limit(limit).all()
+ADMIN_SORT = (models.Admin.admin_id,)
+
+def get_admins(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    return paginate(db.query(models.Admin), ADMIN_SORT, skip, limit, cursor)
 
 def create_admin(db: Session, admin: schemas.AdminCreate):
     db_admin = models.Admin(**admin.dict())
     db.add(db_admin)
-    db.commit()
-    db.refresh(db_admin)
+    _commit(db)
     return db_admin
 
 def update_admin(db: Session, admin_id: int, admin_update: schemas.AdminUpdate):
@@ -159,15 +236,16 @@ def update_admin(db: Session, admin_id: int, admin_update: schemas.AdminUpdate):
         update_data = admin_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_admin, key, value)
-        db.commit()
-        db.refresh(db_admin)
+        _invalidate_owner(db, db_admin)
+        _commit(db)
     return db_admin
 
 def delete_admin(db: Session, admin_id: int):
     db_admin = db.query(models.Admin).filter(models.Admin.admin_id == admin_id).first()
     if db_admin:
+        _invalidate_owner(db, db_admin)
         db.delete(db_admin)
-        db.commit()
+        _commit(db)
         return True
     return False
 
@@ -175,37 +253,124 @@ def delete_admin(db: Session, admin_id: int):
 def get_appointment(db: Session, appointment_id: int):
     return db.query(models.Appointment).filter(models.Appointment.appointment_id == appointment_id).first()
 
-def get_appointments(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Appointment).offset(skip).limit(limit).all()
-
-def get_patient_appointments(db: Session, patient_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Appointment).filter(models.Appointment.patient_id == patient_id).offset(skip).limit(limit).all()
-
-def get_doctor_appointments(db: Session, doctor_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Appointment).filter(models.Appointment.doctor_id == doctor_id).offset(skip).limit(limit).all()
+APPOINTMENT_SORT = (models.Appointment.appointment_time, models.Appointment.appointment_id)
+
+def get_appointments(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    return paginate(db.query(models.Appointment), APPOINTMENT_SORT, skip, limit, cursor)
+
+def get_patient_appointments(db: Session, patient_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    query = db.query(models.Appointment).filter(models.Appointment.patient_id == patient_id)
+    return paginate(query, APPOINTMENT_SORT, skip, limit, cursor)
+
+def get_doctor_appointments(db: Session, doctor_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    query = db.query(models.Appointment).filter(models.Appointment.doctor_id == doctor_id)
+    return paginate(query, APPOINTMENT_SORT, skip, limit, cursor)
+
+def get_appointment_rows(db: Session, patient_id: Optional[int] = None, doctor_id: Optional[int] = None,
+                         skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Appointments as plain dicts of AppointmentResponse columns, without loading ORM objects"""
+    query = select(*row_columns(models.Appointment, schemas.AppointmentResponse))
+    if patient_id is not None:
+        query = query.where(models.Appointment.patient_id == patient_id)
+    if doctor_id is not None:
+        query = query.where(models.Appointment.doctor_id == doctor_id)
+    return [dict(row) for row in db.execute(page(query, APPOINTMENT_SORT, skip, limit, cursor)).mappings()]
+
+def get_doctor_calendar(db: Session, doctor_id: int, first_day: datetime.date, last_day: datetime.date):
+    """The doctor's appointments from `first_day` to `last_day` with their patient's name, grouped by day
+
+    A single query joining patients on the (doctor_id, appointment_time)
+    index; days without appointments are left out.
+    """
+    rows = db.execute(select(
+        models.Appointment.appointment_id,
+        models.Appointment.appointment_time,
+        models.Appointment.duration_minutes,
+        models.Appointment.status,
+        models.Appointment.reason,
+        models.Appointment.patient_id,
+        models.Patient.name.label("patient_name"),
+    ).outerjoin(
+        models.Patient, models.Patient.patient_id == models.Appointment.patient_id
+    ).filter(
+        models.Appointment.doctor_id == doctor_id,
+        models.Appointment.appointment_time >= datetime.combine(first_day, datetime.min.time()),
+        models.Appointment.appointment_time < datetime.combine(last_day + timedelta(days=1), datetime.min.time())
+    ).order_by(*APPOINTMENT_SORT)).mappings()
+    days = defaultdict(list)
+    for row in rows:
+        days[row["appointment_time"].date()].append(dict(row))
+    return dict(days)
+
+def _reserve_slot(db: Session, db_appointment: models.Appointment):
+    try:
+        reservations.reserve(db, db_appointment)
+    except reservations.SlotUnavailableError:
+        # Inside a unit of work the block rolls back as the error leaves it
+        if not db.info.get("unit_of_work"):
+            db.rollback()
+        raise
+
+def _slot_duration(db: Session, doctor_id: Optional[int], appointment_time: datetime) -> int:
+    # Length of the schedule slot, or extra clinic slot, the appointment starts in
+    duration = None
+    if doctor_id is not None:
+        duration = db.scalar(select(models.DoctorSchedule.slot_duration_minutes).filter(
+            models.DoctorSchedule.doctor_id == doctor_id,
+            models.DoctorSchedule.day == appointment_time.strftime("%A").lower(),
+            models.DoctorSchedule.start_time <= appointment_time.time(),
+            models.DoctorSchedule.end_time > appointment_time.time(),
+            models.DoctorSchedule.is_available == True
+        ).limit(1))
+        if duration is None:
+            duration = db.scalar(select(models.ScheduleException.slot_duration_minutes).filter(
+                models.ScheduleException.doctor_id == doctor_id,
+                models.ScheduleException.date == appointment_time.date(),
+                models.ScheduleException.start_time <= appointment_time.time(),
+                models.ScheduleException.end_time > appointment_time.time(),
+                models.ScheduleException.is_available == True
+            ).limit(1))
+    return duration or availability.DEFAULT_SLOT_MINUTES
 
 def create_appointment(db: Session, appointment: schemas.AppointmentCreate):
+    """Book an appointment, raises reservations.SlotUnavailableError if the doctor is taken
+
+    Without a duration the appointment takes the slot length of the schedule it falls in.
+    """
     db_appointment = models.Appointment(**appointment.dict())
+    if db_appointment.duration_minutes is None:
+        db_appointment.duration_minutes = _slot_duration(db, appointment.doctor_id, appointment.appointment_time)
     db.add(db_appointment)
-    db.commit()
-    db.refresh(db_appointment)
+    # The reservation needs the appointment_id
+    db.flush()
+    _reserve_slot(db, db_appointment)
+    doctor_patients.link(db, appointment.doctor_id, appointment.patient_id)
+    _commit(db)
     return db_appointment
 
+# Appointment fields that decide which slot, if any, the appointment holds
+RESERVATION_FIELDS = {"appointment_time", "duration_minutes", "status"}
+
 def update_appointment(db: Session, appointment_id: int, appointment_update: schemas.AppointmentUpdate):
     db_appointment = db.query(models.Appointment).filter(models.Appointment.appointment_id == appointment_id).first()
     if db_appointment:
         update_data = appointment_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_appointment, key, value)
-        db.commit()
-        db.refresh(db_appointment)
+        if RESERVATION_FIELDS & update_data.keys():
+            # Cancelling or completing frees the slot, moving it reserves the new one
+            reservations.release(db, appointment_id)
+            _reserve_slot(db, db_appointment)
+        _commit(db)
     return db_appointment
 
 def delete_appointment(db: Session, appointment_id: int):
     db_appointment = db.query(models.Appointment).filter(models.Appointment.appointment_id == appointment_id).first()
     if db_appointment:
+        doctor_patients.unlink_if_unused(db, db_appointment.doctor_id, db_appointment.patient_id, appointment_id)
+        reservations.release(db, appointment_id)
         db.delete(db_appointment)
-        db.commit()
+        _commit(db)
         return True
     return False
 
@@ -222,64 +387,107 @@ def get_doctor_schedule_for_today(db: Session, doctor_id: int, day: str):
 def get_doctor_schedules(db: Session, doctor_id: int):
     return db.query(models.DoctorSchedule).filter(models.DoctorSchedule.doctor_id == doctor_id).all()
 
+# Appointments in these states take up the doctor's time
+ACTIVE_APPOINTMENT_STATUSES = reservations.ACTIVE_STATUSES
+
+def get_available_slots_range(db: Session, doctor_id: int, first_day: datetime.date, last_day: datetime.date):
+    """Available slots per day from `first_day` to `last_day`
+
+    Served from the availability cache where possible, then from the
+    materialized availability horizon, computing only what neither has.
+    """
+    days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+    slots = availability_cache.get_or_compute(
+        db, doctor_id, days, lambda missing: availability_horizon.free_slots_by_day(db, doctor_id, missing)
+    )
+    return {day: availability.to_slots(day, slots[day]) for day in days}
+
 def get_available_slots(db: Session, doctor_id: int, date: datetime.date):
-    # Get the day of the week
-    day_of_week = date.strftime("%A").lower()
-    
-    # Get the doctor's schedule for that day
-    schedules = db.query(models.DoctorSchedule).filter(
-        models.DoctorSchedule.doctor_id == doctor_id,
-        models.DoctorSchedule.day == day_of_week,
-        models.DoctorSchedule.is_available == True
-    ).all()
-    
-    if not schedules:
+    return get_available_slots_range(db, doctor_id, date, date)[date]
+
+def get_first_available_slots(db: Session, specialization_id: int, not_before: datetime, limit: int = 10):
+    """Earliest free slots across the specialization's doctors, as (start, end, doctor_id, doctor_name)
+
+    Schedules and appointments are loaded in bulk for a window of days that
+    doubles until `limit` slots are found or the search horizon ends, so the
+    usual answer costs one window of a day or two.
+    """
+    doctor_names = dict(db.execute(
+        select(models.Doctor.doctor_id, models.Doctor.name)
+        .filter(models.Doctor.specialization_id == specialization_id)
+    ).all())
+    if not doctor_names:
         return []
-    
-    # Calculate time slots (e.g., 30-minute intervals)
-    all_slots = []
-    for schedule in schedules:
-        current_time = datetime.combine(date, schedule.start_time)
-        end_time = datetime.combine(date, schedule.end_time)
-        
-        while current_time < end_time:
-            slot_end = current_time + timedelta(minutes=30)
-            if slot_end <= end_time:
-                all_slots.append((current_time, slot_end))
-            current_time = slot_end
-    
-    # Get existing appointments for that doctor on that day
-    start_of_day = datetime.combine(date, datetime.min.time())
-    end_of_day = datetime.combine(date, datetime.max.time())
-    
-    existing_appointments = db.query(models.Appointment).filter(
-        models.Appointment.doctor_id == doctor_id,
-        models.Appointment.appointment_time >= start_of_day,
-        models.Appointment.appointment_time <= end_of_day,
-        models.Appointment.status.in_([models.AppointmentStatus.scheduled, models.AppointmentStatus.confirmed])
-    ).all()
-    
-    # Filter out slots that overlap with existing appointments
-    available_slots = []
-    for slot_start, slot_end in all_slots:
-        is_available = True
-        for appt in existing_appointments:
-            appt_time = appt.appointment_time
-            # Check if appointment overlaps with this slot
-            if slot_start <= appt_time < slot_end:
-                is_available = False
-                break
-        
-        if is_available:
-            available_slots.append((slot_start, slot_end))
-    
-    return available_slots
+
+    slots = []
+    # Appointments that started before `not_before` can still block slots after it
+    booked_from = not_before - timedelta(minutes=availability.MAX_APPOINTMENT_MINUTES)
+    first_day = not_before.date()
+    horizon = first_day + timedelta(days=availability.MAX_RANGE_DAYS - 1)
+    window_days = 1
+    while len(slots) < limit and first_day <= horizon:
+        last_day = min(first_day + timedelta(days=window_days - 1), horizon)
+        weekdays = {
+            (first_day + timedelta(days=offset)).strftime("%A").lower()
+            for offset in range(min((last_day - first_day).days + 1, 7))
+        }
+        # Plain rows; building thousands of ORM objects would dominate the request
+        schedules = db.execute(select(
+            models.DoctorSchedule.doctor_id,
+            models.DoctorSchedule.day,
+            models.DoctorSchedule.start_time,
+            models.DoctorSchedule.end_time,
+            models.DoctorSchedule.slot_duration_minutes,
+        ).filter(
+            models.DoctorSchedule.doctor_id.in_(doctor_names),
+            models.DoctorSchedule.day.in_(weekdays),
+            models.DoctorSchedule.is_available == True
+        )).all()
+        exceptions = db.execute(select(
+            models.ScheduleException.doctor_id,
+            models.ScheduleException.date,
+            models.ScheduleException.start_time,
+            models.ScheduleException.end_time,
+            models.ScheduleException.is_available,
+            models.ScheduleException.slot_duration_minutes,
+        ).filter(
+            models.ScheduleException.doctor_id.in_(doctor_names),
+            models.ScheduleException.date >= first_day,
+            models.ScheduleException.date <= last_day
+        )).all()
+        if schedules or exceptions:
+            # Status is checked here rather than in SQL: with a long doctor_id IN
+            # list the planner would otherwise scan ix_appointments_status
+            # instead of the (doctor_id, appointment_time) index
+            rows = db.execute(select(
+                models.Appointment.doctor_id,
+                models.Appointment.appointment_time,
+                models.Appointment.duration_minutes,
+                models.Appointment.status,
+            ).filter(
+                models.Appointment.doctor_id.in_(doctor_names),
+                models.Appointment.appointment_time >= max(
+                    datetime.combine(first_day, datetime.min.time())
+                    - timedelta(minutes=availability.MAX_APPOINTMENT_MINUTES),
+                    booked_from,
+                ),
+                models.Appointment.appointment_time < datetime.combine(last_day + timedelta(days=1), datetime.min.time()),
+            )).all()
+            booked = [
+                (doctor_id, appointment_time, duration) for doctor_id, appointment_time, duration, appointment_status in rows
+                if appointment_status in ACTIVE_APPOINTMENT_STATUSES
+            ]
+            slots.extend(availability.first_available(
+                first_day, last_day, not_before, schedules, booked, limit - len(slots), exceptions
+            ))
+        first_day = last_day + timedelta(days=1)
+        window_days *= 2
+    return [(start, end, doctor_id, doctor_names[doctor_id]) for start, end, doctor_id in slots]
 
 def create_schedule(db: Session, schedule: schemas.DoctorScheduleCreate):
     db_schedule = models.DoctorSchedule(**schedule.dict())
     db.add(db_schedule)
-    db.commit()
-    db.refresh(db_schedule)
+    _commit(db)
     return db_schedule
 
 def update_schedule(db: Session, schedule_id: int, schedule_update: schemas.DoctorScheduleUpdate):
@@ -288,15 +496,119 @@ def update_schedule(db: Session, schedule_id: int, schedule_update: schemas.Doct
         update_data = schedule_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_schedule, key, value)
-        db.commit()
-        db.refresh(db_schedule)
+        _commit(db)
     return db_schedule
 
 def delete_schedule(db: Session, schedule_id: int):
     db_schedule = db.query(models.DoctorSchedule).filter(models.DoctorSchedule.schedule_id == schedule_id).first()
     if db_schedule:
         db.delete(db_schedule)
-        db.commit()
+        _commit(db)
+        return True
+    return False
+
+def _diff_weekly_template(existing, template):
+    # (inserts, updates, deletes, unchanged) turning a doctor's existing rows into the template.
+    # Rows are matched on their window first; leftover rows are reused for
+    # leftover entries so a moved window is one update instead of a delete and an insert.
+    rows_by_window = defaultdict(list)
+    for row in existing:
+        rows_by_window[(row.day.lower(), row.start_time, row.end_time)].append(row)
+    updates, unmatched = [], []
+    unchanged = 0
+    for entry in template:
+        rows = rows_by_window.get((entry.day, entry.start_time, entry.end_time))
+        if not rows:
+            unmatched.append(entry)
+            continue
+        row = rows.pop()
+        if (row.day, row.slot_duration_minutes, row.is_available) == (entry.day, entry.slot_duration_minutes, entry.is_available):
+            unchanged += 1
+        else:
+            updates.append((row.schedule_id, entry))
+    leftover_rows = [row for rows in rows_by_window.values() for row in rows]
+    updates.extend((row.schedule_id, entry) for row, entry in zip(leftover_rows, unmatched))
+    inserts = unmatched[len(leftover_rows):]
+    deletes = [row.schedule_id for row in leftover_rows[len(unmatched):]]
+    return inserts, updates, deletes, unchanged
+
+def apply_weekly_template(db: Session, doctor_ids: List[int], template: List[schemas.WeeklyScheduleEntry]):
+    """Make each doctor's weekly schedule exactly `template` in one transaction
+
+    Existing rows are read in one query and diffed in memory; the inserts,
+    updates and deletes for all doctors then go out as one batched statement each.
+    """
+    doctor_ids = sorted(set(doctor_ids))
+    existing = db.execute(select(
+        models.DoctorSchedule.schedule_id,
+        models.DoctorSchedule.doctor_id,
+        models.DoctorSchedule.day,
+        models.DoctorSchedule.start_time,
+        models.DoctorSchedule.end_time,
+        models.DoctorSchedule.slot_duration_minutes,
+        models.DoctorSchedule.is_available,
+    ).filter(models.DoctorSchedule.doctor_id.in_(doctor_ids))).all()
+    existing_by_doctor = defaultdict(list)
+    for row in existing:
+        existing_by_doctor[row.doctor_id].append(row)
+
+    inserts, updates, deletes = [], [], []
+    unchanged = 0
+    changed_doctors = set()
+    for doctor_id in doctor_ids:
+        doctor_inserts, doctor_updates, doctor_deletes, doctor_unchanged = _diff_weekly_template(
+            existing_by_doctor[doctor_id], template
+        )
+        inserts.extend({"doctor_id": doctor_id, **entry.dict()} for entry in doctor_inserts)
+        updates.extend({"schedule_id": schedule_id, **entry.dict()} for schedule_id, entry in doctor_updates)
+        deletes.extend(doctor_deletes)
+        unchanged += doctor_unchanged
+        if doctor_inserts or doctor_updates or doctor_deletes:
+            changed_doctors.add(doctor_id)
+
+    if deletes:
+        db.execute(delete(models.DoctorSchedule).where(models.DoctorSchedule.schedule_id.in_(deletes)))
+    if updates:
+        db.execute(update(models.DoctorSchedule), updates)
+    if inserts:
+        db.execute(insert(models.DoctorSchedule), inserts)
+    if changed_doctors:
+        # Bulk statements skip the flush hooks that keep availability current
+        availability_cache.invalidate_on_commit(db, changed_doctors)
+        availability_horizon.mark_stale(db.connection(), {doctor_id: set() for doctor_id in changed_doctors})
+    _commit(db)
+    return {
+        "doctors": len(doctor_ids),
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "deleted": len(deletes),
+        "unchanged": unchanged,
+    }
+
+# Schedule exception CRUD operations
+def get_schedule_exception(db: Session, exception_id: int):
+    return db.query(models.ScheduleException).filter(models.ScheduleException.exception_id == exception_id).first()
+
+def get_schedule_exceptions(db: Session, doctor_id: int, first_day: Optional[datetime.date] = None,
+                            last_day: Optional[datetime.date] = None):
+    query = db.query(models.ScheduleException).filter(models.ScheduleException.doctor_id == doctor_id)
+    if first_day is not None:
+        query = query.filter(models.ScheduleException.date >= first_day)
+    if last_day is not None:
+        query = query.filter(models.ScheduleException.date <= last_day)
+    return query.order_by(models.ScheduleException.date, models.ScheduleException.start_time).all()
+
+def create_schedule_exception(db: Session, exception: schemas.ScheduleExceptionCreate):
+    db_exception = models.ScheduleException(**exception.dict())
+    db.add(db_exception)
+    _commit(db)
+    return db_exception
+
+def delete_schedule_exception(db: Session, exception_id: int):
+    db_exception = get_schedule_exception(db, exception_id)
+    if db_exception:
+        db.delete(db_exception)
+        _commit(db)
         return True
     return False
 
@@ -304,14 +616,26 @@ def delete_schedule(db: Session, schedule_id: int):
 def get_health_record(db: Session, record_id: int):
     return db.query(models.HealthRecord).filter(models.HealthRecord.record_id == record_id).first()
 
-def get_patient_health_records(db: Session, patient_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.HealthRecord).filter(models.HealthRecord.patient_id == patient_id).offset(skip).limit(limit).all()
+HEALTH_RECORD_SORT = (models.HealthRecord.created_at, models.HealthRecord.record_id)
+
+def get_patient_health_records(db: Session, patient_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    query = db.query(models.HealthRecord).filter(models.HealthRecord.patient_id == patient_id)
+    return paginate(query, HEALTH_RECORD_SORT, skip, limit, cursor)
+
+def get_health_record_rows(db: Session, patient_id: Optional[int] = None, doctor_id: Optional[int] = None,
+                           skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Health records as plain dicts of HealthRecordResponse columns, without loading ORM objects"""
+    query = select(*row_columns(models.HealthRecord, schemas.HealthRecordResponse))
+    if patient_id is not None:
+        query = query.where(models.HealthRecord.patient_id == patient_id)
+    if doctor_id is not None:
+        query = query.where(models.HealthRecord.doctor_id == doctor_id)
+    return [dict(row) for row in db.execute(page(query, HEALTH_RECORD_SORT, skip, limit, cursor)).mappings()]
 
 def create_health_record(db: Session, health_record: schemas.HealthRecordCreate):
     db_health_record = models.HealthRecord(**health_record.dict())
     db.add(db_health_record)
-    db.commit()
-    db.refresh(db_health_record)
+    _commit(db)
     return db_health_record
 
 def update_health_record(db: Session, record_id: int, health_record_update: schemas.HealthRecordUpdate):
@@ -320,15 +644,14 @@ def update_health_record(db: Session, record_id: int, health_record_update: sche
         update_data = health_record_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_health_record, key, value)
-        db.commit()
-        db.refresh(db_health_record)
+        _commit(db)
     return db_health_record
 
 def delete_health_record(db: Session, record_id: int):
     db_health_record = db.query(models.HealthRecord).filter(models.HealthRecord.record_id == record_id).first()
     if db_health_record:
         db.delete(db_health_record)
-        db.commit()
+        _commit(db)
         return True
     return False
 
@@ -342,25 +665,27 @@ def get_record_prescriptions(db: Session, record_id: int):
 def create_prescription(db: Session, prescription: schemas.PrescriptionCreate):
     db_prescription = models.Prescription(**prescription.dict())
     db.add(db_prescription)
-    db.commit()
-    db.refresh(db_prescription)
+    _commit(db)
     return db_prescription
 
+def bulk_create_prescriptions(db: Session, prescriptions: List[schemas.PrescriptionCreate]):
+    """Insert many prescriptions with a single executemany"""
+    _bulk_insert(db, models.Prescription, prescriptions)
+
 def update_prescription(db: Session, prescription_id: int, prescription_update: schemas.PrescriptionUpdate):
     db_prescription = db.query(models.Prescription).filter(models.Prescription.prescription_id == prescription_id).first()
     if db_prescription:
         update_data = prescription_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_prescription, key, value)
-        db.commit()
-        db.refresh(db_prescription)
+        _commit(db)
     return db_prescription
 
 def delete_prescription(db: Session, prescription_id: int):
     db_prescription = db.query(models.Prescription).filter(models.Prescription.prescription_id == prescription_id).first()
     if db_prescription:
         db.delete(db_prescription)
-        db.commit()
+        _commit(db)
         return True
     return False
 
@@ -374,25 +699,27 @@ def get_record_tests(db: Session, record_id: int):
 def create_test(db: Session, test: schemas.TestCreate):
     db_test = models.Test(**test.dict())
     db.add(db_test)
-    db.commit()
-    db.refresh(db_test)
+    _commit(db)
     return db_test
 
+def bulk_create_tests(db: Session, tests: List[schemas.TestCreate]):
+    """Insert many tests with a single executemany"""
+    _bulk_insert(db, models.Test, tests)
+
 def update_test(db: Session, test_id: int, test_update: schemas.TestUpdate):
     db_test = db.query(models.Test).filter(models.Test.test_id == test_id).first()
     if db_test:
         update_data = test_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_test, key, value)
-        db.commit()
-        db.refresh(db_test)
+        _commit(db)
     return db_test
 
 def delete_test(db: Session, test_id: int):
     db_test = db.query(models.Test).filter(models.Test.test_id == test_id).first()
     if db_test:
         db.delete(db_test)
-        db.commit()
+        _commit(db)
         return True
     return False
 
@@ -403,11 +730,23 @@ def get_billing(db: Session, billing_id: int):
 def get_patient_billings(db: Session, patient_id: int):
     return db.query(models.Billing).filter(models.Billing.patient_id == patient_id).all()
 
+def get_billing_rows(db: Session, patient_id: Optional[int] = None, appointment_id: Optional[int] = None,
+                     doctor_id: Optional[int] = None):
+    """Billings as plain dicts of BillingResponse columns, without loading ORM objects"""
+    query = select(*row_columns(models.Billing, schemas.BillingResponse))
+    if patient_id is not None:
+        query = query.where(models.Billing.patient_id == patient_id)
+    if appointment_id is not None:
+        query = query.where(models.Billing.appointment_id == appointment_id)
+    if doctor_id is not None:
+        doctor_appointments = select(models.Appointment.appointment_id).where(models.Appointment.doctor_id == doctor_id)
+        query = query.where(models.Billing.appointment_id.in_(doctor_appointments))
+    return [dict(row) for row in db.execute(query.order_by(models.Billing.billing_id)).mappings()]
+
 def create_billing(db: Session, billing: schemas.BillingCreate):
     db_billing = models.Billing(**billing.dict())
     db.add(db_billing)
-    db.commit()
-    db.refresh(db_billing)
+    _commit(db)
     return db_billing
 
 def update_billing(db: Session, billing_id: int, billing_update: schemas.BillingUpdate):
@@ -416,15 +755,14 @@ def update_billing(db: Session, billing_id: int, billing_update: schemas.Billing
         update_data = billing_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_billing, key, value)
-        db.commit()
-        db.refresh(db_billing)
+        _commit(db)
     return db_billing
 
 def delete_billing(db: Session, billing_id: int):
     db_billing = db.query(models.Billing).filter(models.Billing.billing_id == billing_id).first()
     if db_billing:
         db.delete(db_billing)
-        db.commit()
+        _commit(db)
         return True
     return False
 
@@ -444,8 +782,7 @@ def get_feedback_by_appointment_id(db: Session, appointment_id: int):
 def create_feedback(db: Session, feedback: schemas.FeedbackCreate):
     db_feedback = models.Feedback(**feedback.dict())
     db.add(db_feedback)
-    db.commit()
-    db.refresh(db_feedback)
+    _commit(db)
     return db_feedback
 
 def update_feedback(db: Session, feedback_id: int, feedback_update: schemas.FeedbackUpdate):
@@ -454,15 +791,14 @@ def update_feedback(db: Session, feedback_id: int, feedback_update: schemas.Feed
         update_data = feedback_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_feedback, key, value)
-        db.commit()
-        db.refresh(db_feedback)
+        _commit(db)
     return db_feedback
 
 def delete_feedback(db: Session, feedback_id: int):
     db_feedback = db.query(models.Feedback).filter(models.Feedback.feedback_id == feedback_id).first()
     if db_feedback:
         db.delete(db_feedback)
-        db.commit()
+        _commit(db)
         return True
     return False
 
@@ -476,8 +812,7 @@ def get_patient_insurances(db: Session, patient_id: int):
 def create_insurance(db: Session, insurance: schemas.InsuranceCreate):
     db_insurance = models.Insurance(**insurance.dict())
     db.add(db_insurance)
-    db.commit()
-    db.refresh(db_insurance)
+    _commit(db)
     return db_insurance
 
 def update_insurance(db: Session, insurance_id: int, insurance_update: schemas.InsuranceUpdate):
@@ -486,15 +821,14 @@ def update_insurance(db: Session, insurance_id: int, insurance_update: schemas.I
         update_data = insurance_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_insurance, key, value)
-        db.commit()
-        db.refresh(db_insurance)
+        _commit(db)
     return db_insurance
 
 def delete_insurance(db: Session, insurance_id: int):
     db_insurance = db.query(models.Insurance).filter(models.Insurance.insurance_id == insurance_id).first()
     if db_insurance:
         db.delete(db_insurance)
-        db.commit()
+        _commit(db)
         return True
     return False
 
@@ -508,25 +842,27 @@ def get_user_notifications(db: Session, user_id: int):
 def create_notification(db: Session, notification: schemas.NotificationCreate):
     db_notification = models.Notification(**notification.dict())
     db.add(db_notification)
-    db.commit()
-    db.refresh(db_notification)
+    _commit(db)
     return db_notification
 
+def bulk_create_notifications(db: Session, notifications: List[schemas.NotificationCreate]):
+    """Insert many notifications with a single executemany"""
+    _bulk_insert(db, models.Notification, notifications)
+
 def update_notification(db: Session, notification_id: int, notification_update: schemas.NotificationUpdate):
     db_notification = db.query(models.Notification).filter(models.Notification.notification_id == notification_id).first()
     if db_notification:
         update_data = notification_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_notification, key, value)
-        db.commit()
-        db.refresh(db_notification)
+        _commit(db)
     return db_notification
 
 def delete_notification(db: Session, notification_id: int):
     db_notification = db.query(models.Notification).filter(models.Notification.notification_id == notification_id).first()
     if db_notification:
         db.delete(db_notification)
-        db.commit()
+        _commit(db)
         return True
     return False
 
@@ -534,14 +870,15 @@ def delete_notification(db: Session, notification_id: int):
 def get_specialization(db: Session, specialization_id: int):
     return db.query(models.Specialization).filter(models.Specialization.specialization_id == specialization_id).first()
 
-def get_specializations(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Specialization).offset(skip).limit(limit).all()
+SPECIALIZATION_SORT = (models.Specialization.specialization_id,)
+
+def get_specializations(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    return paginate(db.query(models.Specialization), SPECIALIZATION_SORT, skip, limit, cursor)
 
 def create_specialization(db: Session, specialization: schemas.SpecializationCreate):
     db_specialization = models.Specialization(**specialization.dict())
     db.add(db_specialization)
-    db.commit()
-    db.refresh(db_specialization)
+    _commit(db)
     return db_specialization
 
 def update_specialization(db: Session, specialization_id: int, specialization_update: schemas.SpecializationUpdate):
@@ -550,57 +887,85 @@ def update_specialization(db: Session, specialization_id: int, specialization_up
         update_data = specialization_update.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_specialization, key, value)
-        db.commit()
-        db.refresh(db_specialization)
+        _commit(db)
     return db_specialization
 
 def delete_specialization(db: Session, specialization_id: int):
     db_specialization = db.query(models.Specialization).filter(models.Specialization.specialization_id == specialization_id).first()
     if db_specialization:
         db.delete(db_specialization)
-        db.commit()
+        _commit(db)
         return True
     return False
 
 # Registration operations
-def register_patient(db: Session, registration: schemas.PatientRegistration):
-    # Create user
-    user = create_user(db, schemas.UserCreate(
-        email=registration.email,
-        password=registration.password,
-        role="patient"
-    ))
-    
-    # Create patient
-    patient_data = registration.dict(exclude={"email", "password"})
-    patient = create_patient(db, schemas.PatientCreate(user_id=user.user_id, **patient_data))
+def register_patient(db: Session, registration: schemas.PatientRegistration, password_hash: Optional[str] = None):
+    # Hashed before the transaction starts, so no connection is held meanwhile
+    password_hash = password_hash or _hash_password(db, registration.password)
+    # User and patient profile are committed together
+    with unit_of_work(db):
+        # Create user
+        user = create_user(db, schemas.UserCreate(
+            email=registration.email,
+            password=registration.password,
+            role="patient"
+        ), password_hash)
+        
+        # Create patient
+        patient_data = registration.dict(exclude={"email", "password"})
+        patient = create_patient(db, schemas.PatientCreate(user_id=user.user_id, **patient_data))
     
     return patient
 
-def register_doctor(db: Session, registration: schemas.DoctorRegistration):
-    # Create user
-    user = create_user(db, schemas.UserCreate(
-        email=registration.email,
-        password=registration.password,
-        role="doctor"
-    ))
-    
-    # Create doctor
-    doctor_data = registration.dict(exclude={"email", "password"})
-    doctor = create_doctor(db, schemas.DoctorCreate(user_id=user.user_id, **doctor_data))
+def register_doctor(db: Session, registration: schemas.DoctorRegistration, password_hash: Optional[str] = None):
+    # Hashed before the transaction starts, so no connection is held meanwhile
+    password_hash = password_hash or _hash_password(db, registration.password)
+    # User and doctor profile are committed together
+    with unit_of_work(db):
+        # Create user
+        user = create_user(db, schemas.UserCreate(
+            email=registration.email,
+            password=registration.password,
+            role="doctor"
+        ), password_hash)
+        
+        # Create doctor
+        doctor_data = registration.dict(exclude={"email", "password"})
+        doctor = create_doctor(db, schemas.DoctorCreate(user_id=user.user_id, **doctor_data))
     
     return doctor
 
-def register_admin(db: Session, registration: schemas.AdminRegistration):
-    # Create user
-    user = create_user(db, schemas.UserCreate(
-        email=registration.email,
-        password=registration.password,
-        role="admin"
-    ))
-    
-    # Create admin
-    admin_data = registration.dict(exclude={"email", "password"})
-    admin = create_admin(db, schemas.AdminCreate(user_id=user.user_id, **admin_data))
+def register_admin(db: Session, registration: schemas.AdminRegistration, password_hash: Optional[str] = None):
+    # Hashed before the transaction starts, so no connection is held meanwhile
+    password_hash = password_hash or _hash_password(db, registration.password)
+    # User and admin profile are committed together
+    with unit_of_work(db):
+        # Create user
+        user = create_user(db, schemas.UserCreate(
+            email=registration.email,
+            password=registration.password,
+            role="admin"
+        ), password_hash)
+        
+        # Create admin
+        admin_data = registration.dict(exclude={"email", "password"})
+        admin = create_admin(db, schemas.AdminCreate(user_id=user.user_id, **admin_data))
     
     return admin
+
+# Async CRUD operations for the hot paths of routers running on an AsyncSession
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).filter(models.User.email == email))
+    return result.scalars().first()
+
+async def get_patient_by_user_id_async(db: AsyncSession, user_id: int):
+    result = await db.execute(select(models.Patient).filter(models.Patient.user_id == user_id))
+    return result.scalars().first()
+
+async def get_doctor_by_user_id_async(db: AsyncSession, user_id: int):
+    result = await db.execute(select(models.Doctor).filter(models.Doctor.user_id == user_id))
+    return result.scalars().first()
+
+async def get_available_slots_async(db: AsyncSession, doctor_id: int, date: datetime.date):
+    # Same path as get_available_slots (cache, then horizon, then compute) on the session's connection
+    return await db.run_sync(get_available_slots, doctor_id, date)
@@ -1,9 +1,17 @@
 import os
-from sqlalchemy import create_engine
+import random
+import time
+from sqlalchemy import create_engine, event, exc, Select
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from dotenv import load_dotenv
 
+from app.metrics import Histogram, Counters
+from app.query_stats import track_queries
+
 load_dotenv()
 
 # Database credentials
@@ -13,18 +21,261 @@ DATABASE_HOST = os.environ.get("DATABASE_HOST", 'localhost')
 DATABASE_PORT = os.environ.get("DATABASE_PORT", 3306)
 DATABASE_NAME = os.environ.get("DATABASE_NAME")  
 
-# Construct the MySQL database URL
-DATABASE_URL = f"mysql+mysqlconnector://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}"
+# Construct the MySQL database URL (DATABASE_URL overrides it, e.g. for SQLite in tests)
+DATABASE_URL = os.environ.get("DATABASE_URL") or f"mysql+mysqlconnector://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}"
+
+# Async drivers used when ASYNC_DATABASE_URL is not set explicitly
+ASYNC_DRIVERS = {
+    "mysql": "aiomysql",
+    "sqlite": "aiosqlite",
+}
+
+
+def _async_url(url):
+    """Derive the async driver URL from a sync database URL"""
+    sync_url = make_url(url)
+    backend = sync_url.get_backend_name()
+    return sync_url.set(drivername=f"{backend}+{ASYNC_DRIVERS.get(backend, sync_url.get_driver_name())}")
+
+
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Connection pool settings, size these for the number of uvicorn workers
+# (each worker holds up to DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW connections)
+POOL_SIZE = int(os.environ.get("DATABASE_POOL_SIZE", 5))
+POOL_MAX_OVERFLOW = int(os.environ.get("DATABASE_MAX_OVERFLOW", 10))
+POOL_TIMEOUT = float(os.environ.get("DATABASE_POOL_TIMEOUT", 30))
+POOL_RECYCLE = int(os.environ.get("DATABASE_POOL_RECYCLE", 300))
+POOL_PRE_PING = _env_bool("DATABASE_POOL_PRE_PING", True)
+POOL_USE_LIFO = _env_bool("DATABASE_POOL_USE_LIFO", False)
+
+# Comma separated read replica URLs, reads are spread across them
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Seconds a user's reads stay on the primary after they commit a write
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("DATABASE_READ_YOUR_WRITES_SECONDS", 5))
+
+
+class PoolStats:
+    """Checkout latency and connection lifecycle counters for one engine's pool"""
+
+    def __init__(self):
+        self.checkout_latency = Histogram()
+        self.counters = Counters("checkouts", "checkout_timeouts", "connects",
+                                 "invalidations", "pre_ping_failures", "recycles")
+        self.engine = None
+
+    def snapshot(self):
+        data = {
+            "checkout_latency_seconds": self.checkout_latency.snapshot(),
+            **self.counters.snapshot(),
+        }
+        pool = self.engine.pool if self.engine is not None else None
+        if isinstance(pool, QueuePool):
+            data.update(
+                pool_size=pool.size(),
+                checked_in=pool.checkedin(),
+                in_use=pool.checkedout(),
+                overflow=max(pool.overflow(), 0),
+            )
+        return data
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection"""
+
+    stats = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.stats is not None:
+                self.stats.counters.incr("checkout_timeouts")
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.checkout_latency.observe(time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool, keep reporting to the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+# Pool stats per engine name, reported by the admin stats endpoint
+pool_stats = {}
+
+
+def _pool_options(url):
+    options = {"pool_pre_ping": POOL_PRE_PING, "pool_recycle": POOL_RECYCLE}
+    url = make_url(url)
+    dialect = url.get_dialect()
+    # Only queue pools take sizing options (SQLite :memory: uses a singleton pool)
+    if issubclass(dialect.get_pool_class(url), QueuePool):
+        options.update(
+            pool_size=POOL_SIZE,
+            max_overflow=POOL_MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            pool_use_lifo=POOL_USE_LIFO,
+        )
+        if not dialect.is_async:
+            options["poolclass"] = InstrumentedQueuePool
+    return options
+
+
+def _instrument_engine(engine, name):
+    stats = PoolStats()
+    stats.engine = engine
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.stats = stats
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        stats.counters.incr("connects")
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.counters.incr("checkouts")
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        stats.counters.incr("invalidations")
+        if isinstance(exception, exc.InvalidatePoolError):
+            stats.counters.incr("pre_ping_failures")
+
+    @event.listens_for(engine, "close")
+    def on_close(dbapi_connection, connection_record):
+        if POOL_RECYCLE > -1 and time.time() - connection_record.starttime > POOL_RECYCLE:
+            stats.counters.incr("recycles")
+
+    pool_stats[name] = stats
+    # Per-request statement counts and N+1 detection
+    track_queries(engine)
+    return engine
+
+
+def get_pool_stats():
+    """Pool configuration and stats for this worker process"""
+    return {
+        "pid": os.getpid(),
+        "config": {
+            "pool_size": POOL_SIZE,
+            "max_overflow": POOL_MAX_OVERFLOW,
+            "pool_timeout": POOL_TIMEOUT,
+            "pool_recycle": POOL_RECYCLE,
+            "pool_pre_ping": POOL_PRE_PING,
+            "pool_use_lifo": POOL_USE_LIFO,
+        },
+        "pools": {name: stats.snapshot() for name, stats in pool_stats.items()},
+    }
+
 
 # Create SQLAlchemy engine
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
-)
+engine = _instrument_engine(create_engine(DATABASE_URL, **_pool_options(DATABASE_URL)), "primary")
+
+# Create read replica engines
+replica_engines = [
+    _instrument_engine(create_engine(url, **_pool_options(url)), f"replica-{index}")
+    for index, url in enumerate(DATABASE_REPLICA_URLS)
+]
+
+# user_id -> time.monotonic() until which that user's reads must use the primary
+_primary_until = {}
+
+
+def set_session_user(db, user_id):
+    """Tie a session to the requesting user for read-your-writes routing"""
+    db.info["user_id"] = user_id
+
+
+def _reads_pinned_to_primary(user_id):
+    until = _primary_until.get(user_id)
+    if until is None:
+        return False
+    if until < time.monotonic():
+        _primary_until.pop(user_id, None)
+        return False
+    return True
+
+
+class RoutingSession(Session):
+    """Session that sends plain reads to a replica and everything else to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if not replica_engines:
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+        if (
+            isinstance(clause, Select)
+            and clause._for_update_arg is None
+            and not self._flushing
+            and not self.info.get("has_writes")
+            and not _reads_pinned_to_primary(self.info.get("user_id"))
+        ):
+            return random.choice(replica_engines)
+        return engine
+
+
+# Writes are tracked on every session (not only routed ones), see has_writes()
+@event.listens_for(Session, "after_flush")
+def _mark_writes(session, flush_context):
+    # Reads later in this transaction must see its own writes
+    session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_statement_writes(orm_execute_state):
+    # Bulk INSERT / UPDATE / DELETE statements write without a flush
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+def has_writes(session):
+    """Whether the session's transaction has written, or holds changes not flushed yet"""
+    return bool(session.info.get("has_writes") or session.new or session.dirty or session.deleted)
+
+
+@event.listens_for(Session, "after_commit")
+def _pin_user_to_primary(session):
+    user_id = session.info.get("user_id")
+    if session.info.pop("has_writes", False) and user_id is not None:
+        now = time.monotonic()
+        if len(_primary_until) > 10000:
+            for expired in [key for key, until in _primary_until.items() if until < now]:
+                _primary_until.pop(expired, None)
+        _primary_until[user_id] = now + READ_YOUR_WRITES_SECONDS
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_writes(session):
+    session.info.pop("has_writes", None)
+
 
 # Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay loaded after commit, so crud writers can return them without a refresh
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Create async engine; the async driver (aiomysql / aiosqlite) is optional
+try:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_options(ASYNC_DATABASE_URL))
+except ImportError:
+    async_engine = None
+else:
+    _instrument_engine(async_engine.sync_engine, "async")
+
+# Create async session factory
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+) if async_engine is not None else None
 
 # Create declarative base
 Base = declarative_base()
@@ -36,3 +287,10 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get an async db session, for routers running as async def
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database driver is not installed; install aiomysql (or aiosqlite) or set ASYNC_DATABASE_URL")
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -6,10 +6,11 @@ from sqlalchemy.orm import Session
 from typing import Optional
 from datetime import datetime, timezone
 
-from app.database import get_db
+from app.database import get_db, set_session_user
 from app.security import SECRET_KEY, ALGORITHM
-from app.crud import get_user_by_email
-from app.models import User
+from app.crud import get_user_with_profile
+from app.principal_cache import get_cached_user, cache_user
+from app.models import User, Patient, Doctor, Admin
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
@@ -58,10 +59,17 @@ async def get_current_user(request: Request,
         # Invalid token
         return None
 
-    user = get_user_by_email(db, email)
+    # The role profile comes with the user, so current_patient and friends
+    # don't need a second query
+    user = get_cached_user(db, email)
     if user is None:
-        return None
+        user = get_user_with_profile(db, email)
+        if user is None:
+            return None
+        cache_user(user)
 
+    # Keep this user's reads on the primary right after they write
+    set_session_user(db, user.user_id)
     return user
 
 
@@ -106,3 +114,24 @@ def check_doctor_or_admin_role(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Not enough permissions")
     return current_user
+
+
+def current_patient(current_user = Depends(check_patient_role)) -> Patient:
+    """Patient profile of the current user"""
+    if not current_user.patient:
+        raise HTTPException(status_code=404, detail="Patient profile not found")
+    return current_user.patient
+
+
+def current_doctor(current_user = Depends(check_doctor_role)) -> Doctor:
+    """Doctor profile of the current user"""
+    if not current_user.doctor:
+        raise HTTPException(status_code=404, detail="Doctor profile not found")
+    return current_user.doctor
+
+
+def current_admin(current_user = Depends(check_admin_role)) -> Admin:
+    """Admin profile of the current user"""
+    if not current_user.admin:
+        raise HTTPException(status_code=404, detail="Admin profile not found")
+    return current_user.admin
@@ -0,0 +1,133 @@
+import logging
+import os
+
+from sqlalchemy import delete, event, exists, insert, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.cache import LocalInvalidationChannel, RedisInvalidationChannel, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Redis URL used to broadcast revoked access to every worker (needs `pip install redis`)
+DOCTOR_PATIENT_CACHE_REDIS_URL = os.environ.get("DOCTOR_PATIENT_CACHE_REDIS_URL")
+INVALIDATION_CHANNEL = "medilink:doctor-patient-cache:invalidate"
+
+
+def _create_channel():
+    if DOCTOR_PATIENT_CACHE_REDIS_URL:
+        try:
+            return RedisInvalidationChannel(DOCTOR_PATIENT_CACHE_REDIS_URL, INVALIDATION_CHANNEL)
+        except ImportError:
+            logger.warning("DOCTOR_PATIENT_CACHE_REDIS_URL is set but redis is not installed; invalidations stay local")
+    return LocalInvalidationChannel()
+
+
+invalidation_channel = _create_channel()
+
+# Granted doctor -> patient access checks are cached for this many seconds per
+# worker, 0 disables the cache. Without Redis a revoked pair would stay
+# granted on the other workers until their entry expires, so the cache is
+# only on by default when revocations are broadcast.
+DOCTOR_PATIENT_CACHE_TTL = float(os.environ.get(
+    "DOCTOR_PATIENT_CACHE_TTL", 300 if isinstance(invalidation_channel, RedisInvalidationChannel) else 0
+))
+DOCTOR_PATIENT_CACHE_SIZE = int(os.environ.get("DOCTOR_PATIENT_CACHE_SIZE", 50000))
+
+access_cache = TTLCache(maxsize=DOCTOR_PATIENT_CACHE_SIZE, ttl=DOCTOR_PATIENT_CACHE_TTL)
+
+
+def _on_invalidation(message: str):
+    doctor_id, patient_id = message.split(":")
+    access_cache.delete((int(doctor_id), int(patient_id)))
+
+
+invalidation_channel.subscribe(_on_invalidation)
+
+
+def _insert_ignore():
+    # Two bookings for the same pair may race, the second insert is a no-op
+    return (
+        insert(models.DoctorPatient)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+
+
+def link(db: Session, doctor_id: int, patient_id: int):
+    """Record that the doctor has an appointment with the patient"""
+    if doctor_id is None or patient_id is None:
+        return
+    db.execute(_insert_ignore().values(doctor_id=doctor_id, patient_id=patient_id))
+
+
+def unlink_if_unused(db: Session, doctor_id: int, patient_id: int, deleted_appointment_id: int):
+    """Drop the pair when `deleted_appointment_id` was their last appointment"""
+    remaining = db.query(exists().where(
+        models.Appointment.doctor_id == doctor_id,
+        models.Appointment.patient_id == patient_id,
+        models.Appointment.appointment_id != deleted_appointment_id,
+    )).scalar()
+    if not remaining:
+        db.execute(delete(models.DoctorPatient).where(
+            models.DoctorPatient.doctor_id == doctor_id,
+            models.DoctorPatient.patient_id == patient_id,
+        ))
+        revoke(db, doctor_id, patient_id)
+
+
+def _evict(key):
+    access_cache.delete(key)
+    try:
+        invalidation_channel.publish(f"{key[0]}:{key[1]}")
+    except Exception:
+        # Other workers fall back to the TTL
+        logger.exception("Failed to publish doctor/patient cache invalidation")
+
+
+def revoke(db: Session, doctor_id: int, patient_id: int):
+    """Drop the pair's cached access from every worker now, and again once `db` commits
+
+    The second eviction covers a concurrent check that cached the pair again
+    before the delete was committed.
+    """
+    key = (doctor_id, patient_id)
+    _evict(key)
+    db.info.setdefault("revoke_doctor_patients", set()).add(key)
+
+
+@event.listens_for(Session, "after_commit")
+def _revoke_after_commit(session):
+    for key in session.info.pop("revoke_doctor_patients", ()):
+        _evict(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_revocations(session):
+    session.info.pop("revoke_doctor_patients", None)
+
+
+def can_doctor_access_patient(db: Session, doctor_id: int, patient_id: int) -> bool:
+    """Whether the doctor has had an appointment with the patient"""
+    key = (doctor_id, patient_id)
+    if access_cache.get(key):
+        return True
+    # Primary key lookup on doctor_patients
+    allowed = db.get(models.DoctorPatient, key) is not None
+    if allowed and DOCTOR_PATIENT_CACHE_TTL > 0:
+        access_cache.set(key, True)
+    return allowed
+
+
+def backfill(connection) -> int:
+    """Rebuild doctor_patients from appointments, returns the number of pairs"""
+    connection.execute(delete(models.DoctorPatient))
+    pairs = select(models.Appointment.doctor_id, models.Appointment.patient_id).where(
+        models.Appointment.doctor_id.is_not(None),
+        models.Appointment.patient_id.is_not(None),
+    ).distinct()
+    result = connection.execute(
+        insert(models.DoctorPatient).from_select(["doctor_id", "patient_id"], pairs)
+    )
+    access_cache.clear()
+    return result.rowcount
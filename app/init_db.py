@@ -1,7 +1,7 @@
 import os
 import logging
 from sqlalchemy.orm import Session
-from app import crud, models, schemas
+from app import crud, doctor_patients, migrations, models, schemas
 from app.database import SessionLocal, engine
 from app.security import get_password_hash
 from dotenv import load_dotenv
@@ -71,12 +71,41 @@ def create_default_admin():
     finally:
         db.close()
 
+# Apply pending migrations at app startup. Off by default: workers starting
+# together would race on the same DDL, so run `python -m app.init_db migrate`
+# before deploying; only turn it on for a single-worker setup
+AUTO_MIGRATE = os.getenv("DATABASE_AUTO_MIGRATE", "false").strip().lower() in ("1", "true", "yes", "on")
+
+def migrate():
+    """Create missing tables and apply pending migrations."""
+    version = migrations.upgrade(engine)
+    logger.info(f"Database tables created or verified (schema version {version})")
+    return version
+
+def check_schema():
+    """Startup check: one query when the schema is current, migrate otherwise."""
+    version = migrations.stored_version(engine)
+    if version == migrations.latest_version():
+        logger.info(f"Database schema is current (version {version})")
+        return version
+    if not AUTO_MIGRATE:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {migrations.latest_version()}. "
+            "Run `python -m app.init_db migrate`."
+        )
+    return migrate()
+
+def backfill_doctor_patients():
+    """Rebuild the doctor/patient access table from appointments."""
+    with engine.begin() as connection:
+        pairs = doctor_patients.backfill(connection)
+    logger.info(f"doctor_patients rebuilt with {pairs} pairs")
+
 def init_db():
     """Initialize the database with default data if needed."""
     
-    # Create tables if they don't exist
-    models.Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created or verified")
+    # Create tables if they don't exist and apply pending migrations
+    migrate()
     
     # Create default admin
     create_default_admin()
@@ -84,6 +113,24 @@ def init_db():
     logger.info("Database initialization completed")
 
 if __name__ == "__main__":
-    logger.info("Initializing database...")
-    init_db()
-    logger.info("Database initialization completed")
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MediLink database tasks")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="init",
+        choices=["init", "migrate", "create-admin", "backfill-doctor-patients"],
+        help="init = migrate + create-admin (default)",
+    )
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate()
+    elif args.command == "create-admin":
+        create_default_admin()
+    elif args.command == "backfill-doctor-patients":
+        backfill_doctor_patients()
+    else:
+        logger.info("Initializing database...")
+        init_db()
\ No newline at end of file
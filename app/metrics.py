@@ -0,0 +1,68 @@
+import threading
+from typing import Dict, Sequence
+
+# Latency buckets in seconds
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram that can be updated from worker threads"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counts = list(self._counts)
+            count, total, maximum = self._count, self._sum, self._max
+        # Cumulative counts, like Prometheus "le" buckets
+        buckets = {}
+        running = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            buckets[f"le_{bound}"] = running
+        buckets["le_inf"] = running + counts[-1]
+        return {
+            "count": count,
+            "sum": total,
+            "avg": total / count if count else 0.0,
+            "max": maximum,
+            "buckets": buckets,
+        }
+
+
+class Counters:
+    """A set of named counters that can be updated from worker threads"""
+
+    def __init__(self, *names: str):
+        self._values = {name: 0 for name in names}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + amount
+
+    def get(self, name: str) -> int:
+        return self._values.get(name, 0)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._values)
@@ -0,0 +1,142 @@
+import logging
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, exc, func, inspect, insert, select, text
+from sqlalchemy.schema import CreateColumn
+
+from app import doctor_patients, models, reservations
+
+logger = logging.getLogger(__name__)
+
+# Applied migrations, kept out of models.Base so create_all never touches it
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255)),
+    Column("applied_at", DateTime, server_default=func.now()),
+)
+
+# (version, description, function(connection)) in the order they are applied
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register a schema migration; versions must be added in increasing order"""
+    def decorator(fn):
+        if MIGRATIONS and MIGRATIONS[-1][0] >= version:
+            raise ValueError(f"Migration {version} is out of order")
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return decorator
+
+
+def _create_indexes(connection, table, *names):
+    # Index definitions live on the models, checkfirst makes reruns harmless
+    indexes = {index.name: index for index in models.Base.metadata.tables[table].indexes}
+    for name in names:
+        indexes[name].create(connection, checkfirst=True)
+
+
+def _add_columns(connection, table, *names):
+    # Column definitions live on the models, columns that already exist are skipped
+    existing = {column["name"] for column in inspect(connection).get_columns(table)}
+    columns = models.Base.metadata.tables[table].c
+    for name in names:
+        if name not in existing:
+            ddl = CreateColumn(columns[name]).compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {ddl}"))
+
+
+@migration(1, "Composite indexes for dashboard, list and slot queries")
+def _hot_path_indexes(connection):
+    _create_indexes(
+        connection,
+        "appointments",
+        "ix_appointments_doctor_id_appointment_time",
+        "ix_appointments_patient_id_appointment_time",
+        "ix_appointments_status",
+    )
+    _create_indexes(connection, "health_records", "ix_health_records_doctor_id_created_at")
+    _create_indexes(connection, "feedbacks", "ix_feedbacks_appointment_id")
+    _create_indexes(connection, "notifications", "ix_notifications_user_id_is_read")
+    _create_indexes(connection, "doctor_schedules", "ix_doctor_schedules_doctor_id_day")
+
+
+@migration(2, "doctor_patients table for doctor access checks")
+def _doctor_patients(connection):
+    models.DoctorPatient.__table__.create(connection, checkfirst=True)
+    pairs = doctor_patients.backfill(connection)
+    logger.info(f"Backfilled {pairs} doctor/patient pairs")
+
+
+
+@migration(3, "slot_reservations table for race-free booking")
+def _slot_reservations(connection):
+    models.SlotReservation.__table__.create(connection, checkfirst=True)
+    conflicts = reservations.backfill(connection)
+    if conflicts:
+        logger.warning(f"{conflicts} active appointments overlap an earlier booking, see the warnings above")
+
+
+@migration(4, "Slot length per schedule and duration per appointment")
+def _durations(connection):
+    _add_columns(connection, "doctor_schedules", "slot_duration_minutes")
+    # Existing appointments keep the 30 minute default
+    _add_columns(connection, "appointments", "duration_minutes")
+
+
+@migration(5, "schedule_exceptions and availability_days tables")
+def _availability_horizon(connection):
+    models.ScheduleException.__table__.create(connection, checkfirst=True)
+    # Rows are added and filled by the availability horizon refresh job
+    models.AvailabilityDay.__table__.create(connection, checkfirst=True)
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(connection):
+    if not inspect(connection).has_table(schema_version.name):
+        return None
+    return connection.scalar(select(func.max(schema_version.c.version))) or 0
+
+
+def stored_version(engine):
+    """Schema version with a single query and no reflection, None if never migrated"""
+    try:
+        with engine.connect() as connection:
+            return connection.scalar(select(func.max(schema_version.c.version))) or 0
+    except exc.DBAPIError:
+        # schema_version table doesn't exist yet
+        return None
+
+
+def _record(connection, version, description):
+    connection.execute(insert(schema_version).values(version=version, description=description))
+
+
+def upgrade(engine):
+    """Create missing tables and apply pending migrations, returns the new schema version"""
+    with engine.begin() as connection:
+        # A database without any of our tables gets the full schema from the models
+        fresh = not inspect(connection).has_table(models.User.__tablename__)
+        models.Base.metadata.create_all(bind=connection)
+        version_metadata.create_all(bind=connection)
+        version = current_version(connection)
+        if fresh and not version:
+            for number, description, _ in MIGRATIONS:
+                _record(connection, number, description)
+            logger.info(f"Created schema at version {latest_version()}")
+            return latest_version()
+
+    for number, description, fn in MIGRATIONS:
+        if number <= version:
+            continue
+        logger.info(f"Applying migration {number}: {description}")
+        # One transaction per migration (MySQL commits DDL implicitly anyway)
+        with engine.begin() as connection:
+            fn(connection)
+            _record(connection, number, description)
+        version = number
+    return version
@@ -1,6 +1,7 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Float, Text, Date, Time, Enum
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Float, Text, Date, Time, Enum, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import datetime
 import enum
 
 from app.database import Base
@@ -55,6 +56,7 @@ class Doctor(Base):
     appointments = relationship("Appointment", back_populates="doctor")
     health_records = relationship("HealthRecord", back_populates="doctor")
     schedules = relationship("DoctorSchedule", back_populates="doctor")
+    schedule_exceptions = relationship("ScheduleException", back_populates="doctor", cascade="all, delete-orphan")
     feedbacks = relationship("Feedback", back_populates="doctor")
 
 class Admin(Base):
@@ -77,15 +79,22 @@ class AppointmentStatus(str, enum.Enum):
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        Index("ix_appointments_doctor_id_appointment_time", "doctor_id", "appointment_time"),
+        Index("ix_appointments_patient_id_appointment_time", "patient_id", "appointment_time"),
+        Index("ix_appointments_status", "status"),
+    )
 
     appointment_id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.patient_id"))
     doctor_id = Column(Integer, ForeignKey("doctors.doctor_id"))
     appointment_time = Column(DateTime, nullable=False)
+    # Minutes the appointment keeps the doctor busy, NULL for the 30 minute default
+    duration_minutes = Column(Integer)
     status = Column(Enum(AppointmentStatus), default=AppointmentStatus.scheduled)
     reason = Column(Text)
-    created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, default=datetime.now, server_default=func.now())
+    updated_at = Column(DateTime, default=datetime.now, server_default=func.now(), onupdate=datetime.now)
     
     # Relationships
     patient = relationship("Patient", back_populates="appointments")
@@ -94,21 +103,88 @@ class Appointment(Base):
     billings = relationship("Billing", back_populates="appointment")
     feedbacks = relationship("Feedback", back_populates="appointment")
 
+# Doctor/patient pairs with at least one appointment, kept in step with the
+# appointments table by crud so access checks are a primary key lookup
+class DoctorPatient(Base):
+    __tablename__ = "doctor_patients"
+
+    doctor_id = Column(Integer, ForeignKey("doctors.doctor_id"), primary_key=True)
+    patient_id = Column(Integer, ForeignKey("patients.patient_id"), primary_key=True)
+    created_at = Column(DateTime, default=datetime.now, server_default=func.now())
+
+# One row per 5 minute tick covered by an active appointment. The primary key
+# makes overlapping bookings of a doctor fail on insert, see app/reservations.py
+class SlotReservation(Base):
+    __tablename__ = "slot_reservations"
+    __table_args__ = (
+        Index("ix_slot_reservations_appointment_id", "appointment_id"),
+    )
+
+    doctor_id = Column(Integer, ForeignKey("doctors.doctor_id"), primary_key=True)
+    slot_start = Column(DateTime, primary_key=True)
+    appointment_id = Column(Integer, ForeignKey("appointments.appointment_id"), nullable=False)
+
 class DoctorSchedule(Base):
     __tablename__ = "doctor_schedules"
+    __table_args__ = (
+        Index("ix_doctor_schedules_doctor_id_day", "doctor_id", "day"),
+    )
 
     schedule_id = Column(Integer, primary_key=True, index=True)
     doctor_id = Column(Integer, ForeignKey("doctors.doctor_id"))
     day = Column(String(20), nullable=False)
     start_time = Column(Time, nullable=False)
     end_time = Column(Time, nullable=False)
+    slot_duration_minutes = Column(Integer, nullable=False, default=30, server_default="30")
     is_available = Column(Boolean, default=True)
     
     # Relationships
     doctor = relationship("Doctor", back_populates="schedules")
 
+# Overrides the weekly schedule on one date: leave or a blocked window when
+# is_available is false (no times means the whole day), an extra clinic when true
+class ScheduleException(Base):
+    __tablename__ = "schedule_exceptions"
+    __table_args__ = (
+        Index("ix_schedule_exceptions_doctor_id_date", "doctor_id", "date"),
+    )
+
+    exception_id = Column(Integer, primary_key=True, index=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.doctor_id"), nullable=False)
+    date = Column(Date, nullable=False)
+    start_time = Column(Time)
+    end_time = Column(Time)
+    is_available = Column(Boolean, nullable=False, default=False)
+    slot_duration_minutes = Column(Integer, nullable=False, default=30, server_default="30")
+    reason = Column(String(255))
+
+    # Relationships
+    doctor = relationship("Doctor", back_populates="schedule_exceptions")
+
+# Materialized free slots of a doctor-day within the availability horizon, see
+# app/availability_horizon.py. Changes bump `version` and set `is_stale` in
+# their own transaction; the refresh job only stores slots computed under the
+# version it read.
+class AvailabilityDay(Base):
+    __tablename__ = "availability_days"
+    __table_args__ = (
+        Index("ix_availability_days_is_stale_day", "is_stale", "day"),
+    )
+
+    doctor_id = Column(Integer, ForeignKey("doctors.doctor_id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    # Slot bitmaps as stored by app.availability_cache.encode, NULL when the
+    # slots are off the 5 minute grid and have to be computed on read
+    slots = Column(LargeBinary)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    is_stale = Column(Boolean, nullable=False, default=True)
+    refreshed_at = Column(DateTime)
+
 class HealthRecord(Base):
     __tablename__ = "health_records"
+    __table_args__ = (
+        Index("ix_health_records_doctor_id_created_at", "doctor_id", "created_at"),
+    )
 
     record_id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.patient_id"))
@@ -117,8 +193,8 @@ class HealthRecord(Base):
     symptoms = Column(Text)
     diagnosis = Column(Text)
     notes = Column(Text)
-    created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, default=datetime.now, server_default=func.now())
+    updated_at = Column(DateTime, default=datetime.now, server_default=func.now(), onupdate=datetime.now)
     
     # Relationships
     patient = relationship("Patient", back_populates="health_records")
@@ -136,7 +212,7 @@ class Prescription(Base):
     dosage = Column(String(100))
     instructions = Column(Text)
     duration = Column(String(100))
-    created_at = Column(DateTime, server_default=func.now())
+    created_at = Column(DateTime, default=datetime.now, server_default=func.now())
     
     # Relationships
     health_record = relationship("HealthRecord", back_populates="prescriptions")
@@ -157,8 +233,8 @@ class Test(Base):
     result = Column(Text)
     report_url = Column(String(255))
     ordered_by = Column(Integer, ForeignKey("doctors.doctor_id"))
-    created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, default=datetime.now, server_default=func.now())
+    updated_at = Column(DateTime, default=datetime.now, server_default=func.now(), onupdate=datetime.now)
     
     # Relationships
     health_record = relationship("HealthRecord", back_populates="tests")
@@ -179,8 +255,8 @@ class Billing(Base):
     amount = Column(Float, nullable=False)
     status = Column(Enum(BillingStatus), default=BillingStatus.pending)
     payment_method = Column(String(100))
-    created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, default=datetime.now, server_default=func.now())
+    updated_at = Column(DateTime, default=datetime.now, server_default=func.now(), onupdate=datetime.now)
     
     # Relationships
     patient = relationship("Patient", back_populates="billings")
@@ -188,6 +264,9 @@ class Billing(Base):
 
 class Feedback(Base):
     __tablename__ = "feedbacks"
+    __table_args__ = (
+        Index("ix_feedbacks_appointment_id", "appointment_id"),
+    )
 
     feedback_id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.patient_id"))
@@ -195,7 +274,7 @@ class Feedback(Base):
     appointment_id = Column(Integer, ForeignKey("appointments.appointment_id"))
     rating = Column(Integer)
     comment = Column(Text)
-    created_at = Column(DateTime, server_default=func.now())
+    created_at = Column(DateTime, default=datetime.now, server_default=func.now())
     
     # Relationships
     patient = relationship("Patient", back_populates="feedbacks")
@@ -217,12 +296,15 @@ class Insurance(Base):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_id_is_read", "user_id", "is_read"),
+    )
 
     notification_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id"))
     title = Column(String(255), nullable=False)
     message = Column(Text, nullable=False)
-    timestamp = Column(DateTime, server_default=func.now())
+    timestamp = Column(DateTime, default=datetime.now, server_default=func.now())
     is_read = Column(Boolean, default=False)
     
     # Relationships
@@ -0,0 +1,95 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Mapping, Optional, Sequence
+
+from fastapi import Response
+from sqlalchemy import and_, or_
+
+# Response header carrying the cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor can't be decoded"""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if hasattr(value, "value"):
+        # Enum columns
+        return value.value
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+    return value
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Opaque cursor for the sort key values of the last row of a page"""
+    raw = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursorError("Invalid cursor")
+    if not isinstance(values, list):
+        raise InvalidCursorError("Invalid cursor")
+    return [_decode_value(value) for value in values]
+
+
+def _after(columns, values):
+    # (a, b) > (x, y) written out as a > x OR (a = x AND b > y), which both
+    # MySQL and SQLite can serve from an index on (a, b)
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, column > values[i]))
+    return or_(*clauses)
+
+
+def page(query, columns: Sequence, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Order a Query or Core select() by its sort key and limit it to one page"""
+    query = query.order_by(*columns)
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(columns):
+            raise InvalidCursorError("Invalid cursor")
+        query = query.filter(_after(columns, values))
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+
+def paginate(query, columns: Sequence, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Order a query by its sort key and return one page, by cursor or by offset"""
+    return page(query, columns, skip, limit, cursor).all()
+
+
+def next_cursor(items: Sequence, columns: Sequence, limit: int) -> Optional[str]:
+    """Cursor for the page after `items` (ORM objects or row dicts), or None on the last page"""
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    if isinstance(last, Mapping):
+        return encode_cursor([last[column.key] for column in columns])
+    return encode_cursor([getattr(last, column.key) for column in columns])
+
+
+def set_next_cursor(response: Response, items: Sequence, columns: Sequence, limit: int):
+    cursor = next_cursor(items, columns, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
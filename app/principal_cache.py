@@ -0,0 +1,110 @@
+import logging
+import os
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import models
+from app.cache import LocalInvalidationChannel, RedisInvalidationChannel, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Users looked up by token subject (email) are kept for this many seconds, 0 disables the cache
+PRINCIPAL_CACHE_TTL = float(os.environ.get("PRINCIPAL_CACHE_TTL", 60))
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", 10000))
+# Redis URL used to broadcast invalidations to every worker (needs `pip install redis`)
+PRINCIPAL_CACHE_REDIS_URL = os.environ.get("PRINCIPAL_CACHE_REDIS_URL")
+INVALIDATION_CHANNEL = "medilink:principal-cache:invalidate"
+
+# Columns kept per user; the password hash is left out and loads on access if needed
+CACHED_COLUMNS = ("user_id", "email", "role", "is_active")
+# The role profile is cached with its user, keyed by the user's role
+PROFILE_MODELS = {"patient": models.Patient, "doctor": models.Doctor, "admin": models.Admin}
+
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+
+def _create_channel():
+    if PRINCIPAL_CACHE_REDIS_URL:
+        try:
+            return RedisInvalidationChannel(PRINCIPAL_CACHE_REDIS_URL, INVALIDATION_CHANNEL)
+        except ImportError:
+            logger.warning("PRINCIPAL_CACHE_REDIS_URL is set but redis is not installed; invalidations stay local")
+    return LocalInvalidationChannel()
+
+
+invalidation_channel = _create_channel()
+invalidation_channel.subscribe(principal_cache.delete)
+
+
+def _attach(db: Session, model, data):
+    instance = model(**data)
+    make_transient_to_detached(instance)
+    return db.merge(instance, load=False)
+
+
+def get_cached_user(db: Session, email: str):
+    """Cached user and role profile attached to `db` without a query, or None on a miss"""
+    entry = principal_cache.get(email)
+    if entry is None:
+        return None
+    user_data, profile_data = entry
+    user = _attach(db, models.User, user_data)
+    profile = _attach(db, PROFILE_MODELS[user.role], profile_data)
+    set_committed_value(user, user.role, profile)
+    set_committed_value(profile, "user", user)
+    # Other relationships still lazy load through this session
+    return user
+
+
+def cache_user(user: models.User):
+    """Cache a user loaded by crud.get_user_with_profile"""
+    if PRINCIPAL_CACHE_TTL <= 0 or user.role not in PROFILE_MODELS:
+        return
+    profile = getattr(user, user.role)
+    if profile is None:
+        # Only cached once the profile exists, so a missing profile is never served stale
+        return
+    principal_cache.set(user.email, (
+        {column: getattr(user, column) for column in CACHED_COLUMNS},
+        {attr.key: getattr(profile, attr.key) for attr in inspect(profile).mapper.column_attrs},
+    ))
+
+
+def _evict(email: str):
+    principal_cache.delete(email)
+    try:
+        invalidation_channel.publish(email)
+    except Exception:
+        # Other workers fall back to the TTL
+        logger.exception("Failed to publish principal cache invalidation")
+
+
+def invalidate_user(db: Session, *emails: str):
+    """Drop users from every worker's cache now, and again once `db` commits
+
+    The second eviction covers a concurrent request that re-cached the old
+    row between this call and the commit.
+    """
+    for email in emails:
+        _evict(email)
+    db.info.setdefault("invalidate_principals", set()).update(emails)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    for email in session.info.pop("invalidate_principals", ()):
+        _evict(email)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session):
+    session.info.pop("invalidate_principals", None)
+
+
+def get_principal_cache_stats():
+    return {
+        **principal_cache.snapshot(),
+        "channel": type(invalidation_channel).__name__,
+    }
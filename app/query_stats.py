@@ -0,0 +1,147 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Add the X-DB-Queries header and a log line per request
+QUERY_STATS_DEBUG = os.environ.get("QUERY_STATS_DEBUG", "").strip().lower() in ("1", "true", "yes", "on")
+# Warn when one statement runs more than this many times in a single request
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("QUERY_STATS_N_PLUS_ONE_THRESHOLD", 10))
+
+QUERY_STATS_HEADER = "X-DB-Queries"
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# format / pyformat placeholders (mysql drivers) are normalized to qmark first
+_placeholders = re.compile(r"%\(\w+\)s|%s")
+_in_lists = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_whitespace = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Statement text with literals and IN lists collapsed, to group repeats"""
+    statement = _literals.sub("?", statement)
+    statement = _placeholders.sub("?", statement)
+    statement = _in_lists.sub("(?)", statement)
+    return _whitespace.sub(" ", statement).strip()
+
+
+class QueryStats:
+    """Statements and database time recorded for one request (or block)"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration: float):
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+            self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD):
+        """Fingerprints that ran more than `threshold` times, most frequent first"""
+        return [(statement, count) for statement, count in self.fingerprints.most_common() if count > threshold]
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+def track_queries(engine):
+    """Record every statement run on this engine into the current request's stats"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Kept on the execution context, so a statement that raises leaves nothing behind
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        if stats is not None:
+            stats.record(statement, time.perf_counter() - context._query_start)
+
+    return engine
+
+
+class QueryStatsMiddleware:
+    """Collects per-request statement counts, logs them and flags N+1 patterns"""
+
+    def __init__(self, app, debug: bool = QUERY_STATS_DEBUG, threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.debug = debug
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_with_stats(message):
+            if self.debug and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                value = f"count={stats.count}; time_ms={stats.duration * 1000:.1f}"
+                headers.append((QUERY_STATS_HEADER.lower().encode(), value.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current.reset(token)
+            path = scope.get("path", "")
+            if self.debug:
+                logger.info(f"{scope.get('method')} {path}: {stats.count} queries in {stats.duration * 1000:.1f} ms")
+            for statement, count in stats.repeated(self.threshold):
+                logger.warning(f"Possible N+1 on {path}: statement ran {count} times: {statement[:200]}")
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Count statements run on `engine` (any thread) inside the block
+
+    Works with TestClient, which runs the app in another thread:
+
+        with count_queries() as stats:
+            client.get("/patients/prescriptions")
+        assert stats.count <= 5
+    """
+    if engine is None:
+        from app.database import engine
+    stats = QueryStats()
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        stats.record(statement, 0.0)
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        yield stats
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+
+@contextmanager
+def assert_max_queries(budget: int, engine=None):
+    """Fail (AssertionError, so pytest reports it) if the block runs more than `budget` statements"""
+    with count_queries(engine) as stats:
+        yield stats
+    if stats.count > budget:
+        top = "\n".join(f"  {count}x {statement[:200]}" for statement, count in stats.fingerprints.most_common(5))
+        raise AssertionError(f"{stats.count} queries run, budget is {budget}. Most frequent:\n{top}")
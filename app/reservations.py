@@ -0,0 +1,121 @@
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+
+from app import availability, models
+
+logger = logging.getLogger(__name__)
+
+# Appointments in these states hold their slot
+ACTIVE_STATUSES = (models.AppointmentStatus.scheduled, models.AppointmentStatus.confirmed)
+
+# InnoDB picks a deadlock victim when several bookings wait on a reservation
+# whose holder rolls back; the victim lost the race like any other conflict
+MYSQL_DEADLOCK = 1213
+
+
+class SlotUnavailableError(Exception):
+    """Raised when a booking overlaps a slot the doctor already has reserved"""
+
+
+def slot_starts(appointment_time: datetime, duration: Optional[int] = None) -> List[datetime]:
+    """Starts of the 5 minute ticks an appointment at `appointment_time` covers"""
+    tick = timedelta(minutes=availability.TICK_MINUTES)
+    start = appointment_time.replace(second=0, microsecond=0)
+    start -= timedelta(minutes=start.minute % availability.TICK_MINUTES)
+    end = appointment_time + timedelta(minutes=duration or availability.APPOINTMENT_MINUTES)
+    starts = []
+    while start < end:
+        starts.append(start)
+        start += tick
+    return starts
+
+
+def _rows(appointment_id: int, doctor_id: int, appointment_time: datetime, duration: Optional[int] = None) -> List[dict]:
+    return [
+        {"doctor_id": doctor_id, "slot_start": start, "appointment_id": appointment_id}
+        for start in slot_starts(appointment_time, duration)
+    ]
+
+
+def reserve(db: Session, appointment: models.Appointment):
+    """Reserve the appointment's time with the doctor
+
+    All ticks go in one multi-row INSERT, so a booking that overlaps another
+    fails on the primary key in the same round trip, with only row locks.
+    The caller owns the transaction and must roll it back on
+    SlotUnavailableError.
+    """
+    if appointment.doctor_id is None or appointment.status not in ACTIVE_STATUSES:
+        return
+    try:
+        rows = _rows(
+            appointment.appointment_id,
+            appointment.doctor_id,
+            appointment.appointment_time,
+            appointment.duration_minutes,
+        )
+        db.execute(insert(models.SlotReservation).values(rows))
+    except IntegrityError as exc:
+        raise SlotUnavailableError("This time slot is no longer available") from exc
+    except OperationalError as exc:
+        if exc.orig is not None and exc.orig.args and exc.orig.args[0] == MYSQL_DEADLOCK:
+            raise SlotUnavailableError("This time slot is no longer available") from exc
+        raise
+
+
+def release(db: Session, appointment_id: int):
+    """Free the slot held by an appointment"""
+    db.execute(delete(models.SlotReservation).where(models.SlotReservation.appointment_id == appointment_id))
+
+
+def prune(connection, before: datetime) -> int:
+    """Drop the reservations of ticks before `before`, returns how many were removed
+
+    Every active appointment keeps a row per tick, so without this the table
+    only grows. Bookings dated before `before` are no longer checked for
+    overlaps afterwards.
+    """
+    return connection.execute(
+        delete(models.SlotReservation).where(models.SlotReservation.slot_start < before)
+    ).rowcount
+
+
+def backfill(connection) -> int:
+    """Reserve the slots of active appointments, returns how many overlap an earlier one"""
+    connection.execute(delete(models.SlotReservation))
+    appointments = connection.execute(
+        select(
+            models.Appointment.appointment_id,
+            models.Appointment.doctor_id,
+            models.Appointment.appointment_time,
+        )
+        .where(
+            models.Appointment.doctor_id.is_not(None),
+            models.Appointment.status.in_(ACTIVE_STATUSES),
+        )
+        .order_by(models.Appointment.appointment_time, models.Appointment.appointment_id)
+    ).all()
+    conflicts = 0
+    for appointment in appointments:
+        # Existing double bookings are kept; the later appointment only holds
+        # the ticks that are still free
+        # Runs before appointments.duration_minutes exists (migration 3), so
+        # every appointment here has the default length
+        rows = _rows(appointment.appointment_id, appointment.doctor_id, appointment.appointment_time)
+        statement = (
+            insert(models.SlotReservation)
+            .prefix_with("IGNORE", dialect="mysql")
+            .prefix_with("OR IGNORE", dialect="sqlite")
+            .values(rows)
+        )
+        if connection.execute(statement).rowcount < len(rows):
+            conflicts += 1
+            logger.warning(
+                f"Appointment {appointment.appointment_id} overlaps another booking of doctor {appointment.doctor_id}"
+            )
+    return conflicts
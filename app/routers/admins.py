@@ -1,15 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Form, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import RedirectResponse, HTMLResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy import func, or_, select
 import sqlalchemy.orm
 from typing import List, Optional
 from datetime import datetime, timedelta, date
 
 from app import crud, schemas, models
-from app.database import get_db
-from app.dependencies import get_current_active_user, check_admin_role
+from app.database import get_db, get_pool_stats
+from app.principal_cache import get_principal_cache_stats
+from app.availability_cache import get_availability_cache_stats
+from app.availability_horizon import get_availability_horizon_stats
+from app.pagination import set_next_cursor
+from app.dependencies import get_current_active_user, check_admin_role, current_admin
 from app.security import get_password_hash
 
 router = APIRouter(
@@ -22,12 +26,9 @@ templates = Jinja2Templates(directory="app/templates")
 def admin_dashboard(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_admin_role)
+    current_user: models.User = Depends(check_admin_role),
+    admin: models.Admin = Depends(current_admin)
 ):
-    admin = crud.get_admin_by_user_id(db, current_user.user_id)
-    if not admin:
-        raise HTTPException(status_code=404, detail="Admin profile not found")
-    
     # Get counts for dashboard
     user_count = db.query(models.User).count()
     patient_count = db.query(models.Patient).count()
@@ -56,12 +57,9 @@ def admin_doctors(
     search: Optional[str] = None,
     specialization_id: Optional[int] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_admin_role)
+    current_user: models.User = Depends(check_admin_role),
+    admin: models.Admin = Depends(current_admin)
 ):
-    admin = crud.get_admin_by_user_id(db, current_user.user_id)
-    if not admin:
-        raise HTTPException(status_code=404, detail="Admin profile not found")
-    
     # Get all specializations for the dropdown filter
     specializations = crud.get_specializations(db)
     
@@ -102,12 +100,9 @@ def admin_doctor_detail(
     request: Request,
     doctor_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_admin_role)
+    current_user: models.User = Depends(check_admin_role),
+    admin: models.Admin = Depends(current_admin)
 ):
-    admin = crud.get_admin_by_user_id(db, current_user.user_id)
-    if not admin:
-        raise HTTPException(status_code=404, detail="Admin profile not found")
-    
     # Get doctor with all relationships
     doctor = db.query(models.Doctor).options(
         sqlalchemy.orm.joinedload(models.Doctor.user),
@@ -153,12 +148,9 @@ def admin_patients(
     search: Optional[str] = None,
     gender: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_admin_role)
+    current_user: models.User = Depends(check_admin_role),
+    admin: models.Admin = Depends(current_admin)
 ):
-    admin = crud.get_admin_by_user_id(db, current_user.user_id)
-    if not admin:
-        raise HTTPException(status_code=404, detail="Admin profile not found")
-    
     # Build query for patients
     query = db.query(models.Patient).options(
         sqlalchemy.orm.joinedload(models.Patient.user)
@@ -195,12 +187,9 @@ def admin_patient_detail(
     request: Request,
     patient_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_admin_role)
+    current_user: models.User = Depends(check_admin_role),
+    admin: models.Admin = Depends(current_admin)
 ):
-    admin = crud.get_admin_by_user_id(db, current_user.user_id)
-    if not admin:
-        raise HTTPException(status_code=404, detail="Admin profile not found")
-    
     # Get patient with all relationships
     patient = db.query(models.Patient).options(
         sqlalchemy.orm.joinedload(models.Patient.user),
@@ -247,13 +236,10 @@ def admin_appointments(
     status: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(check_admin_role),
+    admin: models.Admin = Depends(current_admin),
     appointment_date: Optional[str] = Form(None),
     appointment_time: Optional[str] = Form(None)
 ):
-    admin = crud.get_admin_by_user_id(db, current_user.user_id)
-    if not admin:
-        raise HTTPException(status_code=404, detail="Admin profile not found")
-    
     # Get all doctors for dropdown filter
     doctors = crud.get_doctors(db)
     
@@ -315,12 +301,9 @@ def admin_users(
     request: Request,
     search: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_admin_role)
+    current_user: models.User = Depends(check_admin_role),
+    admin: models.Admin = Depends(current_admin)
 ):
-    admin = crud.get_admin_by_user_id(db, current_user.user_id)
-    if not admin:
-        raise HTTPException(status_code=404, detail="Admin profile not found")
-    
     # Get users with search filter if provided
     query = db.query(models.User)
     if search:
@@ -353,30 +336,32 @@ def create_user(
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Create user
-    user = crud.create_user(db, schemas.UserCreate(
-        email=email,
-        password=password,
-        role=role
-    ))
-    
-    # Create profile based on role
-    if role == "patient":
-        crud.create_patient(db, schemas.PatientCreate(
-            user_id=user.user_id,
-            name=name
-        ))
-    elif role == "doctor":
-        crud.create_doctor(db, schemas.DoctorCreate(
-            user_id=user.user_id,
-            name=name
-        ))
-    elif role == "admin":
-        crud.create_admin(db, schemas.AdminCreate(
-            user_id=user.user_id,
-            name=name
+    # User and profile are committed together
+    with crud.unit_of_work(db):
+        # Create user
+        user = crud.create_user(db, schemas.UserCreate(
+            email=email,
+            password=password,
+            role=role
         ))
     
+        # Create profile based on role
+        if role == "patient":
+            crud.create_patient(db, schemas.PatientCreate(
+                user_id=user.user_id,
+                name=name
+            ))
+        elif role == "doctor":
+            crud.create_doctor(db, schemas.DoctorCreate(
+                user_id=user.user_id,
+                name=name
+            ))
+        elif role == "admin":
+            crud.create_admin(db, schemas.AdminCreate(
+                user_id=user.user_id,
+                name=name
+            ))
+    
     return RedirectResponse(url="/admins/users", status_code=303)
 
 @router.post("/admins/users/{user_id}/update")
@@ -418,12 +403,9 @@ def reset_user_password(
 def admin_specializations(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_admin_role)
+    current_user: models.User = Depends(check_admin_role),
+    admin: models.Admin = Depends(current_admin)
 ):
-    admin = crud.get_admin_by_user_id(db, current_user.user_id)
-    if not admin:
-        raise HTTPException(status_code=404, detail="Admin profile not found")
-    
     # Get all specializations
     specializations = crud.get_specializations(db)
     
@@ -505,14 +487,45 @@ def create_admin_api(
 
 @router.get("/api/admins", response_model=List[schemas.AdminResponse])
 def read_admins_api(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(check_admin_role)
 ):
-    admins = crud.get_admins(db, skip=skip, limit=limit)
+    admins = crud.get_admins(db, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(response, admins, crud.ADMIN_SORT, limit)
     return admins
 
+@router.get("/api/admins/stats/db-pool")
+def read_db_pool_stats_api(
+    current_user: models.User = Depends(check_admin_role)
+):
+    # Stats are per worker process, sum them across workers when sizing the pool
+    return get_pool_stats()
+
+@router.get("/api/admins/stats/principal-cache")
+def read_principal_cache_stats_api(
+    current_user: models.User = Depends(check_admin_role)
+):
+    # Hit rate of the get_current_user cache in this worker process
+    return get_principal_cache_stats()
+
+@router.get("/api/admins/stats/availability-cache")
+def read_availability_cache_stats_api(
+    current_user: models.User = Depends(check_admin_role)
+):
+    # Hit rate of the doctor availability cache in this worker process
+    return get_availability_cache_stats()
+
+@router.get("/api/admins/stats/availability-horizon")
+def read_availability_horizon_stats_api(
+    current_user: models.User = Depends(check_admin_role)
+):
+    # Materialized availability reads and refreshes in this worker, plus stale doctor-days overall
+    return get_availability_horizon_stats()
+
 @router.get("/api/admins/{admin_id}", response_model=schemas.AdminResponse)
 def read_admin_api(
     admin_id: int,
@@ -524,6 +537,18 @@ def read_admin_api(
         raise HTTPException(status_code=404, detail="Admin not found")
     return db_admin
 
+@router.put("/api/admins/schedule-template", response_model=schemas.WeeklyScheduleTemplateResult)
+def apply_weekly_template_api(
+    template: schemas.WeeklyScheduleTemplateApply,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(check_admin_role)
+):
+    found = set(db.scalars(select(models.Doctor.doctor_id).filter(models.Doctor.doctor_id.in_(template.doctor_ids))).all())
+    missing = sorted(set(template.doctor_ids) - found)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Doctors not found: {', '.join(map(str, missing))}")
+    return crud.apply_weekly_template(db, template.doctor_ids, template.schedules)
+
 @router.put("/api/admins/{admin_id}", response_model=schemas.AdminResponse)
 def update_admin_api(
     admin_id: int,
@@ -627,11 +652,14 @@ def create_specialization_api(
 
 @router.get("/api/specializations", response_model=List[schemas.SpecializationResponse])
 def read_specializations_api(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    specializations = crud.get_specializations(db, skip=skip, limit=limit)
+    specializations = crud.get_specializations(db, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(response, specializations, crud.SPECIALIZATION_SORT, limit)
     return specializations
 
 @router.get("/api/specializations/{specialization_id}", response_model=schemas.SpecializationResponse)
@@ -645,7 +673,7 @@ def read_specialization_api(
     return db_specialization
 
 @router.post("/admins/patients/create")
-async def create_patient_by_admin(
+def create_patient_by_admin(
     request: Request,
     email: str = Form(...),
     password: str = Form(...),
@@ -694,7 +722,7 @@ async def create_patient_by_admin(
     return RedirectResponse(url="/admins/patients", status_code=303)
 
 @router.post("/admins/doctors/create")
-async def create_doctor_by_admin(
+def create_doctor_by_admin(
     request: Request,
     email: str = Form(...),
     password: str = Form(...),
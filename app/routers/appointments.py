@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Form, Query
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import RedirectResponse, HTMLResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 
-from app import crud, schemas, models
+from app import availability, crud, schemas, models
 from app.database import get_db
+from app.pagination import set_next_cursor
+from app.serialization import json_list_response
 # Updated dependencies import
-from app.dependencies import get_current_active_user, check_patient_role, check_doctor_role, check_admin_role, check_doctor_or_admin_role
+from app.dependencies import get_current_active_user, check_doctor_role, check_admin_role, check_doctor_or_admin_role, current_patient
 
 router = APIRouter(
     prefix="/api/appointments",
@@ -36,7 +38,7 @@ def create_appointment_api(
     # Basic check: Ensure the user creating the appointment is the patient themselves or an admin
     # More robust checks might be needed depending on application logic
     if current_user.role == "patient":
-        requesting_patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        requesting_patient = current_user.patient
         if not requesting_patient or requesting_patient.patient_id != appointment.patient_id:
             raise HTTPException(status_code=403, detail="Patients can only book appointments for themselves.")
     elif current_user.role != "admin": # Assuming admins can book for anyone
@@ -50,33 +52,65 @@ def create_appointment_api(
 def read_appointments_api(
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user) # Use base dependency
 ):
     # Filter appointments based on user role
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient:
             # Return empty list or raise error? Empty list might be safer.
             return []
             # raise HTTPException(status_code=404, detail="Patient profile not found")
-        appointments = crud.get_patient_appointments(db, patient.patient_id, skip=skip, limit=limit)
+        appointments = crud.get_appointment_rows(db, patient_id=patient.patient_id, skip=skip, limit=limit, cursor=cursor)
 
     elif current_user.role == "doctor":
-        doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+        doctor = current_user.doctor
         if not doctor:
              return []
             # raise HTTPException(status_code=404, detail="Doctor profile not found")
-        appointments = crud.get_doctor_appointments(db, doctor.doctor_id, skip=skip, limit=limit)
+        appointments = crud.get_appointment_rows(db, doctor_id=doctor.doctor_id, skip=skip, limit=limit, cursor=cursor)
 
     elif current_user.role == "admin":
-        appointments = crud.get_appointments(db, skip=skip, limit=limit)
+        appointments = crud.get_appointment_rows(db, skip=skip, limit=limit, cursor=cursor)
 
     else:
         # Should not happen with proper role setup, but good practice
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    return appointments
+    # Rows are serialized straight to JSON, skipping ORM objects and response_model validation
+    response = json_list_response(schemas.AppointmentResponse, appointments)
+    set_next_cursor(response, appointments, crud.APPOINTMENT_SORT, limit)
+    return response
+
+@router.get("/first-available", response_model=List[dict])
+def get_first_available_api(
+    specialization_id: int,
+    from_time: Optional[str] = Query(None, alias="from"),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """Earliest free slots across every doctor of a specialization, from `from` (date or datetime) or now"""
+    now = datetime.now()
+    try:
+        not_before = datetime.fromisoformat(from_time).replace(tzinfo=None) if from_time else now
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid date format. Use YYYY-MM-DD or YYYY-MM-DDTHH:MM")
+    # Slots that already started can't be booked
+    not_before = max(not_before, now)
+
+    slots = crud.get_first_available_slots(db, specialization_id, not_before, limit)
+    return [
+        {
+            "doctor_id": doctor_id,
+            "doctor_name": doctor_name,
+            "date": start_time.date().isoformat(),
+            "start": start_time.strftime("%H:%M"),
+            "end": end_time.strftime("%H:%M"),
+        }
+        for start_time, end_time, doctor_id, doctor_name in slots
+    ]
 
 @router.get("/{appointment_id}", response_model=schemas.AppointmentResponse)
 def read_appointment_api(
@@ -91,13 +125,13 @@ def read_appointment_api(
 
     # Check access rights based on role
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         # Ensure patient profile exists and the appointment belongs to this patient
         if not patient or appointment.patient_id != patient.patient_id:
             raise HTTPException(status_code=403, detail="Not authorized to access this appointment")
 
     elif current_user.role == "doctor":
-        doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+        doctor = current_user.doctor
         # Ensure doctor profile exists and the appointment belongs to this doctor
         if not doctor or appointment.doctor_id != doctor.doctor_id:
             raise HTTPException(status_code=403, detail="Not authorized to access this appointment")
@@ -125,7 +159,7 @@ def update_appointment_api(
     if current_user.role == "admin":
         can_update = True
     elif current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if patient and db_appointment.patient_id == patient.patient_id:
             # Patients can only cancel (or maybe update reason if allowed by schema?)
             if appointment_update.status and appointment_update.status != schemas.AppointmentStatus.cancelled:
@@ -134,7 +168,7 @@ def update_appointment_api(
             # Create a new update schema containing only allowed fields if necessary
             can_update = True # Allow update if status is 'cancelled' or None (e.g., updating reason)
     elif current_user.role == "doctor":
-        doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+        doctor = current_user.doctor
         if doctor and db_appointment.doctor_id == doctor.doctor_id:
             # Doctors might update status (e.g., confirmed, completed, no_show)
             can_update = True
@@ -143,57 +177,61 @@ def update_appointment_api(
         raise HTTPException(status_code=403, detail="Not authorized to update this appointment")
 
 
-    # Perform the update
-    updated_appointment = crud.update_appointment(db, appointment_id, appointment_update)
-    if not updated_appointment:
-         # Should ideally not happen if get_appointment succeeded, but defensive check
-        raise HTTPException(status_code=404, detail="Appointment could not be updated.")
-
-
-    # Create notification for the other party involved in the appointment
-    notification_recipient_user_id = None
-    notification_title = "Appointment Update"
-    notification_message = ""
+    # Update and notifications are committed together
+    with crud.unit_of_work(db):
+        # Perform the update
+        updated_appointment = crud.update_appointment(db, appointment_id, appointment_update)
+        if not updated_appointment:
+             # Should ideally not happen if get_appointment succeeded, but defensive check
+            raise HTTPException(status_code=404, detail="Appointment could not be updated.")
 
-    if current_user.role == "patient" and updated_appointment.doctor and updated_appointment.doctor.user:
-        notification_recipient_user_id = updated_appointment.doctor.user.user_id
-        status_text = f"to status: {updated_appointment.status.value}" if updated_appointment.status else "details updated"
-        notification_message = f"Your appointment with {updated_appointment.patient.name} on {updated_appointment.appointment_time.strftime('%Y-%m-%d %H:%M')} was updated ({status_text})."
-        if updated_appointment.status == schemas.AppointmentStatus.cancelled:
-            notification_title = "Appointment Cancelled"
-            notification_message = f"Your appointment with {updated_appointment.patient.name} on {updated_appointment.appointment_time.strftime('%Y-%m-%d %H:%M')} has been cancelled by the patient."
 
+        # Create notification for the other party involved in the appointment
+        notification_recipient_user_id = None
+        notification_title = "Appointment Update"
+        notification_message = ""
 
-    elif current_user.role == "doctor" and updated_appointment.patient and updated_appointment.patient.user:
-        notification_recipient_user_id = updated_appointment.patient.user.user_id
-        status_text = f"to status: {updated_appointment.status.value}" if updated_appointment.status else "details updated"
-        notification_message = f"Your appointment with Dr. {updated_appointment.doctor.name} on {updated_appointment.appointment_time.strftime('%Y-%m-%d %H:%M')} has been updated ({status_text})."
-
-    elif current_user.role == "admin":
-         # Notify both patient and doctor if admin makes a change?
-         # Notify Patient
-        if updated_appointment.patient and updated_appointment.patient.user:
-            patient_user_id = updated_appointment.patient.user.user_id
-            status_text = f"to status: {updated_appointment.status.value}" if updated_appointment.status else "details updated"
-            p_message = f"Your appointment on {updated_appointment.appointment_time.strftime('%Y-%m-%d %H:%M')} was updated by an administrator ({status_text})."
-            crud.create_notification(db, schemas.NotificationCreate(user_id=patient_user_id, title="Appointment Update (Admin)", message=p_message, is_read=False))
-         # Notify Doctor
-        if updated_appointment.doctor and updated_appointment.doctor.user:
-            doctor_user_id = updated_appointment.doctor.user.user_id
+        if current_user.role == "patient" and updated_appointment.doctor and updated_appointment.doctor.user:
+            notification_recipient_user_id = updated_appointment.doctor.user.user_id
             status_text = f"to status: {updated_appointment.status.value}" if updated_appointment.status else "details updated"
-            d_message = f"Appointment for {updated_appointment.patient.name} on {updated_appointment.appointment_time.strftime('%Y-%m-%d %H:%M')} was updated by an administrator ({status_text})."
-            crud.create_notification(db, schemas.NotificationCreate(user_id=doctor_user_id, title="Appointment Update (Admin)", message=d_message, is_read=False))
+            notification_message = f"Your appointment with {updated_appointment.patient.name} on {updated_appointment.appointment_time.strftime('%Y-%m-%d %H:%M')} was updated ({status_text})."
+            if updated_appointment.status == schemas.AppointmentStatus.cancelled:
+                notification_title = "Appointment Cancelled"
+                notification_message = f"Your appointment with {updated_appointment.patient.name} on {updated_appointment.appointment_time.strftime('%Y-%m-%d %H:%M')} has been cancelled by the patient."
 
 
-    # Send notification if recipient identified and not an admin update (handled above)
-    if notification_recipient_user_id and current_user.role != "admin":
-        notification_data = schemas.NotificationCreate(
-            user_id=notification_recipient_user_id,
-            title=notification_title,
-            message=notification_message,
-            is_read=False
-        )
-        crud.create_notification(db, notification_data)
+        elif current_user.role == "doctor" and updated_appointment.patient and updated_appointment.patient.user:
+            notification_recipient_user_id = updated_appointment.patient.user.user_id
+            status_text = f"to status: {updated_appointment.status.value}" if updated_appointment.status else "details updated"
+            notification_message = f"Your appointment with Dr. {updated_appointment.doctor.name} on {updated_appointment.appointment_time.strftime('%Y-%m-%d %H:%M')} has been updated ({status_text})."
+
+        elif current_user.role == "admin":
+            admin_notifications = []
+             # Notify both patient and doctor if admin makes a change?
+             # Notify Patient
+            if updated_appointment.patient and updated_appointment.patient.user:
+                patient_user_id = updated_appointment.patient.user.user_id
+                status_text = f"to status: {updated_appointment.status.value}" if updated_appointment.status else "details updated"
+                p_message = f"Your appointment on {updated_appointment.appointment_time.strftime('%Y-%m-%d %H:%M')} was updated by an administrator ({status_text})."
+                admin_notifications.append(schemas.NotificationCreate(user_id=patient_user_id, title="Appointment Update (Admin)", message=p_message, is_read=False))
+             # Notify Doctor
+            if updated_appointment.doctor and updated_appointment.doctor.user:
+                doctor_user_id = updated_appointment.doctor.user.user_id
+                status_text = f"to status: {updated_appointment.status.value}" if updated_appointment.status else "details updated"
+                d_message = f"Appointment for {updated_appointment.patient.name} on {updated_appointment.appointment_time.strftime('%Y-%m-%d %H:%M')} was updated by an administrator ({status_text})."
+                admin_notifications.append(schemas.NotificationCreate(user_id=doctor_user_id, title="Appointment Update (Admin)", message=d_message, is_read=False))
+            crud.bulk_create_notifications(db, admin_notifications)
+
+
+        # Send notification if recipient identified and not an admin update (handled above)
+        if notification_recipient_user_id and current_user.role != "admin":
+            notification_data = schemas.NotificationCreate(
+                user_id=notification_recipient_user_id,
+                title=notification_title,
+                message=notification_message,
+                is_read=False
+            )
+            crud.create_notification(db, notification_data)
 
     return updated_appointment
 
@@ -204,7 +242,7 @@ def cancel_appointment_from_form(
     appointment_id: int,
     status: str = Form(...),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role) # Ensure only patients use this
+    patient: models.Patient = Depends(current_patient)
 ):
     if status != "cancelled":
         # Although the form sends 'cancelled', check just in case
@@ -216,8 +254,7 @@ def cancel_appointment_from_form(
         raise HTTPException(status_code=404, detail="Appointment not found")
 
     # Verify the appointment belongs to the current patient
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient or db_appointment.patient_id != patient.patient_id:
+    if db_appointment.patient_id != patient.patient_id:
         raise HTTPException(status_code=403, detail="Not authorized to cancel this appointment")
 
     # Check if appointment is already cancelled or completed
@@ -230,20 +267,21 @@ def cancel_appointment_from_form(
     # Prepare update data
     appointment_update = schemas.AppointmentUpdate(status=schemas.AppointmentStatus.cancelled)
 
-    # Perform the update
-    updated_appointment = crud.update_appointment(db, appointment_id, appointment_update)
-    if not updated_appointment:
-        raise HTTPException(status_code=500, detail="Failed to cancel appointment") # Or 404 if update failed due to not found
-
-    # Create notification for the doctor
-    if updated_appointment.doctor and updated_appointment.doctor.user:
-        notification_data = schemas.NotificationCreate(
-            user_id=updated_appointment.doctor.user.user_id,
-            title="Appointment Cancelled",
-            message=f"Appointment with {patient.name} on {updated_appointment.appointment_time.strftime('%Y-%m-%d %H:%M')} has been cancelled by the patient.",
-            is_read=False
-        )
-        crud.create_notification(db, notification_data)
+    with crud.unit_of_work(db):
+        # Perform the update
+        updated_appointment = crud.update_appointment(db, appointment_id, appointment_update)
+        if not updated_appointment:
+            raise HTTPException(status_code=500, detail="Failed to cancel appointment") # Or 404 if update failed due to not found
+
+        # Create notification for the doctor
+        if updated_appointment.doctor and updated_appointment.doctor.user:
+            notification_data = schemas.NotificationCreate(
+                user_id=updated_appointment.doctor.user.user_id,
+                title="Appointment Cancelled",
+                message=f"Appointment with {patient.name} on {updated_appointment.appointment_time.strftime('%Y-%m-%d %H:%M')} has been cancelled by the patient.",
+                is_read=False
+            )
+            crud.create_notification(db, notification_data)
 
     # Redirect back to the appointments page
     return RedirectResponse(url="/patients/appointments", status_code=303)
@@ -306,3 +344,37 @@ def get_available_slots_api(
         })
     
     return result
+
+@router.get("/doctor/{doctor_id}/availability", response_model=Dict[str, List[dict]])
+def get_availability_range_api(
+    doctor_id: int,
+    from_date: str = Query(..., alias="from"),
+    to_date: str = Query(..., alias="to"),
+    db: Session = Depends(get_db),
+):
+    """Available slots for every day from `from` to `to` (inclusive), keyed by YYYY-MM-DD"""
+    try:
+        first_day = datetime.strptime(from_date, "%Y-%m-%d").date()
+        last_day = datetime.strptime(to_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid date format. Use YYYY-MM-DD")
+    if last_day < first_day:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'to' must not be before 'from'")
+    if (last_day - first_day).days >= availability.MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range can span at most {availability.MAX_RANGE_DAYS} days"
+        )
+
+    doctor = crud.get_doctor(db, doctor_id)
+    if not doctor:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Doctor not found")
+
+    slots_by_day = crud.get_available_slots_range(db, doctor_id, first_day, last_day)
+    return {
+        day.isoformat(): [
+            {"start": start_time.strftime("%H:%M"), "end": end_time.strftime("%H:%M")}
+            for start_time, end_time in slots
+        ]
+        for day, slots in slots_by_day.items()
+    }
@@ -34,10 +34,10 @@ async def login_page(request: Request, error: Optional[str] = None):
 
 
 @router.post("/login")
-async def login(response: Response,
-                email: str = Form(...),
-                password: str = Form(...),
-                db: Session = Depends(get_db)):
+def login(response: Response,
+          email: str = Form(...),
+          password: str = Form(...),
+          db: Session = Depends(get_db)):
     user = crud.authenticate_user(db, email, password)
     if not user:
         return RedirectResponse(url="/login?error=Invalid+email+or+password",
@@ -74,7 +74,7 @@ async def login(response: Response,
 
 
 @router.post("/token", response_model=schemas.Token)
-async def login_for_access_token(
+def login_for_access_token(
         form_data: OAuth2PasswordRequestForm = Depends(),
         db: Session = Depends(get_db)):
     user = crud.authenticate_user(db, form_data.username, form_data.password)
@@ -97,7 +97,7 @@ async def logout():
     return redirect_response
 
 @router.get("/register", response_class=HTMLResponse)
-async def register_page(request: Request, error: Optional[str] = None, db: Session = Depends(get_db)):
+def register_page(request: Request, error: Optional[str] = None, db: Session = Depends(get_db)):
     specializations = crud.get_specializations(db)
     return templates.TemplateResponse("register.html", {
         "request": request,
@@ -107,15 +107,15 @@ async def register_page(request: Request, error: Optional[str] = None, db: Sessi
 
 
 @router.post("/register/patient")
-async def register_patient(request: Request,
-                           email: str = Form(...),
-                           password: str = Form(...),
-                           name: str = Form(...),
-                           dob: Optional[str] = Form(None),
-                           gender: Optional[str] = Form(None),
-                           contact: Optional[str] = Form(None),
-                           address: Optional[str] = Form(None),
-                           db: Session = Depends(get_db)):
+def register_patient(request: Request,
+                     email: str = Form(...),
+                     password: str = Form(...),
+                     name: str = Form(...),
+                     dob: Optional[str] = Form(None),
+                     gender: Optional[str] = Form(None),
+                     contact: Optional[str] = Form(None),
+                     address: Optional[str] = Form(None),
+                     db: Session = Depends(get_db)):
     # Check if user already exists
     specializations = crud.get_specializations(db)
     user = crud.get_user_by_email(db, email)
@@ -155,14 +155,14 @@ async def register_patient(request: Request,
 
 
 @router.post("/register/doctor")
-async def register_doctor(request: Request,
-                          email: str = Form(...),
-                          password: str = Form(...),
-                          name: str = Form(...),
-                          specialization_id: Optional[int] = Form(None),
-                          experience: Optional[int] = Form(None),
-                          contact: Optional[str] = Form(None),
-                          db: Session = Depends(get_db)):
+def register_doctor(request: Request,
+                    email: str = Form(...),
+                    password: str = Form(...),
+                    name: str = Form(...),
+                    specialization_id: Optional[int] = Form(None),
+                    experience: Optional[int] = Form(None),
+                    contact: Optional[str] = Form(None),
+                    db: Session = Depends(get_db)):
     # Check if user already exists
     user = crud.get_user_by_email(db, email)
     specializations = crud.get_specializations(db)
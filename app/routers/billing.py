@@ -6,7 +6,9 @@ from typing import List, Optional
 
 from app import crud, schemas, models
 from app.database import get_db
+from app.serialization import json_list_response
 from app.dependencies import get_current_active_user, check_admin_role
+from app.doctor_patients import can_doctor_access_patient
 
 router = APIRouter(
     prefix="/api/billing",
@@ -31,17 +33,18 @@ def create_billing_api(
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
-    # Create billing
-    billing_db = crud.create_billing(db, billing)
+    with crud.unit_of_work(db):
+        # Create billing
+        billing_db = crud.create_billing(db, billing)
     
-    # Create notification for patient
-    notification_data = schemas.NotificationCreate(
-        user_id=patient.user_id,
-        title="New Billing",
-        message=f"A new billing of ${billing.amount} has been generated for your appointment on {appointment.appointment_time.strftime('%Y-%m-%d')}.",
-        is_read=False
-    )
-    crud.create_notification(db, notification_data)
+        # Create notification for patient
+        notification_data = schemas.NotificationCreate(
+            user_id=patient.user_id,
+            title="New Billing",
+            message=f"A new billing of ${billing.amount} has been generated for your appointment on {appointment.appointment_time.strftime('%Y-%m-%d')}.",
+            is_read=False
+        )
+        crud.create_notification(db, notification_data)
     
     return billing_db
 
@@ -54,30 +57,25 @@ def read_billings_api(
 ):
     # Filter billings based on user role and parameters
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient:
             raise HTTPException(status_code=404, detail="Patient profile not found")
         
         # Patients can only see their own billings
-        billings = crud.get_patient_billings(db, patient.patient_id)
+        billings = crud.get_billing_rows(db, patient_id=patient.patient_id)
     
     elif current_user.role == "doctor":
         # Doctors can see billings for patients they've treated
-        doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+        doctor = current_user.doctor
         if not doctor:
             raise HTTPException(status_code=404, detail="Doctor profile not found")
         
         if patient_id:
             # Check if doctor has treated this patient
-            appointment = db.query(models.Appointment).filter(
-                models.Appointment.doctor_id == doctor.doctor_id,
-                models.Appointment.patient_id == patient_id
-            ).first()
-            
-            if not appointment:
+            if not can_doctor_access_patient(db, doctor.doctor_id, patient_id):
                 raise HTTPException(status_code=403, detail="Not authorized to access billings for this patient")
             
-            billings = crud.get_patient_billings(db, patient_id)
+            billings = crud.get_billing_rows(db, patient_id=patient_id)
         
         elif appointment_id:
             # Check if appointment belongs to this doctor
@@ -89,35 +87,26 @@ def read_billings_api(
             if not appointment:
                 raise HTTPException(status_code=403, detail="Not authorized to access billings for this appointment")
             
-            billings = db.query(models.Billing).filter(
-                models.Billing.appointment_id == appointment_id
-            ).all()
+            billings = crud.get_billing_rows(db, appointment_id=appointment_id)
         
         else:
-            # Get all appointments for this doctor
-            appointments = crud.get_doctor_appointments(db, doctor.doctor_id)
-            appointment_ids = [appointment.appointment_id for appointment in appointments]
-            
-            # Get billings for these appointments
-            billings = db.query(models.Billing).filter(
-                models.Billing.appointment_id.in_(appointment_ids)
-            ).all()
+            # Get billings for all appointments of this doctor
+            billings = crud.get_billing_rows(db, doctor_id=doctor.doctor_id)
     
     elif current_user.role == "admin":
         # Admins can filter or see all
         if patient_id:
-            billings = crud.get_patient_billings(db, patient_id)
+            billings = crud.get_billing_rows(db, patient_id=patient_id)
         elif appointment_id:
-            billings = db.query(models.Billing).filter(
-                models.Billing.appointment_id == appointment_id
-            ).all()
+            billings = crud.get_billing_rows(db, appointment_id=appointment_id)
         else:
-            billings = db.query(models.Billing).all()
+            billings = crud.get_billing_rows(db)
     
     else:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    return billings
+    # Rows are serialized straight to JSON, skipping ORM objects and response_model validation
+    return json_list_response(schemas.BillingResponse, billings)
 
 @router.get("/{billing_id}", response_model=schemas.BillingResponse)
 def read_billing_api(
@@ -132,12 +121,12 @@ def read_billing_api(
     
     # Check access rights
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient or billing.patient_id != patient.patient_id:
             raise HTTPException(status_code=403, detail="Not authorized to access this billing")
     
     elif current_user.role == "doctor":
-        doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+        doctor = current_user.doctor
         if not doctor:
             raise HTTPException(status_code=404, detail="Doctor profile not found")
         
@@ -164,20 +153,21 @@ def update_billing_api(
     if not db_billing:
         raise HTTPException(status_code=404, detail="Billing not found")
     
-    # Update billing
-    updated_billing = crud.update_billing(db, billing_id, billing)
+    with crud.unit_of_work(db):
+        # Update billing
+        updated_billing = crud.update_billing(db, billing_id, billing)
     
-    # Create notification for patient if status changed
-    if billing.status and billing.status != db_billing.status:
-        patient = crud.get_patient(db, db_billing.patient_id)
-        if patient and patient.user_id:
-            notification_data = schemas.NotificationCreate(
-                user_id=patient.user_id,
-                title="Billing Status Updated",
-                message=f"Your billing status has been updated to {billing.status}.",
-                is_read=False
-            )
-            crud.create_notification(db, notification_data)
+        # Create notification for patient if status changed
+        if billing.status and billing.status != db_billing.status:
+            patient = crud.get_patient(db, db_billing.patient_id)
+            if patient and patient.user_id:
+                notification_data = schemas.NotificationCreate(
+                    user_id=patient.user_id,
+                    title="Billing Status Updated",
+                    message=f"Your billing status has been updated to {billing.status}.",
+                    is_read=False
+                )
+                crud.create_notification(db, notification_data)
     
     return updated_billing
 
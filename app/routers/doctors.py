@@ -1,15 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Form, Response, Query
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import RedirectResponse, HTMLResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from sqlalchemy.sql.functions import now
 
 from app import crud, schemas, models
 from app.database import get_db
-from app.dependencies import get_current_active_user, check_doctor_role, check_admin_role
+from app.pagination import set_next_cursor
+from app.serialization import json_response
+from app.dependencies import get_current_active_user, check_doctor_role, check_admin_role, current_doctor
 
 import calendar
 
@@ -24,12 +26,9 @@ templates = Jinja2Templates(directory="app/templates")
 def doctor_dashboard(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    current_user: models.User = Depends(check_doctor_role),
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-
     today = datetime.now().date()
     today_start = datetime.combine(today, datetime.min.time())
     today_end = datetime.combine(today, datetime.max.time())
@@ -74,12 +73,9 @@ def doctor_appointments(
     date: Optional[str] = None,
     pending_date_filter: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    current_user: models.User = Depends(check_doctor_role),
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
     # Get appointments for specific date or today
     today = datetime.now().date()
     try:
@@ -92,13 +88,14 @@ def doctor_appointments(
     target_start = datetime.combine(target_date, datetime.min.time())
     target_end = datetime.combine(target_date, datetime.max.time())
     
-    appointments = db.query(models.Appointment).filter(
+    # The template shows each appointment's patient, load them in the same query
+    appointments = db.query(models.Appointment).options(joinedload(models.Appointment.patient)).filter(
         models.Appointment.doctor_id == doctor.doctor_id,
         models.Appointment.appointment_time >= target_start,
         models.Appointment.appointment_time <= target_end
     ).all()
 
-    pending_appointments = db.query(models.Appointment).filter(
+    pending_appointments = db.query(models.Appointment).options(joinedload(models.Appointment.patient)).filter(
         models.Appointment.doctor_id == doctor.doctor_id,
         models.Appointment.status == "scheduled",
     )
@@ -133,19 +130,62 @@ def doctor_appointments(
         "today_date": today
     })
 
-@router.post("/api/health-records/{record_id}")
+# Months with a previous and a next month that dates can represent
+FIRST_CALENDAR_MONTH = date(date.min.year, 2, 1)
+LAST_CALENDAR_MONTH = date(date.max.year, 11, 1)
+
+def _month_bounds(month: Optional[str]):
+    # First and last day of a "YYYY-MM" month, this month when not given
+    first_day = datetime.strptime(month, "%Y-%m").date() if month else datetime.now().date().replace(day=1)
+    if not FIRST_CALENDAR_MONTH <= first_day <= LAST_CALENDAR_MONTH:
+        raise ValueError(f"month out of range: {month}")
+    last_day = first_day.replace(day=calendar.monthrange(first_day.year, first_day.month)[1])
+    return first_day, last_day
+
+def _doctor_calendar(db: Session, doctor_id: int, first_day: date, last_day: date):
+    previous_month = (first_day - timedelta(days=1)).replace(day=1)
+    next_month = last_day + timedelta(days=1)
+    # isoformat pads the year to four digits, strftime doesn't on every platform
+    return {
+        "month": first_day.isoformat()[:7],
+        "previous_month": previous_month.isoformat()[:7],
+        "next_month": next_month.isoformat()[:7],
+        "days": crud.get_doctor_calendar(db, doctor_id, first_day, last_day),
+    }
+
+@router.get("/doctors/calendar", response_class=HTMLResponse)
+def doctor_calendar(
+    request: Request,
+    month: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(check_doctor_role),
+    doctor: models.Doctor = Depends(current_doctor)
+):
+    try:
+        first_day, last_day = _month_bounds(month)
+    except ValueError:
+        first_day, last_day = _month_bounds(None)
+
+    return templates.TemplateResponse("doctor/calendar.html", {
+        "request": request,
+        "user": current_user,
+        "doctor": doctor,
+        "calendar": _doctor_calendar(db, doctor.doctor_id, first_day, last_day),
+        "month_name": first_day.strftime("%B %Y"),
+        "weeks": calendar.Calendar().monthdatescalendar(first_day.year, first_day.month),
+        "current_month": first_day.month,
+        "today_date": datetime.now().date()
+    })
+
+@router.post("/api/health-records/{record_id:int}")
 def update_health_record(
     record_id: int,
     symptoms: Optional[str] = Form(None),
     diagnosis: Optional[str] = Form(None),
     notes: Optional[str] = Form(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
     # Verify the health record exists and belongs to this doctor
     health_record = db.query(models.HealthRecord).filter(
         models.HealthRecord.record_id == record_id,
@@ -171,12 +211,8 @@ def update_appointment_status(
     appointment_id: int,
     status: str = Form(...),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
     # Verify the appointment belongs to this doctor
     appointment = db.query(models.Appointment).filter(
         models.Appointment.appointment_id == appointment_id,
@@ -190,16 +226,17 @@ def update_appointment_status(
     try:
         appointment_status = schemas.AppointmentStatus(status)
         appointment_update = schemas.AppointmentUpdate(status=appointment_status)
-        updated_appointment = crud.update_appointment(db, appointment_id, appointment_update)
+        with crud.unit_of_work(db):
+            updated_appointment = crud.update_appointment(db, appointment_id, appointment_update)
         
-        # Create notification for patient
-        notification_data = schemas.NotificationCreate(
-            user_id=appointment.patient.user_id,
-            title="Appointment Update",
-            message=f"Your appointment on {appointment.appointment_time.strftime('%Y-%m-%d %H:%M')} has been updated to {status}",
-            is_read=False
-        )
-        crud.create_notification(db, notification_data)
+            # Create notification for patient
+            notification_data = schemas.NotificationCreate(
+                user_id=appointment.patient.user_id,
+                title="Appointment Update",
+                message=f"Your appointment on {appointment.appointment_time.strftime('%Y-%m-%d %H:%M')} has been updated to {status}",
+                is_read=False
+            )
+            crud.create_notification(db, notification_data)
         
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid appointment status")
@@ -211,18 +248,15 @@ def doctor_patients(
     request: Request,
     search: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    current_user: models.User = Depends(check_doctor_role),
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
     # Get patients who have had appointments with this doctor
     query = db.query(models.Patient).join(
-        models.Appointment, models.Patient.patient_id == models.Appointment.patient_id
+        models.DoctorPatient, models.Patient.patient_id == models.DoctorPatient.patient_id
     ).filter(
-        models.Appointment.doctor_id == doctor.doctor_id
-    ).distinct()
+        models.DoctorPatient.doctor_id == doctor.doctor_id
+    )
     
     # Apply search filter if provided
     if search:
@@ -244,12 +278,9 @@ def doctor_patient_detail(
     patient_id: int,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    current_user: models.User = Depends(check_doctor_role),
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
     patient = crud.get_patient(db, patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
@@ -282,12 +313,9 @@ def create_health_record_form(
     patient_id: int,
     appointment_id: Optional[int] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    current_user: models.User = Depends(check_doctor_role),
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
     patient = crud.get_patient(db, patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
@@ -314,12 +342,8 @@ async def create_health_record(
     diagnosis: Optional[str] = Form(None),
     notes: Optional[str] = Form(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
     # Create health record
     health_record_data = schemas.HealthRecordCreate(
         patient_id=patient_id,
@@ -330,51 +354,55 @@ async def create_health_record(
         notes=notes
     )
     
-    health_record = crud.create_health_record(db, health_record_data)
-    
-    # Get form data for prescriptions
-    form_data = await request.form()
-    
-    # Process multiple prescriptions
-    prescription_indices = set()
-    
-    # First collect all valid prescription indices
-    for key in form_data.keys():
-        if key.startswith('prescriptions[') and key.endswith('][medication_name]'):
-            try:
-                index = int(key[14:-18])  # Extract index from prescriptions[X][medication_name]
-                prescription_indices.add(index)
-            except ValueError:
-                continue
-    
-    # Process each valid prescription index
-    for index in sorted(prescription_indices):
-        medication_name = form_data.get(f'prescriptions[{index}][medication_name]')
-        if medication_name and medication_name.strip():  # Only create prescription if medication name is provided and not empty
-            prescription = schemas.PrescriptionCreate(
-                record_id=health_record.record_id,
-                medication_name=medication_name.strip(),
-                dosage=form_data.get(f'prescriptions[{index}][dosage]', '').strip(),
-                duration=form_data.get(f'prescriptions[{index}][duration]', '').strip(),
-                instructions=form_data.get(f'prescriptions[{index}][instructions]', '').strip()
-            )
-            crud.create_prescription(db, prescription)
-    
-    # Update appointment status if provided
-    if appointment_id:
-        appointment_update = schemas.AppointmentUpdate(status=schemas.AppointmentStatus.completed)
-        crud.update_appointment(db, appointment_id, appointment_update)
+    # Record, prescriptions, appointment status and notification are committed together
+    with crud.unit_of_work(db):
+        health_record = crud.create_health_record(db, health_record_data)
+    
+        # Get form data for prescriptions
+        form_data = await request.form()
+    
+        # Process multiple prescriptions
+        prescription_indices = set()
+    
+        # First collect all valid prescription indices
+        for key in form_data.keys():
+            if key.startswith('prescriptions[') and key.endswith('][medication_name]'):
+                try:
+                    index = int(key[14:-18])  # Extract index from prescriptions[X][medication_name]
+                    prescription_indices.add(index)
+                except ValueError:
+                    continue
+    
+        # Process each valid prescription index
+        prescriptions = []
+        for index in sorted(prescription_indices):
+            medication_name = form_data.get(f'prescriptions[{index}][medication_name]')
+            if medication_name and medication_name.strip():  # Only create prescription if medication name is provided and not empty
+                prescriptions.append(schemas.PrescriptionCreate(
+                    record_id=health_record.record_id,
+                    medication_name=medication_name.strip(),
+                    dosage=form_data.get(f'prescriptions[{index}][dosage]', '').strip(),
+                    duration=form_data.get(f'prescriptions[{index}][duration]', '').strip(),
+                    instructions=form_data.get(f'prescriptions[{index}][instructions]', '').strip()
+                ))
+        # Insert all prescriptions at once
+        crud.bulk_create_prescriptions(db, prescriptions)
+    
+        # Update appointment status if provided
+        if appointment_id:
+            appointment_update = schemas.AppointmentUpdate(status=schemas.AppointmentStatus.completed)
+            crud.update_appointment(db, appointment_id, appointment_update)
     
-    # Create notification for patient
-    patient = crud.get_patient(db, patient_id)
-    if patient and patient.user_id:
-        notification_data = schemas.NotificationCreate(
-            user_id=patient.user_id,
-            title="New Health Record",
-            message=f"Dr. {doctor.name} has created a new health record with prescription for you.",
-            is_read=False
-        )
-        crud.create_notification(db, notification_data)
+        # Create notification for patient
+        patient = crud.get_patient(db, patient_id)
+        if patient and patient.user_id:
+            notification_data = schemas.NotificationCreate(
+                user_id=patient.user_id,
+                title="New Health Record",
+                message=f"Dr. {doctor.name} has created a new health record with prescription for you.",
+                is_read=False
+            )
+            crud.create_notification(db, notification_data)
     
     return RedirectResponse(url=f"/doctors/health-records/{health_record.record_id}", status_code=303)
 
@@ -383,12 +411,9 @@ def view_health_record(
     record_id: int,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    current_user: models.User = Depends(check_doctor_role),
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
     health_record = crud.get_health_record(db, record_id)
     if not health_record:
         raise HTTPException(status_code=404, detail="Health record not found")
@@ -424,12 +449,8 @@ def create_prescription(
     instructions: Optional[str] = Form(None),
     duration: Optional[str] = Form(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
     # Verify the health record exists and belongs to this doctor
     health_record = db.query(models.HealthRecord).filter(
         models.HealthRecord.record_id == record_id,
@@ -448,17 +469,18 @@ def create_prescription(
         duration=duration
     )
     
-    prescription = crud.create_prescription(db, prescription_data)
+    with crud.unit_of_work(db):
+        prescription = crud.create_prescription(db, prescription_data)
     
-    # Create notification for patient
-    if health_record.patient and health_record.patient.user_id:
-        notification_data = schemas.NotificationCreate(
-            user_id=health_record.patient.user_id,
-            title="New Prescription",
-            message=f"Dr. {doctor.name} has prescribed {medication_name} for you.",
-            is_read=False
-        )
-        crud.create_notification(db, notification_data)
+        # Create notification for patient
+        if health_record.patient and health_record.patient.user_id:
+            notification_data = schemas.NotificationCreate(
+                user_id=health_record.patient.user_id,
+                title="New Prescription",
+                message=f"Dr. {doctor.name} has prescribed {medication_name} for you.",
+                is_read=False
+            )
+            crud.create_notification(db, notification_data)
     
     return RedirectResponse(url=f"/doctors/health-records/{record_id}", status_code=303)
 
@@ -467,12 +489,8 @@ def create_test(
     record_id: int = Form(...),
     test_name: str = Form(...),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
     # Verify the health record exists and belongs to this doctor
     health_record = db.query(models.HealthRecord).filter(
         models.HealthRecord.record_id == record_id,
@@ -490,17 +508,18 @@ def create_test(
         ordered_by=doctor.doctor_id
     )
     
-    test = crud.create_test(db, test_data)
+    with crud.unit_of_work(db):
+        test = crud.create_test(db, test_data)
     
-    # Create notification for patient
-    if health_record.patient and health_record.patient.user_id:
-        notification_data = schemas.NotificationCreate(
-            user_id=health_record.patient.user_id,
-            title="New Test Ordered",
-            message=f"Dr. {doctor.name} has ordered a {test_name} test for you.",
-            is_read=False
-        )
-        crud.create_notification(db, notification_data)
+        # Create notification for patient
+        if health_record.patient and health_record.patient.user_id:
+            notification_data = schemas.NotificationCreate(
+                user_id=health_record.patient.user_id,
+                title="New Test Ordered",
+                message=f"Dr. {doctor.name} has ordered a {test_name} test for you.",
+                is_read=False
+            )
+            crud.create_notification(db, notification_data)
     
     return RedirectResponse(url=f"/doctors/health-records/{record_id}", status_code=303)
 
@@ -508,12 +527,9 @@ def create_test(
 def doctor_schedule(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    current_user: models.User = Depends(check_doctor_role),
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
     # Get doctor's schedule
     schedules = crud.get_doctor_schedules(db, doctor.doctor_id)
     
@@ -537,11 +553,12 @@ def create_schedule(
     day: str = Form(...),
     start_time: str = Form(...),
     end_time: str = Form(...),
+    slot_duration_minutes: int = Form(30),
     is_available: bool = Form(True),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    current_user: models.User = Depends(check_doctor_role),
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
     days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 
     if not doctor:
@@ -561,6 +578,14 @@ def create_schedule(
         if start >= end:
             raise ValueError("Start time must be before end time")
 
+        schedule_data = schemas.DoctorScheduleCreate(
+            doctor_id=doctor.doctor_id,
+            day=day.lower(),
+            start_time=start,
+            end_time=end,
+            slot_duration_minutes=slot_duration_minutes,
+            is_available=is_available
+        )
     except ValueError as e:
         return templates.TemplateResponse("doctor/schedule.html", {
             "request": request,
@@ -571,13 +596,6 @@ def create_schedule(
         })
 
     # Save the schedule
-    schedule_data = schemas.DoctorScheduleCreate(
-        doctor_id=doctor.doctor_id,
-        day=day.lower(),
-        start_time=start,
-        end_time=end,
-        is_available=is_available
-    )
     crud.create_schedule(db, schedule_data)
 
     return RedirectResponse(url="/doctors/schedule", status_code=303)
@@ -588,14 +606,11 @@ def edit_schedule(
     day: str = Form(...),
     start_time: str = Form(...),
     end_time: str = Form(...),
+    slot_duration_minutes: int = Form(30),
     is_available: bool = Form(True),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
     # Verify schedule belongs to this doctor
     schedule = db.query(models.DoctorSchedule).filter(
         models.DoctorSchedule.schedule_id == schedule_id,
@@ -617,6 +632,7 @@ def edit_schedule(
             day=day.lower(),
             start_time=start,
             end_time=end,
+            slot_duration_minutes=slot_duration_minutes,
             is_available=is_available
         )
         crud.update_schedule(db, schedule_id, schedule_update)
@@ -630,12 +646,8 @@ def edit_schedule(
 def delete_schedule(
     schedule_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
     # Verify schedule belongs to this doctor
     schedule = db.query(models.DoctorSchedule).filter(
         models.DoctorSchedule.schedule_id == schedule_id,
@@ -680,14 +692,37 @@ def create_doctor_api(
 
 @router.get("/api/doctors", response_model=List[schemas.DoctorResponse])
 def read_doctors_api(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    doctors = crud.get_doctors(db, skip=skip, limit=limit)
+    doctors = crud.get_doctors(db, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(response, doctors, crud.DOCTOR_SORT, limit)
     return doctors
 
+@router.get("/api/doctors/calendar", response_model=schemas.DoctorCalendarResponse)
+def read_doctor_calendar_api(
+    month: Optional[str] = None,
+    db: Session = Depends(get_db),
+    doctor: models.Doctor = Depends(current_doctor)
+):
+    # One month of the doctor's appointments, ?month=YYYY-MM, this month by default
+    try:
+        first_day, last_day = _month_bounds(month)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"month must be YYYY-MM between {FIRST_CALENDAR_MONTH.isoformat()[:7]} "
+                   f"and {LAST_CALENDAR_MONTH.isoformat()[:7]}",
+        )
+    result = _doctor_calendar(db, doctor.doctor_id, first_day, last_day)
+    result["days"] = {day.isoformat(): appointments for day, appointments in result["days"].items()}
+    # Rows are serialized straight to JSON, skipping response_model validation
+    return json_response(schemas.DoctorCalendarResponse, result)
+
 @router.get("/api/doctors/{doctor_id}", response_model=schemas.DoctorResponse)
 def read_doctor_api(
     doctor_id: int,
@@ -735,10 +770,60 @@ def read_doctor_schedule_api(
 def create_doctor_schedule_api(
     schedule: schemas.DoctorScheduleCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor or doctor.doctor_id != schedule.doctor_id:
+    if doctor.doctor_id != schedule.doctor_id:
         raise HTTPException(status_code=403, detail="Not authorized to create schedule for this doctor")
     
     return crud.create_schedule(db, schedule)
+
+@router.put("/api/doctors/schedule/template", response_model=schemas.WeeklyScheduleTemplateResult)
+def apply_weekly_template_api(
+    template: schemas.WeeklyScheduleTemplate,
+    db: Session = Depends(get_db),
+    doctor: models.Doctor = Depends(current_doctor)
+):
+    # Replaces the doctor's whole week; rows missing from the template are deleted
+    return crud.apply_weekly_template(db, [doctor.doctor_id], template.schedules)
+
+@router.get("/api/doctors/{doctor_id}/schedule/exceptions", response_model=List[schemas.ScheduleExceptionResponse])
+def read_schedule_exceptions_api(
+    doctor_id: int,
+    first_day: Optional[date] = Query(None, alias="from"),
+    last_day: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    # Reasons can be personal, so only the doctor and admins see the exceptions;
+    # patients see their effect through the free slots
+    if current_user.role == "doctor":
+        doctor = current_user.doctor
+        if not doctor or doctor.doctor_id != doctor_id:
+            raise HTTPException(status_code=403, detail="Not authorized to view this doctor's schedule exceptions")
+    elif current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return crud.get_schedule_exceptions(db, doctor_id, first_day, last_day)
+
+@router.post("/api/doctors/schedule/exceptions", response_model=schemas.ScheduleExceptionResponse)
+def create_schedule_exception_api(
+    exception: schemas.ScheduleExceptionCreate,
+    db: Session = Depends(get_db),
+    doctor: models.Doctor = Depends(current_doctor)
+):
+    if doctor.doctor_id != exception.doctor_id:
+        raise HTTPException(status_code=403, detail="Not authorized to create schedule exceptions for this doctor")
+
+    return crud.create_schedule_exception(db, exception)
+
+@router.delete("/api/doctors/schedule/exceptions/{exception_id}", response_model=bool)
+def delete_schedule_exception_api(
+    exception_id: int,
+    db: Session = Depends(get_db),
+    doctor: models.Doctor = Depends(current_doctor)
+):
+    exception = crud.get_schedule_exception(db, exception_id)
+    if not exception or exception.doctor_id != doctor.doctor_id:
+        raise HTTPException(status_code=404, detail="Schedule exception not found")
+
+    return crud.delete_schedule_exception(db, exception_id)
@@ -6,7 +6,8 @@ from typing import List, Optional
 
 from app import crud, schemas, models
 from app.database import get_db
-from app.dependencies import get_current_active_user, check_patient_role
+from app.dependencies import get_current_active_user, current_patient
+from app.doctor_patients import can_doctor_access_patient
 
 router = APIRouter(
     prefix="/api/feedback",
@@ -19,11 +20,10 @@ templates = Jinja2Templates(directory="app/templates")
 def create_feedback_api(
     feedback: schemas.FeedbackCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role)
+    patient: models.Patient = Depends(current_patient)
 ):
     # Check if patient is authorized
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient or feedback.patient_id != patient.patient_id:
+    if feedback.patient_id != patient.patient_id:
         raise HTTPException(status_code=403, detail="Not authorized to submit feedback for this patient")
     
     # Check if appointment exists and belongs to this patient
@@ -44,19 +44,20 @@ def create_feedback_api(
     if existing_feedback:
         raise HTTPException(status_code=400, detail="Feedback already submitted for this appointment")
     
-    # Create feedback
-    feedback_db = crud.create_feedback(db, feedback)
-    
-    # Create notification for doctor
-    doctor = crud.get_doctor(db, feedback.doctor_id)
-    if doctor and doctor.user_id:
-        notification_data = schemas.NotificationCreate(
-            user_id=doctor.user_id,
-            title="New Feedback",
-            message=f"You have received a {feedback.rating}/5 rating from a patient.",
-            is_read=False
-        )
-        crud.create_notification(db, notification_data)
+    with crud.unit_of_work(db):
+        # Create feedback
+        feedback_db = crud.create_feedback(db, feedback)
+    
+        # Create notification for doctor
+        doctor = crud.get_doctor(db, feedback.doctor_id)
+        if doctor and doctor.user_id:
+            notification_data = schemas.NotificationCreate(
+                user_id=doctor.user_id,
+                title="New Feedback",
+                message=f"You have received a {feedback.rating}/5 rating from a patient.",
+                is_read=False
+            )
+            crud.create_notification(db, notification_data)
     
     return feedback_db
 
@@ -69,19 +70,14 @@ def read_feedbacks_api(
 ):
     # Filter feedbacks based on user role and parameters
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient:
             raise HTTPException(status_code=404, detail="Patient profile not found")
         
         # Patients can only see their own feedbacks or feedbacks for doctors they've seen
         if doctor_id:
             # Check if patient has had an appointment with this doctor
-            appointment = db.query(models.Appointment).filter(
-                models.Appointment.patient_id == patient.patient_id,
-                models.Appointment.doctor_id == doctor_id
-            ).first()
-            
-            if not appointment:
+            if not can_doctor_access_patient(db, doctor_id, patient.patient_id):
                 raise HTTPException(status_code=403, detail="Not authorized to access feedbacks for this doctor")
             
             feedbacks = db.query(models.Feedback).filter(
@@ -92,7 +88,7 @@ def read_feedbacks_api(
             feedbacks = crud.get_patient_feedbacks(db, patient.patient_id)
     
     elif current_user.role == "doctor":
-        doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+        doctor = current_user.doctor
         if not doctor:
             raise HTTPException(status_code=404, detail="Doctor profile not found")
         
@@ -126,12 +122,12 @@ def read_feedback_api(
     
     # Check access rights
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient or feedback.patient_id != patient.patient_id:
             raise HTTPException(status_code=403, detail="Not authorized to access this feedback")
     
     elif current_user.role == "doctor":
-        doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+        doctor = current_user.doctor
         if not doctor or feedback.doctor_id != doctor.doctor_id:
             raise HTTPException(status_code=403, detail="Not authorized to access this feedback")
     
@@ -142,7 +138,7 @@ def update_feedback_api(
     feedback_id: int,
     feedback: schemas.FeedbackUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role)
+    patient: models.Patient = Depends(current_patient)
 ):
     # Get feedback
     db_feedback = crud.get_feedback(db, feedback_id)
@@ -150,8 +146,7 @@ def update_feedback_api(
         raise HTTPException(status_code=404, detail="Feedback not found")
     
     # Check if patient is authorized
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient or db_feedback.patient_id != patient.patient_id:
+    if db_feedback.patient_id != patient.patient_id:
         raise HTTPException(status_code=403, detail="Not authorized to update this feedback")
     
     # Update feedback
@@ -172,7 +167,7 @@ def delete_feedback_api(
     
     # Check if user is authorized
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient or db_feedback.patient_id != patient.patient_id:
             raise HTTPException(status_code=403, detail="Not authorized to delete this feedback")
     
@@ -6,7 +6,10 @@ from typing import List, Optional
 
 from app import crud, schemas, models
 from app.database import get_db
-from app.dependencies import get_current_active_user, check_doctor_role, check_doctor_or_admin_role
+from app.pagination import set_next_cursor
+from app.serialization import json_list_response
+from app.dependencies import get_current_active_user, check_doctor_or_admin_role, current_doctor
+from app.doctor_patients import can_doctor_access_patient
 
 router = APIRouter(
     prefix="/api/health-records",
@@ -19,11 +22,10 @@ templates = Jinja2Templates(directory="app/templates")
 def create_health_record_api(
     health_record: schemas.HealthRecordCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
     # Check if doctor is authorized
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor or health_record.doctor_id != doctor.doctor_id:
+    if health_record.doctor_id != doctor.doctor_id:
         raise HTTPException(status_code=403, detail="Not authorized to create health record for this doctor")
     
     # Check if patient exists
@@ -31,71 +33,116 @@ def create_health_record_api(
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     
-    # Create health record
-    health_record_db = crud.create_health_record(db, health_record)
+    with crud.unit_of_work(db):
+        # Create health record
+        health_record_db = crud.create_health_record(db, health_record)
     
-    # Create notification for patient
-    notification_data = schemas.NotificationCreate(
-        user_id=patient.user_id,
-        title="New Health Record",
-        message=f"Dr. {doctor.name} has created a new health record for you.",
-        is_read=False
-    )
-    crud.create_notification(db, notification_data)
+        # Create notification for patient
+        notification_data = schemas.NotificationCreate(
+            user_id=patient.user_id,
+            title="New Health Record",
+            message=f"Dr. {doctor.name} has created a new health record for you.",
+            is_read=False
+        )
+        crud.create_notification(db, notification_data)
     
     return health_record_db
 
+@router.post("/with-items", response_model=schemas.HealthRecordWithItemsResponse)
+def create_health_record_with_items_api(
+    health_record: schemas.HealthRecordWithItemsCreate,
+    db: Session = Depends(get_db),
+    doctor: models.Doctor = Depends(current_doctor)
+):
+    # Check if doctor is authorized
+    if health_record.doctor_id != doctor.doctor_id:
+        raise HTTPException(status_code=403, detail="Not authorized to create health record for this doctor")
+
+    # Check if patient exists
+    patient = crud.get_patient(db, health_record.patient_id)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    with crud.unit_of_work(db):
+        # Create health record
+        health_record_db = crud.create_health_record(db, schemas.HealthRecordCreate(
+            **health_record.dict(exclude={"prescriptions", "tests"})
+        ))
+
+        # Create all prescriptions and tests with one insert each
+        crud.bulk_create_prescriptions(db, [
+            schemas.PrescriptionCreate(record_id=health_record_db.record_id, **item.dict())
+            for item in health_record.prescriptions
+        ])
+        crud.bulk_create_tests(db, [
+            schemas.TestCreate(
+                record_id=health_record_db.record_id,
+                test_name=item.test_name,
+                status=schemas.TestStatus.ordered,
+                ordered_by=doctor.doctor_id
+            )
+            for item in health_record.tests
+        ])
+
+        # Create notification for patient
+        notification_data = schemas.NotificationCreate(
+            user_id=patient.user_id,
+            title="New Health Record",
+            message=f"Dr. {doctor.name} has created a new health record for you.",
+            is_read=False
+        )
+        crud.create_notification(db, notification_data)
+
+    return health_record_db
+
 @router.get("", response_model=List[schemas.HealthRecordResponse])
 def read_health_records_api(
     patient_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
     # Filter health records based on user role and parameters
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient:
             raise HTTPException(status_code=404, detail="Patient profile not found")
         
         # Patients can only see their own records
-        health_records = crud.get_patient_health_records(db, patient.patient_id, skip=skip, limit=limit)
+        health_records = crud.get_health_record_rows(db, patient_id=patient.patient_id, skip=skip, limit=limit, cursor=cursor)
     
     elif current_user.role == "doctor":
-        doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+        doctor = current_user.doctor
         if not doctor:
             raise HTTPException(status_code=404, detail="Doctor profile not found")
         
         # If patient_id is provided, check if the doctor has seen this patient
         if patient_id:
             # Check if doctor has treated this patient (has an appointment)
-            appointment = db.query(models.Appointment).filter(
-                models.Appointment.doctor_id == doctor.doctor_id,
-                models.Appointment.patient_id == patient_id
-            ).first()
-            
-            if not appointment:
+            if not can_doctor_access_patient(db, doctor.doctor_id, patient_id):
                 raise HTTPException(status_code=403, detail="Not authorized to access this patient's records")
             
-            health_records = crud.get_patient_health_records(db, patient_id, skip=skip, limit=limit)
+            health_records = crud.get_health_record_rows(db, patient_id=patient_id, skip=skip, limit=limit, cursor=cursor)
         else:
             # Get all health records created by this doctor
-            health_records = db.query(models.HealthRecord).filter(
-                models.HealthRecord.doctor_id == doctor.doctor_id
-            ).offset(skip).limit(limit).all()
+            health_records = crud.get_health_record_rows(db, doctor_id=doctor.doctor_id, skip=skip, limit=limit, cursor=cursor)
     
     elif current_user.role == "admin":
         if patient_id:
-            health_records = crud.get_patient_health_records(db, patient_id, skip=skip, limit=limit)
+            health_records = crud.get_health_record_rows(db, patient_id=patient_id, skip=skip, limit=limit, cursor=cursor)
         else:
             # Admins can see all health records
-            health_records = db.query(models.HealthRecord).offset(skip).limit(limit).all()
+            health_records = crud.get_health_record_rows(db, skip=skip, limit=limit, cursor=cursor)
     
     else:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    return health_records
+    # Rows are serialized straight to JSON, skipping ORM objects and response_model validation
+    response = json_list_response(schemas.HealthRecordResponse, health_records)
+    set_next_cursor(response, health_records, crud.HEALTH_RECORD_SORT, limit)
+    return response
 
 @router.get("/{record_id}", response_model=schemas.HealthRecordResponse)
 def read_health_record_api(
@@ -110,24 +157,19 @@ def read_health_record_api(
     
     # Check access rights
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient or health_record.patient_id != patient.patient_id:
             raise HTTPException(status_code=403, detail="Not authorized to access this health record")
     
     elif current_user.role == "doctor":
-        doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+        doctor = current_user.doctor
         if not doctor:
             raise HTTPException(status_code=404, detail="Doctor profile not found")
         
         # Check if this doctor created the record or has treated this patient
         if health_record.doctor_id != doctor.doctor_id:
             # Check if doctor has treated this patient (has an appointment)
-            appointment = db.query(models.Appointment).filter(
-                models.Appointment.doctor_id == doctor.doctor_id,
-                models.Appointment.patient_id == health_record.patient_id
-            ).first()
-            
-            if not appointment:
+            if not can_doctor_access_patient(db, doctor.doctor_id, health_record.patient_id):
                 raise HTTPException(status_code=403, detail="Not authorized to access this health record")
     
     return health_record
@@ -137,7 +179,7 @@ def update_health_record_api(
     record_id: int,
     health_record: schemas.HealthRecordUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
     # Get health record
     db_health_record = crud.get_health_record(db, record_id)
@@ -145,23 +187,23 @@ def update_health_record_api(
         raise HTTPException(status_code=404, detail="Health record not found")
     
     # Check if doctor is authorized (only the doctor who created the record can update it)
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor or db_health_record.doctor_id != doctor.doctor_id:
+    if db_health_record.doctor_id != doctor.doctor_id:
         raise HTTPException(status_code=403, detail="Not authorized to update this health record")
     
-    # Update health record
-    updated_health_record = crud.update_health_record(db, record_id, health_record)
-    
-    # Create notification for patient
-    patient = crud.get_patient(db, db_health_record.patient_id)
-    if patient and patient.user_id:
-        notification_data = schemas.NotificationCreate(
-            user_id=patient.user_id,
-            title="Health Record Updated",
-            message=f"Dr. {doctor.name} has updated your health record.",
-            is_read=False
-        )
-        crud.create_notification(db, notification_data)
+    with crud.unit_of_work(db):
+        # Update health record
+        updated_health_record = crud.update_health_record(db, record_id, health_record)
+    
+        # Create notification for patient
+        patient = crud.get_patient(db, db_health_record.patient_id)
+        if patient and patient.user_id:
+            notification_data = schemas.NotificationCreate(
+                user_id=patient.user_id,
+                title="Health Record Updated",
+                message=f"Dr. {doctor.name} has updated your health record.",
+                is_read=False
+            )
+            crud.create_notification(db, notification_data)
     
     return updated_health_record
 
@@ -178,7 +220,7 @@ def delete_health_record_api(
     
     # Check if user is authorized
     if current_user.role == "doctor":
-        doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+        doctor = current_user.doctor
         if not doctor or db_health_record.doctor_id != doctor.doctor_id:
             raise HTTPException(status_code=403, detail="Not authorized to delete this health record")
     
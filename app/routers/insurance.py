@@ -8,6 +8,7 @@ from datetime import date
 from app import crud, schemas, models
 from app.database import get_db
 from app.dependencies import get_current_active_user, check_patient_role, check_admin_role
+from app.doctor_patients import can_doctor_access_patient
 
 router = APIRouter(
     prefix="/api/insurance",
@@ -24,7 +25,7 @@ def create_insurance_api(
 ):
     # Check authorization
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient or insurance.patient_id != patient.patient_id:
             raise HTTPException(status_code=403, detail="Not authorized to create insurance for this patient")
     
@@ -44,7 +45,7 @@ def read_insurances_api(
 ):
     # Filter insurances based on user role and parameters
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient:
             raise HTTPException(status_code=404, detail="Patient profile not found")
         
@@ -52,18 +53,13 @@ def read_insurances_api(
         insurances = crud.get_patient_insurances(db, patient.patient_id)
     
     elif current_user.role == "doctor":
-        doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+        doctor = current_user.doctor
         if not doctor:
             raise HTTPException(status_code=404, detail="Doctor profile not found")
         
         if patient_id:
             # Check if doctor has treated this patient
-            appointment = db.query(models.Appointment).filter(
-                models.Appointment.doctor_id == doctor.doctor_id,
-                models.Appointment.patient_id == patient_id
-            ).first()
-            
-            if not appointment:
+            if not can_doctor_access_patient(db, doctor.doctor_id, patient_id):
                 raise HTTPException(status_code=403, detail="Not authorized to access insurance for this patient")
             
             insurances = crud.get_patient_insurances(db, patient_id)
@@ -95,22 +91,17 @@ def read_insurance_api(
     
     # Check access rights
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient or insurance.patient_id != patient.patient_id:
             raise HTTPException(status_code=403, detail="Not authorized to access this insurance")
     
     elif current_user.role == "doctor":
-        doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+        doctor = current_user.doctor
         if not doctor:
             raise HTTPException(status_code=404, detail="Doctor profile not found")
         
         # Check if doctor has treated this patient
-        appointment = db.query(models.Appointment).filter(
-            models.Appointment.doctor_id == doctor.doctor_id,
-            models.Appointment.patient_id == insurance.patient_id
-        ).first()
-        
-        if not appointment:
+        if not can_doctor_access_patient(db, doctor.doctor_id, insurance.patient_id):
             raise HTTPException(status_code=403, detail="Not authorized to access insurance for this patient")
     
     return insurance
@@ -129,7 +120,7 @@ def update_insurance_api(
     
     # Check authorization
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient or db_insurance.patient_id != patient.patient_id:
             raise HTTPException(status_code=403, detail="Not authorized to update this insurance")
     
@@ -154,7 +145,7 @@ def delete_insurance_api(
     
     # Check authorization
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient or db_insurance.patient_id != patient.patient_id:
             raise HTTPException(status_code=403, detail="Not authorized to delete this insurance")
     
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Form, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import RedirectResponse, HTMLResponse
 from sqlalchemy.orm import Session
@@ -7,7 +7,9 @@ from datetime import date
 
 from app import crud, schemas, models
 from app.database import get_db
-from app.dependencies import get_current_active_user, check_patient_role, check_doctor_or_admin_role, check_admin_role
+from app.pagination import set_next_cursor
+from app.reservations import SlotUnavailableError
+from app.dependencies import get_current_active_user, check_patient_role, check_doctor_or_admin_role, check_admin_role, current_patient
 from datetime import datetime, timedelta
 
 router = APIRouter(
@@ -21,12 +23,9 @@ templates = Jinja2Templates(directory="app/templates")
 def patient_dashboard(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role)
+    current_user: models.User = Depends(check_patient_role),
+    patient: models.Patient = Depends(current_patient)
 ):
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient profile not found")
-    
     # Get upcoming appointments
     appointments = crud.get_patient_appointments(db, patient.patient_id)
     
@@ -49,12 +48,9 @@ def patient_dashboard(
 def patient_appointments(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role)
+    current_user: models.User = Depends(check_patient_role),
+    patient: models.Patient = Depends(current_patient)
 ):
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient profile not found")
-    
     # Get all appointments
     appointments = crud.get_patient_appointments(db, patient.patient_id)
     
@@ -84,75 +80,78 @@ def book_appointment(
     reason: Optional[str] = Form(None),
     insurance_id = Form(None), # Add insurance_id form field
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role),
+    patient: models.Patient = Depends(current_patient),
 ):
     from datetime import datetime
     from app.schemas import BillingCreate, BillingStatus, AppointmentStatus
 
-    # Get patient object from current user
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient profile not found")
-
     # Combine date and time into a datetime object
     try:
         appointment_datetime = datetime.strptime(f"{appointment_date} {appointment_time}", "%Y-%m-%d %H:%M")
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date or time format")
 
-    # Create appointment
-    appointment_data = schemas.AppointmentCreate(
-        patient_id=patient.patient_id,
-        doctor_id=doctor_id,
-        appointment_time=appointment_datetime,
-        reason=reason,
-        status=AppointmentStatus.scheduled
-    )
-    appointment = crud.create_appointment(db, appointment_data)
-
-    # Determine billing amount based on insurance
-    billing_amount = 500.0 # Default amount
-    payment_method = "Online" # Default payment method
-    billing_status = BillingStatus.paid # Default status if paid online
-
-    if insurance_id:
-        # Validate the selected insurance
-        insurance = crud.get_insurance(db, insurance_id)
-        if insurance and insurance.patient_id == patient.patient_id:
-             # Check if insurance is valid (optional: add date check again if needed)
-            is_valid = insurance.valid_until is None or insurance.valid_until >= date.today()
-            if is_valid:
-                billing_amount = 0.0
-                payment_method = f"Insurance ({insurance.provider_name})"
-                billing_status = BillingStatus.paid # Covered by insurance, considered paid
-        else:
-            # Handle invalid insurance selection? Maybe raise error or ignore?
-            # For now, we'll ignore it and charge the default amount.
-            # Consider adding a message back to the user if insurance was invalid.
-            pass # Keep default amount
-
-    # Create billing
-    billing_data = BillingCreate(
-        patient_id=patient.patient_id,
-        appointment_id=appointment.appointment_id,
-        amount=billing_amount,
-        status=billing_status,
-        payment_method=payment_method
-    )
-    crud.create_billing(db, billing_data)
-
-    # Create notification for doctor
-    doctor = crud.get_doctor(db, doctor_id)
-    if doctor and doctor.user_id:
-        notification_data = schemas.NotificationCreate(
-            user_id=doctor.user_id,
-            title="New Appointment",
-            message=f"New appointment scheduled with {patient.name} on {appointment_datetime.strftime('%Y-%m-%d %H:%M')}",
-            is_read=False
+    try:
+        # Appointment, billing and notification are committed together
+        with crud.unit_of_work(db):
+            # Create appointment
+            appointment_data = schemas.AppointmentCreate(
+                patient_id=patient.patient_id,
+                doctor_id=doctor_id,
+                appointment_time=appointment_datetime,
+                reason=reason,
+                status=AppointmentStatus.scheduled
+            )
+            appointment = crud.create_appointment(db, appointment_data)
+
+            # Determine billing amount based on insurance
+            billing_amount = 500.0 # Default amount
+            payment_method = "Online" # Default payment method
+            billing_status = BillingStatus.paid # Default status if paid online
+
+            if insurance_id:
+                # Validate the selected insurance
+                insurance = crud.get_insurance(db, insurance_id)
+                if insurance and insurance.patient_id == patient.patient_id:
+                     # Check if insurance is valid (optional: add date check again if needed)
+                    is_valid = insurance.valid_until is None or insurance.valid_until >= date.today()
+                    if is_valid:
+                        billing_amount = 0.0
+                        payment_method = f"Insurance ({insurance.provider_name})"
+                        billing_status = BillingStatus.paid # Covered by insurance, considered paid
+                else:
+                    # Handle invalid insurance selection? Maybe raise error or ignore?
+                    # For now, we'll ignore it and charge the default amount.
+                    # Consider adding a message back to the user if insurance was invalid.
+                    pass # Keep default amount
+
+            # Create billing
+            billing_data = BillingCreate(
+                patient_id=patient.patient_id,
+                appointment_id=appointment.appointment_id,
+                amount=billing_amount,
+                status=billing_status,
+                payment_method=payment_method
+            )
+            crud.create_billing(db, billing_data)
+
+            # Create notification for doctor
+            doctor = crud.get_doctor(db, doctor_id)
+            if doctor and doctor.user_id:
+                notification_data = schemas.NotificationCreate(
+                    user_id=doctor.user_id,
+                    title="New Appointment",
+                    message=f"New appointment scheduled with {patient.name} on {appointment_datetime.strftime('%Y-%m-%d %H:%M')}",
+                    is_read=False
+                )
+                crud.create_notification(db, notification_data)
+    except SlotUnavailableError:
+        # Someone else booked an overlapping time first, nothing was saved
+        return RedirectResponse(
+            url="/patients/appointments?error=That+time+was+just+booked.+Please+pick+another+slot.",
+            status_code=303
         )
-        crud.create_notification(db, notification_data)
 
-    
     return RedirectResponse(url="/patients/appointments", status_code=303)
 
 
@@ -160,12 +159,9 @@ def book_appointment(
 def patient_health_records(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role)
+    current_user: models.User = Depends(check_patient_role),
+    patient: models.Patient = Depends(current_patient)
 ):
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient profile not found")
-    
     # Get all health records
     health_records = crud.get_patient_health_records(db, patient.patient_id)
     
@@ -180,12 +176,9 @@ def patient_health_records(
 def patient_prescriptions(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role)
+    current_user: models.User = Depends(check_patient_role),
+    patient: models.Patient = Depends(current_patient)
 ):
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient profile not found")
-    
     # Get all health records
     health_records = crud.get_patient_health_records(db, patient.patient_id)
     
@@ -206,12 +199,9 @@ def patient_prescriptions(
 def patient_tests(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role)
+    current_user: models.User = Depends(check_patient_role),
+    patient: models.Patient = Depends(current_patient)
 ):
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient profile not found")
-    
     # Get all health records
     health_records = crud.get_patient_health_records(db, patient.patient_id)
     
@@ -232,12 +222,9 @@ def patient_tests(
 def patient_billing(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role)
+    current_user: models.User = Depends(check_patient_role),
+    patient: models.Patient = Depends(current_patient)
 ):
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient profile not found")
-    
     # Get all billings
     billings = crud.get_patient_billings(db, patient.patient_id)
     
@@ -252,12 +239,9 @@ def patient_billing(
 def patient_insurance(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role)
+    current_user: models.User = Depends(check_patient_role),
+    patient: models.Patient = Depends(current_patient)
 ):
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient profile not found")
-    
     # Get all insurances
     insurances = crud.get_patient_insurances(db, patient.patient_id)
     
@@ -277,13 +261,9 @@ def add_insurance(
     coverage_details: Optional[str] = Form(None),
     valid_until: Optional[str] = Form(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role),
+    patient: models.Patient = Depends(current_patient),
     
 ):
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient profile not found")
-    
     # Parse valid_until date
     from datetime import datetime
     valid_until_date = None
@@ -315,12 +295,8 @@ def update_insurance(
     coverage_details: Optional[str] = Form(None),
     valid_until: Optional[str] = Form(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role),
+    patient: models.Patient = Depends(current_patient),
 ):
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient profile not found")
-
     db_insurance = crud.get_insurance(db, insurance_id)
     if not db_insurance or db_insurance.patient_id != patient.patient_id:
         raise HTTPException(status_code=404, detail="Insurance not found or access denied")
@@ -355,12 +331,8 @@ def update_insurance(
 def delete_insurance(
     insurance_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role),
+    patient: models.Patient = Depends(current_patient),
 ):
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient profile not found")
-
     db_insurance = crud.get_insurance(db, insurance_id)
     if not db_insurance or db_insurance.patient_id != patient.patient_id:
         raise HTTPException(status_code=404, detail="Insurance not found or access denied")
@@ -428,12 +400,15 @@ def create_patient_api(
 
 @router.get("/api/patients", response_model=List[schemas.PatientResponse])
 def read_patients_api(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(check_doctor_or_admin_role)
 ):
-    patients = crud.get_patients(db, skip=skip, limit=limit)
+    patients = crud.get_patients(db, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(response, patients, crud.PATIENT_SORT, limit)
     return patients
 
 @router.get("/api/patients/{patient_id}", response_model=schemas.PatientResponse)
@@ -482,12 +457,8 @@ def submit_feedback(
     rating: int = Form(...),
     comment: str = Form(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_patient_role)
+    patient: models.Patient = Depends(current_patient)
 ):
-    patient = crud.get_patient_by_user_id(db, current_user.user_id)
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient profile not found")
-    
     # Verify the appointment belongs to this patient and is completed
     appointment = db.query(models.Appointment).filter(
         models.Appointment.appointment_id == appointment_id,
@@ -7,7 +7,8 @@ from typing import List, Optional
 
 from app import crud, schemas, models
 from app.database import get_db
-from app.dependencies import get_current_active_user, check_doctor_role, check_doctor_or_admin_role
+from app.dependencies import get_current_active_user, check_doctor_or_admin_role, current_doctor
+from app.doctor_patients import can_doctor_access_patient
 
 router = APIRouter(
     prefix="/api/prescriptions",
@@ -20,7 +21,7 @@ templates = Jinja2Templates(directory="app/templates")
 def create_prescription_api(
     prescription: schemas.PrescriptionCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
     # Check if health record exists
     health_record = crud.get_health_record(db, prescription.record_id)
@@ -28,23 +29,23 @@ def create_prescription_api(
         raise HTTPException(status_code=404, detail="Health record not found")
     
     # Check if doctor is authorized
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor or health_record.doctor_id != doctor.doctor_id:
+    if health_record.doctor_id != doctor.doctor_id:
         raise HTTPException(status_code=403, detail="Not authorized to create prescription for this health record")
     
-    # Create prescription
-    prescription_db = crud.create_prescription(db, prescription)
-    
-    # Create notification for patient
-    patient = crud.get_patient(db, health_record.patient_id)
-    if patient and patient.user_id:
-        notification_data = schemas.NotificationCreate(
-            user_id=patient.user_id,
-            title="New Prescription",
-            message=f"Dr. {doctor.name} has prescribed {prescription.medication_name} for you.",
-            is_read=False
-        )
-        crud.create_notification(db, notification_data)
+    with crud.unit_of_work(db):
+        # Create prescription
+        prescription_db = crud.create_prescription(db, prescription)
+    
+        # Create notification for patient
+        patient = crud.get_patient(db, health_record.patient_id)
+        if patient and patient.user_id:
+            notification_data = schemas.NotificationCreate(
+                user_id=patient.user_id,
+                title="New Prescription",
+                message=f"Dr. {doctor.name} has prescribed {prescription.medication_name} for you.",
+                is_read=False
+            )
+            crud.create_notification(db, notification_data)
     
     return prescription_db
 
@@ -52,7 +53,7 @@ def create_prescription_api(
 def delete_prescription_api(
     prescription_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
     # Get prescription
     prescription = crud.get_prescription(db, prescription_id)
@@ -65,8 +66,7 @@ def delete_prescription_api(
         raise HTTPException(status_code=404, detail="Health record not found")
     
     # Check if doctor is authorized
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor or health_record.doctor_id != doctor.doctor_id:
+    if health_record.doctor_id != doctor.doctor_id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this prescription")
     
     # Delete prescription
@@ -92,24 +92,19 @@ def read_prescriptions_api(
         
         # Check access rights
         if current_user.role == "patient":
-            patient = crud.get_patient_by_user_id(db, current_user.user_id)
+            patient = current_user.patient
             if not patient or health_record.patient_id != patient.patient_id:
                 raise HTTPException(status_code=403, detail="Not authorized to access prescriptions for this health record")
         
         elif current_user.role == "doctor":
-            doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+            doctor = current_user.doctor
             if not doctor:
                 raise HTTPException(status_code=404, detail="Doctor profile not found")
             
             # Check if this doctor created the record or has treated this patient
             if health_record.doctor_id != doctor.doctor_id:
                 # Check if doctor has treated this patient (has an appointment)
-                appointment = db.query(models.Appointment).filter(
-                    models.Appointment.doctor_id == doctor.doctor_id,
-                    models.Appointment.patient_id == health_record.patient_id
-                ).first()
-                
-                if not appointment:
+                if not can_doctor_access_patient(db, doctor.doctor_id, health_record.patient_id):
                     raise HTTPException(status_code=403, detail="Not authorized to access prescriptions for this health record")
         
         # Get prescriptions
@@ -118,7 +113,7 @@ def read_prescriptions_api(
     else:
         # Without record_id, limit results based on user role
         if current_user.role == "patient":
-            patient = crud.get_patient_by_user_id(db, current_user.user_id)
+            patient = current_user.patient
             if not patient:
                 raise HTTPException(status_code=404, detail="Patient profile not found")
             
@@ -131,7 +126,7 @@ def read_prescriptions_api(
                 prescriptions.extend(crud.get_record_prescriptions(db, record.record_id))
         
         elif current_user.role == "doctor":
-            doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+            doctor = current_user.doctor
             if not doctor:
                 raise HTTPException(status_code=404, detail="Doctor profile not found")
             
@@ -172,24 +167,19 @@ def read_prescription_api(
     
     # Check access rights
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient or health_record.patient_id != patient.patient_id:
             raise HTTPException(status_code=403, detail="Not authorized to access this prescription")
     
     elif current_user.role == "doctor":
-        doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+        doctor = current_user.doctor
         if not doctor:
             raise HTTPException(status_code=404, detail="Doctor profile not found")
         
         # Check if this doctor created the record or has treated this patient
         if health_record.doctor_id != doctor.doctor_id:
             # Check if doctor has treated this patient (has an appointment)
-            appointment = db.query(models.Appointment).filter(
-                models.Appointment.doctor_id == doctor.doctor_id,
-                models.Appointment.patient_id == health_record.patient_id
-            ).first()
-            
-            if not appointment:
+            if not can_doctor_access_patient(db, doctor.doctor_id, health_record.patient_id):
                 raise HTTPException(status_code=403, detail="Not authorized to access this prescription")
     
     return prescription
@@ -199,7 +189,7 @@ def update_prescription_api(
     prescription_id: int,
     prescription: schemas.PrescriptionUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
     # Get prescription
     db_prescription = crud.get_prescription(db, prescription_id)
@@ -212,23 +202,23 @@ def update_prescription_api(
         raise HTTPException(status_code=404, detail="Health record not found")
     
     # Check if doctor is authorized (only the doctor who created the health record can update prescriptions)
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor or health_record.doctor_id != doctor.doctor_id:
+    if health_record.doctor_id != doctor.doctor_id:
         raise HTTPException(status_code=403, detail="Not authorized to update this prescription")
     
-    # Update prescription
-    updated_prescription = crud.update_prescription(db, prescription_id, prescription)
-    
-    # Create notification for patient
-    patient = crud.get_patient(db, health_record.patient_id)
-    if patient and patient.user_id:
-        notification_data = schemas.NotificationCreate(
-            user_id=patient.user_id,
-            title="Prescription Updated",
-            message=f"Dr. {doctor.name} has updated your prescription for {updated_prescription.medication_name}.",
-            is_read=False
-        )
-        crud.create_notification(db, notification_data)
+    with crud.unit_of_work(db):
+        # Update prescription
+        updated_prescription = crud.update_prescription(db, prescription_id, prescription)
+    
+        # Create notification for patient
+        patient = crud.get_patient(db, health_record.patient_id)
+        if patient and patient.user_id:
+            notification_data = schemas.NotificationCreate(
+                user_id=patient.user_id,
+                title="Prescription Updated",
+                message=f"Dr. {doctor.name} has updated your prescription for {updated_prescription.medication_name}.",
+                is_read=False
+            )
+            crud.create_notification(db, notification_data)
     
     return updated_prescription
 
@@ -236,7 +226,7 @@ def update_prescription_api(
 def delete_prescription_api(
     prescription_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
     # Get prescription
     db_prescription = crud.get_prescription(db, prescription_id)
@@ -249,8 +239,7 @@ def delete_prescription_api(
         raise HTTPException(status_code=404, detail="Health record not found")
     
     # Check if doctor is authorized (only the doctor who created the health record can delete prescriptions)
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor or health_record.doctor_id != doctor.doctor_id:
+    if health_record.doctor_id != doctor.doctor_id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this prescription")
     
     # Delete prescription
@@ -6,7 +6,8 @@ from typing import List, Optional
 
 from app import crud, schemas, models
 from app.database import get_db
-from app.dependencies import get_current_active_user, check_doctor_role, check_doctor_or_admin_role
+from app.dependencies import get_current_active_user, check_doctor_role, check_doctor_or_admin_role, current_doctor
+from app.doctor_patients import can_doctor_access_patient
 
 router = APIRouter(
     prefix="/api/tests",
@@ -21,7 +22,7 @@ def update_test_status(
     test_id: int,
     status: str = Form(...),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
     # Get test
     db_test = crud.get_test(db, test_id)
@@ -29,8 +30,7 @@ def update_test_status(
         raise HTTPException(status_code=404, detail="Test not found")
 
     # Check if doctor is authorized
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor or db_test.ordered_by != doctor.doctor_id:
+    if db_test.ordered_by != doctor.doctor_id:
         raise HTTPException(status_code=403, detail="Not authorized to update this test")
 
     # Update test status
@@ -50,7 +50,7 @@ def update_test_status(
 def create_test_api(
     test: schemas.TestCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
     # Check if health record exists
     health_record = crud.get_health_record(db, test.record_id)
@@ -58,23 +58,23 @@ def create_test_api(
         raise HTTPException(status_code=404, detail="Health record not found")
     
     # Check if doctor is authorized
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor or test.ordered_by != doctor.doctor_id:
+    if test.ordered_by != doctor.doctor_id:
         raise HTTPException(status_code=403, detail="Not authorized to order tests for this patient")
     
-    # Create test
-    test_db = crud.create_test(db, test)
+    with crud.unit_of_work(db):
+        # Create test
+        test_db = crud.create_test(db, test)
     
-    # Create notification for patient
-    patient = crud.get_patient(db, health_record.patient_id)
-    if patient and patient.user_id:
-        notification_data = schemas.NotificationCreate(
-            user_id=patient.user_id,
-            title="New Test Ordered",
-            message=f"Dr. {doctor.name} has ordered a {test.test_name} test for you.",
-            is_read=False
-        )
-        crud.create_notification(db, notification_data)
+        # Create notification for patient
+        patient = crud.get_patient(db, health_record.patient_id)
+        if patient and patient.user_id:
+            notification_data = schemas.NotificationCreate(
+                user_id=patient.user_id,
+                title="New Test Ordered",
+                message=f"Dr. {doctor.name} has ordered a {test.test_name} test for you.",
+                is_read=False
+            )
+            crud.create_notification(db, notification_data)
     
     return test_db
 
@@ -93,24 +93,19 @@ def read_tests_api(
         
         # Check access rights
         if current_user.role == "patient":
-            patient = crud.get_patient_by_user_id(db, current_user.user_id)
+            patient = current_user.patient
             if not patient or health_record.patient_id != patient.patient_id:
                 raise HTTPException(status_code=403, detail="Not authorized to access tests for this health record")
         
         elif current_user.role == "doctor":
-            doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+            doctor = current_user.doctor
             if not doctor:
                 raise HTTPException(status_code=404, detail="Doctor profile not found")
             
             # Check if this doctor created the record or has treated this patient
             if health_record.doctor_id != doctor.doctor_id:
                 # Check if doctor has treated this patient (has an appointment)
-                appointment = db.query(models.Appointment).filter(
-                    models.Appointment.doctor_id == doctor.doctor_id,
-                    models.Appointment.patient_id == health_record.patient_id
-                ).first()
-                
-                if not appointment:
+                if not can_doctor_access_patient(db, doctor.doctor_id, health_record.patient_id):
                     raise HTTPException(status_code=403, detail="Not authorized to access tests for this health record")
         
         # Get tests
@@ -119,7 +114,7 @@ def read_tests_api(
     else:
         # Without record_id, limit results based on user role
         if current_user.role == "patient":
-            patient = crud.get_patient_by_user_id(db, current_user.user_id)
+            patient = current_user.patient
             if not patient:
                 raise HTTPException(status_code=404, detail="Patient profile not found")
             
@@ -132,7 +127,7 @@ def read_tests_api(
                 tests.extend(crud.get_record_tests(db, record.record_id))
         
         elif current_user.role == "doctor":
-            doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+            doctor = current_user.doctor
             if not doctor:
                 raise HTTPException(status_code=404, detail="Doctor profile not found")
             
@@ -168,24 +163,19 @@ def read_test_api(
     
     # Check access rights
     if current_user.role == "patient":
-        patient = crud.get_patient_by_user_id(db, current_user.user_id)
+        patient = current_user.patient
         if not patient or health_record.patient_id != patient.patient_id:
             raise HTTPException(status_code=403, detail="Not authorized to access this test")
     
     elif current_user.role == "doctor":
-        doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
+        doctor = current_user.doctor
         if not doctor:
             raise HTTPException(status_code=404, detail="Doctor profile not found")
         
         # Check if this doctor ordered the test, created the record, or has treated this patient
         if test.ordered_by != doctor.doctor_id and health_record.doctor_id != doctor.doctor_id:
             # Check if doctor has treated this patient (has an appointment)
-            appointment = db.query(models.Appointment).filter(
-                models.Appointment.doctor_id == doctor.doctor_id,
-                models.Appointment.patient_id == health_record.patient_id
-            ).first()
-            
-            if not appointment:
+            if not can_doctor_access_patient(db, doctor.doctor_id, health_record.patient_id):
                 raise HTTPException(status_code=403, detail="Not authorized to access this test")
     
     return test
@@ -220,7 +210,7 @@ def read_test_api(
 def delete_test_api(
     test_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
     # Get test
     db_test = crud.get_test(db, test_id)
@@ -228,8 +218,7 @@ def delete_test_api(
         raise HTTPException(status_code=404, detail="Test not found")
     
     # Check if doctor is authorized (only the doctor who ordered the test can delete it)
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor or db_test.ordered_by != doctor.doctor_id:
+    if db_test.ordered_by != doctor.doctor_id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this test")
     
     # Only allow deletion if test is in 'ordered' status
@@ -249,7 +238,7 @@ def update_test_results(
     result: str = Form(...),
     report_url: Optional[str] = Form(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(check_doctor_role)
+    doctor: models.Doctor = Depends(current_doctor)
 ):
     # Get test
     db_test = crud.get_test(db, test_id)
@@ -257,8 +246,7 @@ def update_test_results(
         raise HTTPException(status_code=404, detail="Test not found")
 
     # Check if doctor is authorized
-    doctor = crud.get_doctor_by_user_id(db, current_user.user_id)
-    if not doctor or db_test.ordered_by != doctor.doctor_id:
+    if db_test.ordered_by != doctor.doctor_id:
         raise HTTPException(status_code=403, detail="Not authorized to update this test")
 
     # Update test results and report URL
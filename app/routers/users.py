@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Form, Response
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app import crud, schemas
 from app.database import get_db
+from app.pagination import set_next_cursor
 from app.dependencies import get_current_active_user, check_admin_role
 
 router = APIRouter(
@@ -18,12 +19,15 @@ templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/", response_model=List[schemas.UserResponse])
 def read_users(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: schemas.UserResponse = Depends(check_admin_role)
 ):
-    users = crud.get_users(db, skip=skip, limit=limit)
+    users = crud.get_users(db, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(response, users, crud.USER_SORT, limit)
     return users
 
 @router.get("/{user_id}", response_model=schemas.UserResponse)
@@ -1,8 +1,10 @@
 from pydantic import BaseModel, EmailStr, validator, Field
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime, date, time
 from enum import Enum
 
+from app import availability
+
 # User schemas
 class UserBase(BaseModel):
     email: EmailStr
@@ -120,6 +122,8 @@ class AppointmentBase(BaseModel):
     patient_id: int
     doctor_id: int
     appointment_time: datetime
+    # Defaults to the slot length of the doctor's schedule at that time
+    duration_minutes: Optional[int] = Field(None, ge=5, le=480, multiple_of=5)
     reason: Optional[str] = None
     status: AppointmentStatus = AppointmentStatus.scheduled
 
@@ -128,6 +132,7 @@ class AppointmentCreate(AppointmentBase):
 
 class AppointmentUpdate(BaseModel):
     appointment_time: Optional[datetime] = None
+    duration_minutes: Optional[int] = Field(None, ge=5, le=480, multiple_of=5)
     reason: Optional[str] = None
     status: Optional[AppointmentStatus] = None
 
@@ -139,12 +144,30 @@ class AppointmentResponse(AppointmentBase):
     class Config:
         from_attributes = True
 
+# Doctor calendar schemas
+class CalendarAppointment(BaseModel):
+    appointment_id: int
+    appointment_time: datetime
+    duration_minutes: Optional[int] = None
+    status: AppointmentStatus
+    reason: Optional[str] = None
+    patient_id: Optional[int] = None
+    patient_name: Optional[str] = None
+
+class DoctorCalendarResponse(BaseModel):
+    month: str
+    previous_month: str
+    next_month: str
+    # "YYYY-MM-DD" -> that day's appointments by time; days without any are left out
+    days: Dict[str, List[CalendarAppointment]]
+
 # Doctor Schedule schemas
 class DoctorScheduleBase(BaseModel):
     doctor_id: int
     day: str
     start_time: time
     end_time: time
+    slot_duration_minutes: int = Field(30, ge=5, le=240, multiple_of=5)
     is_available: bool = True
 
 class DoctorScheduleCreate(DoctorScheduleBase):
@@ -154,6 +177,7 @@ class DoctorScheduleUpdate(BaseModel):
     day: Optional[str] = None
     start_time: Optional[time] = None
     end_time: Optional[time] = None
+    slot_duration_minutes: Optional[int] = Field(None, ge=5, le=240, multiple_of=5)
     is_available: Optional[bool] = None
 
 class DoctorScheduleResponse(DoctorScheduleBase):
@@ -162,6 +186,96 @@ class DoctorScheduleResponse(DoctorScheduleBase):
     class Config:
         from_attributes = True
 
+# Weekly schedule template schemas
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+class WeeklyScheduleEntry(BaseModel):
+    day: str
+    start_time: time
+    end_time: time
+    slot_duration_minutes: int = Field(30, ge=5, le=240, multiple_of=5)
+    is_available: bool = True
+
+    @validator('day')
+    def validate_day(cls, v):
+        if v.lower() not in WEEKDAYS:
+            raise ValueError('Day must be a weekday name such as monday')
+        return v.lower()
+
+    @validator('end_time')
+    def validate_window(cls, v, values):
+        if 'start_time' in values and values['start_time'] >= v:
+            raise ValueError('Start time must be before end time')
+        return v
+
+class WeeklyScheduleTemplate(BaseModel):
+    # The doctor's complete week; rows not listed are removed
+    schedules: List[WeeklyScheduleEntry]
+
+    @validator('schedules')
+    def validate_no_overlap(cls, v):
+        windows_by_day = {}
+        for entry in v:
+            windows_by_day.setdefault(entry.day, []).append(
+                (entry.start_time.hour * 60 + entry.start_time.minute, entry.end_time.hour * 60 + entry.end_time.minute)
+            )
+        for day, windows in windows_by_day.items():
+            overlap = availability.first_overlap(windows)
+            if overlap:
+                (_, first_end), (start, second_end) = overlap
+                end = min(first_end, second_end)
+                raise ValueError(
+                    f'{day.title()} schedules overlap between {start // 60:02d}:{start % 60:02d}'
+                    f' and {end // 60:02d}:{end % 60:02d}'
+                )
+        return v
+
+class WeeklyScheduleTemplateApply(WeeklyScheduleTemplate):
+    doctor_ids: List[int] = Field(..., min_length=1)
+
+class WeeklyScheduleTemplateResult(BaseModel):
+    doctors: int
+    inserted: int
+    updated: int
+    deleted: int
+    unchanged: int
+
+# Schedule exception schemas
+class ScheduleExceptionBase(BaseModel):
+    doctor_id: int
+    date: date
+    # Both empty for the whole day
+    start_time: Optional[time] = None
+    end_time: Optional[time] = None
+    # False for leave or a blocked window, true for an extra clinic
+    is_available: bool = False
+    slot_duration_minutes: int = Field(30, ge=5, le=240, multiple_of=5)
+    reason: Optional[str] = None
+
+    @validator('end_time', always=True)
+    def validate_window(cls, v, values):
+        start = values.get('start_time')
+        if (start is None) != (v is None):
+            raise ValueError('Start and end time must both be given or both be empty')
+        if v is not None and start >= v:
+            raise ValueError('Start time must be before end time')
+        return v
+
+    @validator('is_available', always=True)
+    def validate_extra_clinic(cls, v, values):
+        if v and values.get('end_time') is None:
+            raise ValueError('An extra clinic needs a start and end time')
+        return v
+
+class ScheduleExceptionCreate(ScheduleExceptionBase):
+    pass
+
+class ScheduleExceptionResponse(ScheduleExceptionBase):
+    exception_id: int
+
+    class Config:
+        from_attributes = True
+
 # Health Record schemas
 class HealthRecordBase(BaseModel):
     patient_id: int
@@ -211,6 +325,20 @@ class PrescriptionResponse(PrescriptionBase):
     class Config:
         from_attributes = True
 
+# Health record with its prescriptions and tests, created in one request
+class HealthRecordPrescriptionItem(BaseModel):
+    medication_name: str
+    dosage: Optional[str] = None
+    instructions: Optional[str] = None
+    duration: Optional[str] = None
+
+class HealthRecordTestItem(BaseModel):
+    test_name: str
+
+class HealthRecordWithItemsCreate(HealthRecordBase):
+    prescriptions: List[HealthRecordPrescriptionItem] = []
+    tests: List[HealthRecordTestItem] = []
+
 # Test schemas
 class TestStatus(str, Enum):
     ordered = "ordered"
@@ -243,6 +371,10 @@ class TestResponse(TestBase):
     class Config:
         from_attributes = True
 
+class HealthRecordWithItemsResponse(HealthRecordResponse):
+    prescriptions: List[PrescriptionResponse] = []
+    tests: List[TestResponse] = []
+
 # Billing schemas
 class BillingStatus(str, Enum):
     pending = "pending"
@@ -1,4 +1,6 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
@@ -16,6 +18,21 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt runs on its own small pool (it releases the GIL), so a burst of
+# logins uses at most this many CPUs however many requests are waiting
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+# Hashes queued or running before new ones are refused with a 503; each one
+# also holds the threadpool thread of the request waiting for it, so keep
+# this well below the threadpool size (40)
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 4 * PASSWORD_HASH_WORKERS))
+
+_hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+
+class PasswordHasherBusyError(RuntimeError):
+    """Raised when the password hashing pool already has too much queued work"""
+
 
 def verify_password(plain_password, hashed_password):
     """Verify that a plain password matches the hashed version"""
@@ -27,6 +44,32 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+def _run_on_hash_pool(fn, *args):
+    # Refuse instead of queueing without bound, so a burst of logins can't
+    # delay every later login by minutes
+    if not _hash_slots.acquire(blocking=False):
+        raise PasswordHasherBusyError("Too many password checks in progress, try again shortly")
+    try:
+        future = _hash_pool.submit(fn, *args)
+    except BaseException:
+        _hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return future.result()
+
+
+# For request handlers: they are sync routes, so the wait happens on a
+# threadpool thread while at most PASSWORD_HASH_WORKERS hashes use the CPU
+def verify_password_pooled(plain_password, hashed_password):
+    """verify_password on the bounded hashing pool"""
+    return _run_on_hash_pool(verify_password, plain_password, hashed_password)
+
+
+def get_password_hash_pooled(password):
+    """get_password_hash on the bounded hashing pool"""
+    return _run_on_hash_pool(get_password_hash, password)
+
+
 def create_access_token(data: dict,
                         expires_delta: Optional[timedelta] = None) -> str:
     """Creates a JWT access token."""
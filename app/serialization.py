@@ -0,0 +1,63 @@
+from enum import Enum
+from functools import lru_cache
+from typing import Dict, List, Sequence, Type, get_args, get_origin
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from typing_extensions import TypedDict
+
+
+def _json_type(annotation):
+    # Enum columns come back as the model enums, which share the values of the
+    # schema enums but not their type; serialize them as their string value
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        return str
+    # Nested schemas, also inside lists and dicts, are plain dicts as well
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _row_type(annotation)
+    origin, args = get_origin(annotation), get_args(annotation)
+    if origin is list:
+        return List[_json_type(args[0])]
+    if origin is dict:
+        return Dict[args[0], _json_type(args[1])]
+    return annotation
+
+
+def row_fields(schema: Type[BaseModel]) -> List[str]:
+    """Column names to select for rows serialized as `schema`"""
+    return list(schema.model_fields)
+
+
+def row_columns(model, schema: Type[BaseModel]):
+    """Model columns to select for rows serialized as `schema`"""
+    return [getattr(model, name) for name in row_fields(schema)]
+
+
+@lru_cache(maxsize=None)
+def _row_type(schema: Type[BaseModel]):
+    # A TypedDict mirror of the response schema serializes plain dict rows
+    # directly, without building a model instance per row
+    return TypedDict(
+        f"{schema.__name__}Row",
+        {name: _json_type(field.annotation) for name, field in schema.model_fields.items()},
+    )
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[_row_type(schema)])
+
+
+@lru_cache(maxsize=None)
+def _adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(_row_type(schema))
+
+
+def json_list_response(schema: Type[BaseModel], rows: Sequence[dict]) -> Response:
+    """JSON response for rows fetched with row_columns(), bypassing response_model"""
+    return Response(content=_list_adapter(schema).dump_json(rows), media_type="application/json")
+
+
+def json_response(schema: Type[BaseModel], data: dict) -> Response:
+    """JSON response for a plain dict shaped like `schema`, bypassing response_model"""
+    return Response(content=_adapter(schema).dump_json(data), media_type="application/json")
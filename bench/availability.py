@@ -0,0 +1,75 @@
+"""Free slot computation for one busy doctor-day: the old per-slot loop against the interval engine
+
+    python bench/availability.py
+
+Bookings sit on the 30 minute grid, so both versions must return the same
+slots; the old loop only looked at start times and ignored durations.
+"""
+import common
+
+common.setup("availability")
+
+import random
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+
+from app import availability
+
+DAY = date(2030, 1, 7)
+CASES = [
+    ("1 schedule, 16 bookings", [(time(9, 0), time(17, 0))], 16),
+    ("2 schedules, 120 bookings", [(time(6, 0), time(12, 0)), (time(13, 0), time(21, 30))], 120),
+    ("2 schedules, 300 bookings", [(time(0, 0), time(23, 30)), (time(1, 0), time(20, 0))], 300),
+]
+
+
+def old_available_slots(day, schedules, appointments):
+    """crud.get_available_slots before the interval engine, minus its queries"""
+    all_slots = []
+    for schedule in schedules:
+        current_time = datetime.combine(day, schedule.start_time)
+        end_time = datetime.combine(day, schedule.end_time)
+        while current_time < end_time:
+            slot_end = current_time + timedelta(minutes=30)
+            if slot_end <= end_time:
+                all_slots.append((current_time, slot_end))
+            current_time = slot_end
+
+    available_slots = []
+    for slot_start, slot_end in all_slots:
+        is_available = True
+        for appt in appointments:
+            if slot_start <= appt.appointment_time < slot_end:
+                is_available = False
+                break
+        if is_available:
+            available_slots.append((slot_start, slot_end))
+    return available_slots
+
+
+def main():
+    rng = random.Random(17)
+    for name, windows, bookings in CASES:
+        schedules = [
+            SimpleNamespace(start_time=start, end_time=end, slot_duration_minutes=30)
+            for start, end in windows
+        ]
+        times = [
+            datetime.combine(DAY, time.min) + timedelta(minutes=30 * rng.randrange(48))
+            for _ in range(bookings)
+        ]
+        appointments = [SimpleNamespace(appointment_time=value) for value in times]
+        booked = [(value, 30) for value in times]
+
+        old = old_available_slots(DAY, schedules, appointments)
+        new = availability.available_slots(DAY, schedules, booked)
+        assert sorted(set(old)) == new, name
+
+        repeat = 2000
+        old_time = common.timed(lambda: old_available_slots(DAY, schedules, appointments), repeat)
+        new_time = common.timed(lambda: availability.available_slots(DAY, schedules, booked), repeat)
+        print(f"{name:28} old {old_time * 1e6:8.1f} us  new {new_time * 1e6:7.1f} us  x{old_time / new_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Cold start of one worker against an already migrated database
+
+    python bench/cold_start.py
+
+Reports process start to the first response of GET /login, the SQL run on
+the way, and the startup database work of the old import-time init_db()
+against the schema version check the lifespan runs now.
+"""
+import common
+
+common.setup("cold_start")
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from sqlalchemy import event
+
+from app import init_db
+from app.database import engine
+
+os.environ.update(
+    DEFAULT_ADMIN_EMAIL="admin@example.com",
+    DEFAULT_ADMIN_PASSWORD="admin",
+    DEFAULT_ADMIN_NAME="Admin",
+)
+
+WORKER = """
+from sqlalchemy import event
+import app.database as database
+statements = []
+event.listen(database.engine, "before_cursor_execute", lambda *args: statements.append(1))
+import main
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    status = client.get("/login").status_code
+print(status, len(statements))
+"""
+
+
+def start_worker():
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", WORKER], cwd=common.ROOT, env=os.environ,
+                            capture_output=True, text=True, check=True)
+    status, statements = result.stdout.split()
+    return time.perf_counter() - start, int(status), int(statements)
+
+
+def count_statements(fn):
+    statements = []
+
+    def on_execute(*args):
+        statements.append(1)
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+    return len(statements)
+
+
+def main():
+    # What a deploy does once, before starting the workers
+    init_db.init_db()
+
+    runs = [start_worker() for _ in range(5)]
+    status, statements = runs[0][1], runs[0][2]
+    print(f"process start -> first response: median {statistics.median(run[0] for run in runs) * 1000:.0f} ms "
+          f"(status {status}, {statements} startup statements)")
+
+    for name, fn in [("old import-time init_db()", init_db.init_db), ("lifespan check_schema()", init_db.check_schema)]:
+        per_call = common.timed(fn, 50)
+        print(f"{name:28} {per_call * 1000:6.2f} ms  {count_statements(fn):3d} statements")
+
+
+if __name__ == "__main__":
+    main()
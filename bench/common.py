@@ -0,0 +1,38 @@
+"""Shared setup for the benchmarks; import it before anything from app
+
+Each run uses a throwaway SQLite database unless BENCH_DATABASE_URL points
+at an empty MySQL schema.
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup(name):
+    """Point the app at a fresh database, returns its URL"""
+    directory = tempfile.mkdtemp(prefix="medilink-bench-")
+    url = os.environ.get("BENCH_DATABASE_URL") or f"sqlite:///{directory}/{name}.db"
+    os.environ["DATABASE_URL"] = url
+    os.environ.pop("DATABASE_REPLICA_URLS", None)
+    os.environ["AVAILABILITY_HORIZON_REFRESH_SECONDS"] = "0"
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    logging.disable(logging.WARNING)
+    return url
+
+
+def timed(fn, repeat):
+    """Mean seconds per call of `fn` over `repeat` calls"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
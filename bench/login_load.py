@@ -0,0 +1,128 @@
+"""Latency of unrelated routes while logins arrive at a steady rate
+
+    python bench/login_load.py [--rate 50] [--seconds 5]
+
+Starts one uvicorn worker on a fresh database, measures p50/p99 of the
+probe routes while idle, then again while POST /token runs at `rate`
+logins per second. Logins beyond PASSWORD_HASH_MAX_PENDING are shed with
+503 and reported separately.
+"""
+import common
+
+common.setup("login_load")
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+ADMIN = {"username": "admin@example.com", "password": "admin"}
+PROBE_PATHS = ["/api/specializations", "/login"]
+PROBE_INTERVAL = 0.02
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port):
+    env = dict(
+        os.environ,
+        DEFAULT_ADMIN_EMAIL=ADMIN["username"],
+        DEFAULT_ADMIN_PASSWORD=ADMIN["password"],
+        DEFAULT_ADMIN_NAME="Admin",
+    )
+    subprocess.run([sys.executable, "-m", "app.init_db"], cwd=common.ROOT, env=env, check=True, capture_output=True)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=common.ROOT, env=env,
+    )
+
+
+async def wait_until_up(client):
+    for _ in range(200):
+        try:
+            await client.get("/login")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("server did not start")
+
+
+async def probe(client, token, until, latencies):
+    while time.monotonic() < until:
+        for path in PROBE_PATHS:
+            start = time.perf_counter()
+            await client.get(path, cookies={"access_token": token})
+            latencies.setdefault(path, []).append(time.perf_counter() - start)
+        await asyncio.sleep(PROBE_INTERVAL)
+
+
+async def login(client, statuses, latencies):
+    start = time.perf_counter()
+    response = await client.post("/token", data=ADMIN)
+    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    if response.status_code == 200:
+        latencies.append(time.perf_counter() - start)
+
+
+async def logins(client, rate, seconds, statuses, latencies):
+    tasks = []
+    for _ in range(int(rate * seconds)):
+        tasks.append(asyncio.create_task(login(client, statuses, latencies)))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks)
+
+
+def report(name, latencies):
+    print(f"{name:36} p50 {common.percentile(latencies, 0.5) * 1000:7.1f} ms  "
+          f"p99 {common.percentile(latencies, 0.99) * 1000:7.1f} ms  max {max(latencies) * 1000:7.1f} ms")
+
+
+async def run(port, rate, seconds):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        await wait_until_up(client)
+        token = (await client.post("/token", data=ADMIN)).json()["access_token"]
+
+        idle = {}
+        await probe(client, token, time.monotonic() + 2, idle)
+        for path, latencies in idle.items():
+            report(f"idle {path}", latencies)
+
+        loaded, statuses, login_latencies = {}, {}, []
+        await asyncio.gather(
+            probe(client, token, time.monotonic() + seconds, loaded),
+            logins(client, rate, seconds, statuses, login_latencies),
+        )
+        for path, latencies in loaded.items():
+            report(f"{rate:g}/s logins {path}", latencies)
+        if login_latencies:
+            report("accepted logins", login_latencies)
+        print(f"login statuses: {dict(sorted(statuses.items()))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=50)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = start_server(port)
+    try:
+        asyncio.run(run(port, args.rate, args.seconds))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Requests/sec through the app with the old BaseHTTPMiddleware session expiration and the pure ASGI one
+
+    python bench/middleware.py [requests per run]
+
+Requests go through httpx's in-process ASGI transport, so the numbers are
+the app's own overhead without any network or server.
+"""
+import common
+
+common.setup("middleware")
+
+import asyncio
+import sys
+import time
+
+import httpx
+from fastapi import Request, status
+from fastapi.responses import RedirectResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+import main
+from app import migrations
+from app.database import engine
+
+PATHS = ["/static/css/style.css", "/api/specializations"]
+
+ASGISessionExpirationMiddleware = main.SessionExpirationMiddleware
+
+
+class BaseHTTPSessionExpirationMiddleware(BaseHTTPMiddleware):
+    """The middleware as it was before, for comparison"""
+
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        if response.status_code == status.HTTP_401_UNAUTHORIZED:
+            path = request.url.path
+            if not path.startswith("/api/") and not path == "/login":
+                return RedirectResponse(url="/login?expired=true", status_code=303)
+        return response
+
+
+def build(middleware):
+    main.SessionExpirationMiddleware = middleware
+    try:
+        return main.create_app()
+    finally:
+        main.SessionExpirationMiddleware = ASGISessionExpirationMiddleware
+
+
+async def requests_per_second(app, path, requests):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for _ in range(200):
+            await client.get(path)
+        start = time.perf_counter()
+        for _ in range(requests):
+            await client.get(path)
+        return requests / (time.perf_counter() - start)
+
+
+async def redirect_of(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        response = await client.get("/patients/dashboard")
+        return response.status_code, response.headers.get("location")
+
+
+async def run(requests):
+    apps = {
+        "old": build(BaseHTTPSessionExpirationMiddleware),
+        "new": build(ASGISessionExpirationMiddleware),
+    }
+    for name, app in apps.items():
+        print(f"{name}: unauthenticated page -> {await redirect_of(app)}")
+    for path in PATHS:
+        best = {name: 0.0 for name in apps}
+        # Alternate the stacks and keep each one's best run to even out noise
+        for _ in range(2):
+            for name, app in apps.items():
+                best[name] = max(best[name], await requests_per_second(app, path, requests))
+        print(f"{path:24} old {best['old']:7.0f} req/s  new {best['new']:7.0f} req/s  x{best['new'] / best['old']:.2f}")
+
+
+def benchmark():
+    migrations.upgrade(engine)
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    asyncio.run(run(requests))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,23 +1,30 @@
 import os
 import logging
+import asyncio
 import os
 import logging
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI, Request, Depends, status
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse, HTMLResponse # Added HTMLResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.responses import RedirectResponse, HTMLResponse, JSONResponse # Added HTMLResponse
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 
-from app.database import engine, Base
+from app.database import engine, async_engine, Base
 from app.routers import (
     auth, users, patients, doctors, admins, appointments, 
     health_records, prescriptions, tests, billing, 
     feedback, insurance
 )
 from app.dependencies import get_current_user
-from app.init_db import init_db
+from app.init_db import check_schema
+from app.pagination import InvalidCursorError
+from app.security import PasswordHasherBusyError
+from app.reservations import SlotUnavailableError
+from app.query_stats import QueryStatsMiddleware
+from app import availability_horizon
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -26,59 +33,55 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Initialize database (creates tables and default admin)
-logger.info("Initializing database...")
-init_db()
+# Create middleware for handling session expiration
+class SessionExpirationMiddleware:
+    """Pure ASGI middleware, so responses are passed through without buffering"""
 
-app = FastAPI(title="MediLink Healthcare Management System")
+    def __init__(self, app):
+        self.app = app
 
-# Create middleware for handling session expiration
-class SessionExpirationMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # If response is 401 Unauthorized and not an API route, redirect to login with expired=true
-        if response.status_code == status.HTTP_401_UNAUTHORIZED:
-            path = request.url.path
-            # Skip API routes (typically starting with /api)
-            if not path.startswith("/api/") and not path == "/login":
-                return RedirectResponse(url="/login?expired=true", status_code=303)
-        
-        return response
-
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        # Skip API routes (typically starting with /api)
+        if path.startswith("/api/") or path == "/login":
+            await self.app(scope, receive, send)
+            return
+
+        redirected = False
 
-# Add session expiration middleware
-app.add_middleware(SessionExpirationMiddleware)
+        async def send_or_redirect(message):
+            nonlocal redirected
+            # If response is 401 Unauthorized, redirect to login with expired=true
+            if message["type"] == "http.response.start" and message["status"] == status.HTTP_401_UNAUTHORIZED:
+                redirected = True
+                await RedirectResponse(url="/login?expired=true", status_code=303)(scope, receive, send)
+                return
+            if redirected:
+                # Drop the body of the original 401 response
+                return
+            await send(message)
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+        await self.app(scope, receive, send_or_redirect)
+
+# Malformed pagination cursors are a client error
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+# A full password hashing queue sheds load instead of stalling the worker
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusyError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+# Someone else booked the slot first
+async def slot_unavailable_handler(request: Request, exc: SlotUnavailableError):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
 
 # Setup templates
 templates = Jinja2Templates(directory="app/templates")
 
-# Include routers
-app.include_router(auth.router)
-app.include_router(users.router)
-app.include_router(patients.router)
-app.include_router(doctors.router)
-app.include_router(admins.router)
-app.include_router(appointments.router)
-app.include_router(health_records.router)
-app.include_router(prescriptions.router)
-app.include_router(tests.router)
-app.include_router(billing.router)
-app.include_router(feedback.router)
-app.include_router(insurance.router)
-
-@app.get("/")
 async def root(request: Request, current_user=Depends(get_current_user)):
     if current_user:
         if current_user.role == "patient":
@@ -90,6 +93,69 @@ async def root(request: Request, current_user=Depends(get_current_user)):
     # If no user is logged in, show the home page
     return templates.TemplateResponse("home.html", {"request": request})
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One query per worker when the schema is current; tables, migrations and
+    # the default admin are handled by `python -m app.init_db`
+    await run_in_threadpool(check_schema)
+    refresh_task = None
+    if availability_horizon.AVAILABILITY_HORIZON_REFRESH_SECONDS > 0:
+        refresh_task = asyncio.create_task(availability_horizon.run_refresh_loop())
+    yield
+    if refresh_task is not None:
+        refresh_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await refresh_task
+    engine.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+def create_app() -> FastAPI:
+    """Build the application; nothing touches the database until startup"""
+    app = FastAPI(title="MediLink Healthcare Management System", lifespan=lifespan)
+
+    app.add_exception_handler(InvalidCursorError, invalid_cursor_handler)
+    app.add_exception_handler(PasswordHasherBusyError, password_hasher_busy_handler)
+    app.add_exception_handler(SlotUnavailableError, slot_unavailable_handler)
+
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Add session expiration middleware
+    app.add_middleware(SessionExpirationMiddleware)
+
+    # Count SQL statements per request (outermost, so it sees the whole request)
+    app.add_middleware(QueryStatsMiddleware)
+
+    # Mount static files
+    app.mount("/static", StaticFiles(directory="app/static"), name="static")
+
+    # Include routers
+    app.include_router(auth.router)
+    app.include_router(users.router)
+    app.include_router(patients.router)
+    app.include_router(doctors.router)
+    app.include_router(admins.router)
+    app.include_router(appointments.router)
+    app.include_router(health_records.router)
+    app.include_router(prescriptions.router)
+    app.include_router(tests.router)
+    app.include_router(billing.router)
+    app.include_router(feedback.router)
+    app.include_router(insurance.router)
+
+    app.get("/")(root)
+
+    return app
+
+app = create_app()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
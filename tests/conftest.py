@@ -0,0 +1,91 @@
+import os
+import sys
+import tempfile
+
+# Every run gets a fresh SQLite file; point TEST_DATABASE_URL at an empty
+# MySQL schema to run the same tests there (its tables are emptied per test)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATA_DIR = tempfile.mkdtemp(prefix="medilink-tests-")
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL") or f"sqlite:///{TEST_DATA_DIR}/medilink.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.pop("DATABASE_REPLICA_URLS", None)
+os.environ["AVAILABILITY_HORIZON_REFRESH_SECONDS"] = "0"
+sys.path.insert(0, ROOT)
+# Templates and static files are looked up relative to the project root
+os.chdir(ROOT)
+
+import pytest
+
+from app import availability_cache, doctor_patients, migrations, models
+from app.database import SessionLocal, engine
+from app.principal_cache import principal_cache
+from app.security import create_access_token
+
+
+@pytest.fixture(scope="session")
+def schema():
+    migrations.upgrade(engine)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def clean_tables(schema):
+    with engine.begin() as connection:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+    # Ids are reused once the rows are gone, so cached entries must go too
+    availability_cache.store = availability_cache._create_store()
+    principal_cache.clear()
+    doctor_patients.access_cache.clear()
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def _make_user(db, model, role, email, name, **fields):
+    user = models.User(email=email, password_hash="not-a-hash", role=role)
+    db.add(user)
+    db.flush()
+    profile = model(user_id=user.user_id, name=name, **fields)
+    db.add(profile)
+    db.commit()
+    return profile
+
+
+@pytest.fixture
+def make_doctor(db):
+    def make(email="doctor@example.com", name="Dr Test", schedules=(), **fields):
+        """Doctor with weekly (day, start, end) schedules"""
+        doctor = _make_user(db, models.Doctor, "doctor", email, name, **fields)
+        for day, start_time, end_time in schedules:
+            db.add(models.DoctorSchedule(
+                doctor_id=doctor.doctor_id, day=day, start_time=start_time, end_time=end_time, is_available=True
+            ))
+        db.commit()
+        return doctor
+    return make
+
+
+@pytest.fixture
+def make_patient(db):
+    def make(email="patient@example.com", name="Patient Test", **fields):
+        return _make_user(db, models.Patient, "patient", email, name, **fields)
+    return make
+
+
+@pytest.fixture
+def make_admin(db):
+    def make(email="admin@example.com", name="Admin Test"):
+        return _make_user(db, models.Admin, "admin", email, name)
+    return make
+
+
+def auth_cookies(email):
+    """Cookies of a logged in user"""
+    return {"access_token": create_access_token(data={"sub": email})}
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import date, datetime, time
+
+import pytest
+
+from app import crud, models
+from app.database import AsyncSessionLocal, async_engine
+
+
+pytestmark = pytest.mark.skipif(async_engine is None, reason="async database driver is not installed")
+
+MONDAY = date(2030, 1, 7)
+
+
+def run(coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            # Pooled connections belong to this event loop
+            await async_engine.dispose()
+    return asyncio.run(main())
+
+
+async def _lookups(email, user_id):
+    async with AsyncSessionLocal() as db:
+        user = await crud.get_user_by_email_async(db, email)
+        doctor = await crud.get_doctor_by_user_id_async(db, user_id)
+        return user.email, doctor.name
+
+
+async def _slots(doctor_id, day):
+    async with AsyncSessionLocal() as db:
+        return await crud.get_available_slots_async(db, doctor_id, day)
+
+
+def test_async_lookups(make_doctor):
+    doctor = make_doctor(email="async@example.com", name="Dr Async")
+    assert run(_lookups("async@example.com", doctor.user_id)) == ("async@example.com", "Dr Async")
+
+
+def test_async_slots_match_sync(db, make_doctor, make_patient):
+    doctor = make_doctor(schedules=[("monday", time(9, 0), time(11, 0))])
+    patient = make_patient()
+    db.add(models.Appointment(
+        patient_id=patient.patient_id, doctor_id=doctor.doctor_id,
+        appointment_time=datetime.combine(MONDAY, time(9, 30)), duration_minutes=30,
+    ))
+    db.commit()
+
+    async_slots = run(_slots(doctor.doctor_id, MONDAY))
+    assert async_slots == crud.get_available_slots(db, doctor.doctor_id, MONDAY)
+    assert [start.time() for start, _ in async_slots] == [time(9, 0), time(10, 0), time(10, 30)]
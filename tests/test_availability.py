@@ -0,0 +1,115 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func, select
+
+from app import availability, availability_horizon, crud, models, schemas
+from app.database import engine
+
+MONDAY = date(2030, 1, 7)
+TUESDAY = MONDAY + timedelta(days=1)
+
+
+def _starts(slots):
+    return [start.time() for start, _ in slots]
+
+
+def _night_doctor(make_doctor, **fields):
+    return make_doctor(
+        schedules=[("monday", time(22, 0), time(23, 30)), ("tuesday", time(0, 0), time(2, 0))], **fields
+    )
+
+
+def _book_late(db, doctor, patient, day):
+    # 23:00 for 90 minutes ends at 00:30 the next day
+    crud.create_appointment(db, schemas.AppointmentCreate(
+        patient_id=patient.patient_id, doctor_id=doctor.doctor_id,
+        appointment_time=datetime.combine(day, time(23, 0)), duration_minutes=90,
+    ))
+
+
+def test_bookings_are_split_at_midnight():
+    start = datetime.combine(MONDAY, time(23, 0))
+    assert availability.bookings_by_day([(start, 90)]) == {
+        MONDAY: [(start, 90)],
+        TUESDAY: [(datetime.combine(TUESDAY, time.min), 30)],
+    }
+    assert availability.covered_days(datetime.combine(MONDAY, time(22, 0)), 120) == [MONDAY]
+
+
+def test_booking_past_midnight_blocks_the_next_morning(db, make_doctor, make_patient):
+    doctor = _night_doctor(make_doctor)
+    _book_late(db, doctor, make_patient(), MONDAY)
+
+    assert _starts(crud.get_available_slots(db, doctor.doctor_id, MONDAY)) == [time(22, 0), time(22, 30)]
+    assert _starts(crud.get_available_slots(db, doctor.doctor_id, TUESDAY)) == [
+        time(0, 30), time(1, 0), time(1, 30)
+    ]
+
+
+def test_first_available_skips_slots_under_a_booking_from_the_day_before(db, make_doctor, make_patient):
+    specialization = models.Specialization(name="Night clinic")
+    db.add(specialization)
+    db.commit()
+    doctor = _night_doctor(make_doctor, specialization_id=specialization.specialization_id)
+    _book_late(db, doctor, make_patient(), MONDAY)
+
+    slots = crud.get_first_available_slots(
+        db, specialization.specialization_id, datetime.combine(TUESDAY, time.min), limit=1
+    )
+    assert [start for start, _, _, _ in slots] == [datetime.combine(TUESDAY, time(0, 30))]
+
+
+def test_materialized_next_day_goes_stale(db, make_doctor, make_patient):
+    doctor = _night_doctor(make_doctor)
+    monday = date.today() + timedelta(days=7 - date.today().weekday())
+    tuesday = monday + timedelta(days=1)
+    with engine.begin() as connection:
+        availability_horizon.extend(connection, date.today())
+    availability_horizon.refresh_stale(limit=10000)
+
+    _book_late(db, doctor, make_patient(), monday)
+
+    assert _starts(crud.get_available_slots(db, doctor.doctor_id, tuesday)) == [
+        time(0, 30), time(1, 0), time(1, 30)
+    ]
+
+
+def _stale_days(db):
+    return db.scalar(
+        select(func.count()).select_from(models.AvailabilityDay).where(models.AvailabilityDay.is_stale == True)
+    )
+
+
+def test_full_refresh_continues_past_a_batch_that_lost_every_row(db, make_doctor, monkeypatch):
+    doctor = make_doctor(schedules=[("monday", time(9, 0), time(10, 0))])
+    with engine.begin() as connection:
+        availability_horizon.extend(connection, date.today())
+    compute = availability_horizon.compute
+    calls = []
+
+    def compute_during_a_write(connection, doctor_id, days):
+        if not calls:
+            # Every row read by the first batch changes before it is stored
+            with engine.begin() as writer:
+                availability_horizon.mark_stale(writer, {doctor_id: set()})
+        calls.append(len(days))
+        return compute(connection, doctor_id, days)
+
+    monkeypatch.setattr(availability_horizon, "compute", compute_during_a_write)
+    stored = availability_horizon.refresh_all()
+
+    assert calls[0] == availability_horizon.AVAILABILITY_HORIZON_DAYS
+    assert stored == availability_horizon.AVAILABILITY_HORIZON_DAYS
+    assert _stale_days(db) == 0
+
+
+def test_full_refresh_gives_up_without_progress(monkeypatch):
+    passes = []
+
+    def refresh_stale(limit):
+        passes.append(limit)
+        return 10, 0
+
+    monkeypatch.setattr(availability_horizon, "refresh_stale", refresh_stale)
+    assert availability_horizon.refresh_all() == 0
+    assert len(passes) == availability_horizon.MAX_IDLE_PASSES
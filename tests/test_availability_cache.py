@@ -0,0 +1,58 @@
+from datetime import date, datetime, time
+
+import pytest
+from sqlalchemy import func, select
+
+from app import availability_cache, crud, models, schemas
+
+MONDAY = date(2030, 1, 7)
+
+
+def _count(db, model):
+    return db.scalar(select(func.count()).select_from(model))
+
+
+def _starts(slots):
+    return [start.time() for start, _ in slots]
+
+
+@pytest.fixture
+def doctor(make_doctor):
+    return make_doctor(schedules=[("monday", time(9, 0), time(10, 0))])
+
+
+def test_repeat_lookups_hit_the_cache(db, doctor):
+    before = availability_cache.counters.snapshot()["hits"]
+    first = crud.get_available_slots(db, doctor.doctor_id, MONDAY)
+    assert crud.get_available_slots(db, doctor.doctor_id, MONDAY) == first
+    assert availability_cache.counters.snapshot()["hits"] == before + 1
+
+
+def test_lookup_inside_unit_of_work_sees_its_writes_and_commits_nothing(db, doctor, make_patient):
+    patient = make_patient()
+    crud.get_available_slots(db, doctor.doctor_id, MONDAY)
+
+    with pytest.raises(RuntimeError):
+        with crud.unit_of_work(db):
+            crud.create_appointment(db, schemas.AppointmentCreate(
+                patient_id=patient.patient_id, doctor_id=doctor.doctor_id,
+                appointment_time=datetime.combine(MONDAY, time(9, 0)),
+            ))
+            assert _starts(crud.get_available_slots(db, doctor.doctor_id, MONDAY)) == [time(9, 30)]
+            raise RuntimeError("billing failed")
+
+    assert _count(db, models.Appointment) == 0
+    assert _starts(crud.get_available_slots(db, doctor.doctor_id, MONDAY)) == [time(9, 0), time(9, 30)]
+
+
+def test_lookup_leaves_pending_changes_uncommitted(db, doctor, make_patient):
+    patient = make_patient()
+    db.add(models.Notification(user_id=patient.user_id, title="Draft", message="Not committed"))
+    crud.get_available_slots(db, doctor.doctor_id, MONDAY)
+    db.rollback()
+    assert _count(db, models.Notification) == 0
+
+
+def test_flight_locks_are_bounded():
+    locks = {id(availability_cache._flight(doctor_id)) for doctor_id in range(10000)}
+    assert len(locks) == availability_cache.FLIGHT_STRIPES
@@ -0,0 +1,74 @@
+import random
+import time as clock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func, select
+
+from app import availability_horizon, crud, models, reservations, schemas
+from app.database import SessionLocal, engine
+
+MONDAY = date(2030, 1, 7)
+BOOKINGS = 400
+THREADS = 16
+
+
+def _book(doctor_id, patient_ids, start):
+    db = SessionLocal()
+    try:
+        crud.create_appointment(db, schemas.AppointmentCreate(
+            patient_id=random.choice(patient_ids), doctor_id=doctor_id, appointment_time=start,
+        ))
+        return True
+    except reservations.SlotUnavailableError:
+        return False
+    finally:
+        db.close()
+
+
+def test_parallel_bookings_never_overlap(db, make_doctor, make_patient):
+    doctor = make_doctor(schedules=[("monday", time(9, 0), time(17, 0))])
+    patient_ids = [make_patient(email=f"patient{i}@example.com").patient_id for i in range(20)]
+    # 30 minute bookings on a 15 minute grid, so most attempts partly overlap another
+    rng = random.Random(21)
+    starts = [
+        datetime.combine(MONDAY, time(9, 0)) + timedelta(minutes=15 * rng.randrange(31))
+        for _ in range(BOOKINGS)
+    ]
+
+    began = clock.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        results = list(pool.map(lambda start: _book(doctor.doctor_id, patient_ids, start), starts))
+    elapsed = clock.perf_counter() - began
+    booked = sum(results)
+    print(f"\n{BOOKINGS} parallel bookings on {engine.dialect.name} in {elapsed:.2f} s "
+          f"({BOOKINGS / elapsed:.0f}/s): {booked} booked, {BOOKINGS - booked} rejected")
+
+    appointments = db.execute(
+        select(models.Appointment.appointment_time, models.Appointment.duration_minutes)
+        .where(models.Appointment.doctor_id == doctor.doctor_id)
+        .order_by(models.Appointment.appointment_time)
+    ).all()
+    assert len(appointments) == booked
+    for previous, current in zip(appointments, appointments[1:]):
+        assert previous.appointment_time + timedelta(minutes=previous.duration_minutes) <= current.appointment_time
+    # 16 half hours in the schedule, and at least 8 fit whatever the order
+    assert 8 <= booked <= 16
+    assert db.scalar(select(func.count()).select_from(models.SlotReservation)) == booked * 6
+
+
+def test_past_reservations_are_pruned(db, make_doctor, make_patient):
+    doctor = make_doctor()
+    patient = make_patient()
+    for day in (MONDAY - timedelta(days=1), MONDAY):
+        crud.create_appointment(db, schemas.AppointmentCreate(
+            patient_id=patient.patient_id, doctor_id=doctor.doctor_id,
+            appointment_time=datetime.combine(day, time(9, 0)),
+        ))
+
+    with engine.begin() as connection:
+        availability_horizon.extend(connection, MONDAY)
+
+    kept = db.scalars(select(models.SlotReservation.slot_start)).all()
+    assert len(kept) == 6
+    assert all(slot_start.date() == MONDAY for slot_start in kept)
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import crud, schemas
+from app.query_stats import count_queries
+from conftest import auth_cookies
+from main import app
+
+
+@pytest.fixture
+def client(make_doctor):
+    return TestClient(app, cookies=auth_cookies(make_doctor().user.email))
+
+
+@pytest.mark.parametrize("month, previous_month, next_month", [
+    ("2030-01", "2029-12", "2030-02"),
+    ("0001-02", "0001-01", "0001-03"),
+    ("9999-11", "9999-10", "9999-12"),
+])
+def test_calendar_links_neighbouring_months(client, month, previous_month, next_month):
+    response = client.get("/api/doctors/calendar", params={"month": month})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["month"], body["previous_month"], body["next_month"]) == (month, previous_month, next_month)
+
+
+@pytest.mark.parametrize("month", ["0001-01", "9999-12", "2030-13", "soon"])
+def test_calendar_rejects_months_out_of_range(client, month):
+    assert client.get("/api/doctors/calendar", params={"month": month}).status_code == 400
+
+
+@pytest.mark.parametrize("month", ["0001-01", "9999-12"])
+def test_calendar_page_falls_back_to_this_month(client, month):
+    assert client.get("/doctors/calendar", params={"month": month}).status_code == 200
+
+
+def _selects(stats):
+    return [statement for statement in stats.fingerprints if statement.lstrip().upper().startswith("SELECT")]
+
+
+def test_calendar_groups_the_months_appointments_by_day_in_one_query(db, make_doctor, make_patient):
+    doctor = make_doctor()
+    other_doctor = make_doctor(email="other@example.com")
+    alice = make_patient(email="alice@example.com", name="Alice")
+    bob = make_patient(email="bob@example.com", name="Bob")
+    for doctor_id, patient, when in [
+        (doctor.doctor_id, alice, datetime(2030, 1, 7, 9, 0)),
+        (doctor.doctor_id, bob, datetime(2030, 1, 7, 10, 0)),
+        (doctor.doctor_id, bob, datetime(2030, 1, 31, 23, 0)),
+        (doctor.doctor_id, alice, datetime(2030, 2, 1, 9, 0)),
+        (other_doctor.doctor_id, alice, datetime(2030, 1, 8, 9, 0)),
+    ]:
+        crud.create_appointment(db, schemas.AppointmentCreate(
+            patient_id=patient.patient_id, doctor_id=doctor_id, appointment_time=when,
+        ))
+    client = TestClient(app, cookies=auth_cookies(doctor.user.email))
+    # Load the logged in doctor into the principal cache first
+    client.get("/api/doctors/calendar", params={"month": "2029-12"})
+
+    with count_queries() as stats:
+        response = client.get("/api/doctors/calendar", params={"month": "2030-01"})
+
+    days = response.json()["days"]
+    assert list(days) == ["2030-01-07", "2030-01-31"]
+    assert [(a["appointment_time"], a["patient_name"]) for a in days["2030-01-07"]] == [
+        ("2030-01-07T09:00:00", "Alice"), ("2030-01-07T10:00:00", "Bob")
+    ]
+    assert [a["patient_name"] for a in days["2030-01-31"]] == ["Bob"]
+    assert len(_selects(stats)) == 1
+    assert stats.count == 1
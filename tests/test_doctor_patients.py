@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import crud, doctor_patients, schemas
+from app.cache import LocalInvalidationChannel, TTLCache
+from conftest import auth_cookies
+from main import app
+
+START = datetime(2030, 1, 7, 9, 0)
+
+
+@pytest.fixture
+def cached(monkeypatch):
+    # Access checks cached as with Redis configured, and a second worker's
+    # cache listening on the same channel
+    monkeypatch.setattr(doctor_patients, "DOCTOR_PATIENT_CACHE_TTL", 300)
+    channel = LocalInvalidationChannel()
+    channel.subscribe(doctor_patients._on_invalidation)
+    other_worker = TTLCache(ttl=300)
+    channel.subscribe(lambda message: other_worker.delete(tuple(map(int, message.split(":")))))
+    monkeypatch.setattr(doctor_patients, "invalidation_channel", channel)
+    return other_worker
+
+
+def _book(db, doctor, patient, hours=0):
+    return crud.create_appointment(db, schemas.AppointmentCreate(
+        patient_id=patient.patient_id, doctor_id=doctor.doctor_id, appointment_time=START + timedelta(hours=hours),
+    ))
+
+
+def _records(doctor, patient):
+    client = TestClient(app, cookies=auth_cookies(doctor.user.email))
+    return client.get("/api/health-records", params={"patient_id": patient.patient_id})
+
+
+def test_booking_grants_access(db, make_doctor, make_patient):
+    doctor, patient = make_doctor(), make_patient()
+    assert _records(doctor, patient).status_code == 403
+    _book(db, doctor, patient)
+    assert _records(doctor, patient).status_code == 200
+
+
+def test_deleting_the_last_appointment_revokes_access(db, cached, make_doctor, make_patient):
+    doctor, patient = make_doctor(), make_patient()
+    first = _book(db, doctor, patient)
+    second = _book(db, doctor, patient, hours=1)
+    assert _records(doctor, patient).status_code == 200
+
+    crud.delete_appointment(db, first.appointment_id)
+    assert _records(doctor, patient).status_code == 200
+
+    key = (doctor.doctor_id, patient.patient_id)
+    cached.set(key, True)
+    crud.delete_appointment(db, second.appointment_id)
+    assert cached.get(key) is None
+    assert doctor_patients.access_cache.get(key) is None
+    assert _records(doctor, patient).status_code == 403
+
+
+def test_commit_evicts_access_cached_before_it(db, cached, make_doctor, make_patient):
+    doctor, patient = make_doctor(), make_patient()
+    appointment = _book(db, doctor, patient)
+    key = (doctor.doctor_id, patient.patient_id)
+
+    with crud.unit_of_work(db):
+        crud.delete_appointment(db, appointment.appointment_id)
+        # A concurrent check still sees the committed pair and caches it again
+        doctor_patients.access_cache.set(key, True)
+        cached.set(key, True)
+
+    assert doctor_patients.access_cache.get(key) is None
+    assert cached.get(key) is None
+    assert _records(doctor, patient).status_code == 403
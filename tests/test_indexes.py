@@ -0,0 +1,154 @@
+import os
+import re
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, inspect, select, text
+
+from app import availability_horizon, crud, migrations, models
+from app.database import engine
+from conftest import TEST_DATA_DIR
+
+MONDAY = date(2030, 1, 7)
+
+
+@contextmanager
+def selects():
+    """SELECT statements and parameters sent to the primary inside the block"""
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def index_used(connection, statement, parameters, table):
+    """Index the database looks `table` up with for this statement, None for a full scan"""
+    if connection.dialect.name == "sqlite":
+        plan = [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+        for detail in plan:
+            match = re.match(rf"SEARCH {table}(?: AS \w+)? USING (?:COVERING )?INDEX (\w+)", detail)
+            if match:
+                return match.group(1)
+        return None
+    for row in connection.exec_driver_sql("EXPLAIN " + statement, parameters).mappings():
+        if row["table"] == table and row["type"] != "ALL":
+            return row["key"]
+    return None
+
+
+@pytest.fixture
+def seeded(db, make_doctor, make_patient):
+    doctor = make_doctor(schedules=[("monday", time(9, 0), time(17, 0))])
+    patient = make_patient()
+    for offset in range(40):
+        db.add(models.Appointment(
+            patient_id=patient.patient_id,
+            doctor_id=doctor.doctor_id,
+            appointment_time=datetime.combine(MONDAY, time(9, 0)) + timedelta(days=offset),
+        ))
+    db.commit()
+    return doctor, patient
+
+
+CASES = [
+    (
+        "patient dashboard appointments",
+        lambda db, doctor, patient: crud.get_patient_appointments(db, patient.patient_id),
+        "appointments", "ix_appointments_patient_id_appointment_time",
+    ),
+    (
+        "doctor dashboard appointments",
+        lambda db, doctor, patient: crud.get_doctor_appointments(db, doctor.doctor_id),
+        "appointments", "ix_appointments_doctor_id_appointment_time",
+    ),
+    (
+        "doctor health records",
+        lambda db, doctor, patient: crud.get_health_record_rows(db, doctor_id=doctor.doctor_id),
+        "health_records", "ix_health_records_doctor_id_created_at",
+    ),
+    (
+        "feedback of an appointment",
+        lambda db, doctor, patient: crud.get_feedback_by_appointment_id(db, 1),
+        "feedbacks", "ix_feedbacks_appointment_id",
+    ),
+    (
+        "notifications of a user",
+        lambda db, doctor, patient: crud.get_user_notifications(db, patient.user_id),
+        "notifications", "ix_notifications_user_id_is_read",
+    ),
+    (
+        "appointments by status",
+        lambda db, doctor, patient: db.query(models.Appointment).filter(
+            models.Appointment.status == models.AppointmentStatus.cancelled
+        ).all(),
+        "appointments", "ix_appointments_status",
+    ),
+    (
+        "slot schedules",
+        lambda db, doctor, patient: availability_horizon.compute(db, doctor.doctor_id, [MONDAY]),
+        "doctor_schedules", "ix_doctor_schedules_doctor_id_day",
+    ),
+    (
+        "slot bookings",
+        lambda db, doctor, patient: availability_horizon.compute(db, doctor.doctor_id, [MONDAY]),
+        "appointments", "ix_appointments_doctor_id_appointment_time",
+    ),
+    (
+        "slot exceptions",
+        lambda db, doctor, patient: availability_horizon.compute(db, doctor.doctor_id, [MONDAY]),
+        "schedule_exceptions", "ix_schedule_exceptions_doctor_id_date",
+    ),
+]
+
+
+@pytest.mark.parametrize("name, call, table, index", CASES, ids=[case[0] for case in CASES])
+def test_query_uses_index(db, seeded, name, call, table, index):
+    with selects() as statements:
+        call(db, *seeded)
+    statements = [(statement, parameters) for statement, parameters in statements
+                  if re.search(rf"\bFROM {table}\b", statement)]
+    assert statements, f"no query on {table}"
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            assert index_used(connection, statement, parameters, table) == index, statement
+
+
+@pytest.mark.skipif(engine.dialect.name != "sqlite", reason="builds its own SQLite database")
+def test_migrations_add_indexes_to_existing_tables():
+    path = os.path.join(TEST_DATA_DIR, "before-migrations.db")
+    if os.path.exists(path):
+        os.remove(path)
+    old = create_engine(f"sqlite:///{path}")
+    # Tables as create_all left them before the migrations existed
+    models.Base.metadata.create_all(old)
+    added = {name for _, name in _migration_indexes()}
+    with old.begin() as connection:
+        for name in added:
+            connection.execute(text(f"DROP INDEX {name}"))
+
+    assert migrations.upgrade(old) == migrations.latest_version()
+    for table, name in _migration_indexes():
+        assert name in {index["name"] for index in inspect(old).get_indexes(table)}
+    # Rerunning is a no-op
+    assert migrations.upgrade(old) == migrations.latest_version()
+    old.dispose()
+
+
+def _migration_indexes():
+    return [
+        ("appointments", "ix_appointments_doctor_id_appointment_time"),
+        ("appointments", "ix_appointments_patient_id_appointment_time"),
+        ("appointments", "ix_appointments_status"),
+        ("health_records", "ix_health_records_doctor_id_created_at"),
+        ("feedbacks", "ix_feedbacks_appointment_id"),
+        ("notifications", "ix_notifications_user_id_is_read"),
+        ("doctor_schedules", "ix_doctor_schedules_doctor_id_day"),
+    ]
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine
+
+from app import init_db, migrations
+from conftest import TEST_DATA_DIR
+
+
+@pytest.fixture
+def empty_engine(monkeypatch):
+    path = os.path.join(TEST_DATA_DIR, "empty.db")
+    if os.path.exists(path):
+        os.remove(path)
+    empty = create_engine(f"sqlite:///{path}")
+    monkeypatch.setattr(init_db, "engine", empty)
+    yield empty
+    empty.dispose()
+
+
+def test_startup_refuses_pending_migrations(empty_engine, monkeypatch):
+    monkeypatch.setattr(init_db, "AUTO_MIGRATE", False)
+    with pytest.raises(RuntimeError, match="python -m app.init_db migrate"):
+        init_db.check_schema()
+
+
+def test_startup_passes_once_migrated(empty_engine):
+    init_db.migrate()
+    assert init_db.check_schema() == migrations.latest_version()
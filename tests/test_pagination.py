@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models
+from app.pagination import NEXT_CURSOR_HEADER
+from conftest import auth_cookies
+from main import app
+
+START = datetime(2030, 1, 7, 9, 0)
+
+
+@pytest.fixture
+def client(make_admin):
+    return TestClient(app, cookies=auth_cookies(make_admin().user.email))
+
+
+@pytest.fixture
+def appointment_ids(db, make_doctor, make_patient):
+    doctor = make_doctor()
+    patient = make_patient()
+    # Ten appointments on three start times, so pages split ties on appointment_time
+    appointments = [
+        models.Appointment(
+            patient_id=patient.patient_id, doctor_id=doctor.doctor_id,
+            appointment_time=START + timedelta(hours=i % 3), duration_minutes=30,
+        )
+        for i in range(10)
+    ]
+    db.add_all(appointments)
+    db.commit()
+    return [
+        appointment.appointment_id
+        for appointment in sorted(appointments, key=lambda a: (a.appointment_time, a.appointment_id))
+    ]
+
+
+def test_cursor_pages_have_no_gaps_or_duplicates(client, appointment_ids):
+    seen, pages = [], 0
+    params = {"limit": 3}
+    while True:
+        response = client.get("/api/appointments", params=params)
+        assert response.status_code == 200
+        seen.extend(appointment["appointment_id"] for appointment in response.json())
+        pages += 1
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+        params = {"limit": 3, "cursor": cursor}
+    assert seen == appointment_ids
+    assert pages == 4
+
+
+def test_last_full_page_leads_to_an_empty_one(client, appointment_ids):
+    response = client.get("/api/appointments", params={"limit": 5})
+    response = client.get("/api/appointments", params={"limit": 5, "cursor": response.headers[NEXT_CURSOR_HEADER]})
+    assert [appointment["appointment_id"] for appointment in response.json()] == appointment_ids[5:]
+    response = client.get("/api/appointments", params={"limit": 5, "cursor": response.headers[NEXT_CURSOR_HEADER]})
+    assert response.json() == []
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "e30", "WzFd"])
+def test_malformed_cursor_is_rejected(client, appointment_ids, cursor):
+    # "e30" is {} and "WzFd" is [1], valid JSON but not a cursor of two values
+    assert client.get("/api/appointments", params={"cursor": cursor}).status_code == 400
+
+
+def test_skip_still_pages_without_a_cursor(client, appointment_ids):
+    response = client.get("/api/appointments", params={"skip": 4, "limit": 3})
+    assert [appointment["appointment_id"] for appointment in response.json()] == appointment_ids[4:7]
@@ -0,0 +1,86 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app import crud, models, schemas
+from app.database import SessionLocal
+from app.dependencies import get_current_active_user
+from app.principal_cache import invalidate_user, principal_cache
+from app.query_stats import count_queries
+from conftest import auth_cookies
+
+# A route that runs no queries of its own, so every statement comes from get_current_user
+probe = FastAPI()
+
+
+@probe.get("/whoami")
+def whoami(current_user: models.User = Depends(get_current_active_user)):
+    return {"user_id": current_user.user_id, "email": current_user.email, "name": current_user.patient.name}
+
+
+def _whoami(email):
+    return TestClient(probe, cookies=auth_cookies(email)).get("/whoami")
+
+
+def _selects(stats):
+    return [statement for statement in stats.fingerprints if statement.lstrip().upper().startswith("SELECT")]
+
+
+@pytest.fixture
+def patient(make_patient):
+    patient = make_patient()
+    # Warm the cache
+    assert _whoami(patient.user.email).status_code == 200
+    return patient
+
+
+def _update_user(user_id, **fields):
+    db = SessionLocal()
+    try:
+        crud.update_user(db, user_id, schemas.UserUpdate(**fields))
+    finally:
+        db.close()
+
+
+def test_warm_cache_hit_runs_no_select(patient):
+    with count_queries() as stats:
+        response = _whoami(patient.user.email)
+    assert response.json() == {"user_id": patient.user_id, "email": patient.user.email, "name": patient.name}
+    assert _selects(stats) == []
+
+
+def test_deactivation_locks_out_the_next_request(patient):
+    _update_user(patient.user_id, is_active=False)
+    response = _whoami(patient.user.email)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Inactive user"
+
+
+def test_email_change_evicts_old_and_new_keys(patient):
+    old_email, new_email = patient.user.email, "renamed@example.com"
+    # A stale entry left under the new address, e.g. by a deleted account that used it
+    principal_cache.set(new_email, principal_cache.get(old_email))
+
+    _update_user(patient.user_id, email=new_email)
+
+    assert principal_cache.get(old_email) is None
+    assert principal_cache.get(new_email) is None
+    assert _whoami(old_email).status_code == 401
+    assert _whoami(new_email).json()["email"] == new_email
+
+
+def test_commit_evicts_a_row_recached_before_it(patient):
+    db = SessionLocal()
+    try:
+        user = db.get(models.User, patient.user_id)
+        user.is_active = False
+        invalidate_user(db, user.email)
+        # A concurrent request still reads the committed, active row and caches it again
+        assert _whoami(patient.user.email).status_code == 200
+        assert principal_cache.get(patient.user.email) is not None
+        db.commit()
+    finally:
+        db.close()
+
+    assert principal_cache.get(patient.user.email) is None
+    assert _whoami(patient.user.email).status_code == 400
@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.database import engine
+from app.query_stats import QueryStats, _current, fingerprint
+
+
+@pytest.mark.parametrize("statements", [
+    ["SELECT * FROM t WHERE id IN (?)", "SELECT * FROM t WHERE id IN (?, ?, ?)"],
+    ["SELECT * FROM t WHERE id IN (%s)", "SELECT * FROM t WHERE id IN (%s, %s, %s)"],
+    [
+        "SELECT * FROM t WHERE id IN (%(id_1_1)s)",
+        "SELECT * FROM t WHERE id IN (%(id_1_1)s, %(id_1_2)s, %(id_1_3)s)",
+    ],
+    ["SELECT * FROM t WHERE name = 'a' AND n = 1", "SELECT * FROM t WHERE name = 'b' AND n = 22"],
+])
+def test_fingerprint_groups_repeats(statements):
+    assert len({fingerprint(statement) for statement in statements}) == 1
+
+
+def test_failed_statement_keeps_timing_intact():
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        with engine.connect() as connection:
+            with pytest.raises(DBAPIError):
+                connection.execute(text("SELECT * FROM no_such_table"))
+            connection.rollback()
+            connection.execute(text("SELECT 1"))
+            assert "query_start" not in connection.info
+    finally:
+        _current.reset(token)
+    assert stats.count == 1
+    assert 0 <= stats.duration < 1
@@ -0,0 +1,72 @@
+import os
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+from app import crud, database, models
+from conftest import TEST_DATA_DIR
+
+
+# Nothing replicates between the two files, so a read finds the row only on the primary
+@pytest.fixture
+def replica(monkeypatch):
+    replica_engine = create_engine(f"sqlite:///{os.path.join(TEST_DATA_DIR, 'replica.db')}")
+    models.Base.metadata.drop_all(replica_engine)
+    models.Base.metadata.create_all(replica_engine)
+    monkeypatch.setattr(database, "replica_engines", [replica_engine])
+    monkeypatch.setattr(database, "READ_YOUR_WRITES_SECONDS", 0.2)
+    monkeypatch.setattr(database, "_primary_until", {})
+    yield replica_engine
+    replica_engine.dispose()
+
+
+def _on_primary(user_id, email="patient@example.com"):
+    db = database.SessionLocal()
+    try:
+        if user_id is not None:
+            database.set_session_user(db, user_id)
+        return crud.get_user_by_email(db, email) is not None
+    finally:
+        db.close()
+
+
+def _write(user_id):
+    db = database.SessionLocal()
+    try:
+        database.set_session_user(db, user_id)
+        db.add(models.Notification(user_id=user_id, title="Booked", message="Booked"))
+        db.flush()
+        # Reads inside the write transaction see its writes
+        assert crud.get_user_by_email(db, "patient@example.com") is not None
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_reads_go_to_the_replica(replica, make_patient):
+    make_patient()
+    assert not _on_primary(None)
+
+
+def test_writer_reads_stay_on_primary_for_a_while(replica, make_patient):
+    patient = make_patient()
+    other = make_patient(email="other@example.com")
+    _write(patient.user_id)
+
+    assert _on_primary(patient.user_id)
+    assert not _on_primary(other.user_id)
+    time.sleep(0.3)
+    assert not _on_primary(patient.user_id)
+
+
+def test_rolled_back_writes_do_not_pin(replica, make_patient):
+    patient = make_patient()
+    db = database.SessionLocal()
+    database.set_session_user(db, patient.user_id)
+    db.add(models.Notification(user_id=patient.user_id, title="Booked", message="Booked"))
+    db.flush()
+    db.rollback()
+    db.close()
+
+    assert not _on_primary(patient.user_id)
@@ -0,0 +1,40 @@
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models
+from conftest import auth_cookies
+from main import app
+
+
+@pytest.fixture
+def doctor(db, make_doctor):
+    doctor = make_doctor()
+    db.add(models.ScheduleException(doctor_id=doctor.doctor_id, date=date(2030, 1, 7), reason="Surgery"))
+    db.commit()
+    return doctor
+
+
+def _read(email, doctor):
+    client = TestClient(app, cookies=auth_cookies(email))
+    return client.get(f"/api/doctors/{doctor.doctor_id}/schedule/exceptions")
+
+
+def test_doctor_reads_own_exceptions(doctor):
+    response = _read(doctor.user.email, doctor)
+    assert response.status_code == 200
+    assert [exception["reason"] for exception in response.json()] == ["Surgery"]
+
+
+def test_admin_reads_any_doctors_exceptions(db, doctor):
+    admin = models.User(email="admin@example.com", password_hash="not-a-hash", role="admin")
+    db.add(admin)
+    db.commit()
+    assert _read(admin.email, doctor).status_code == 200
+
+
+def test_others_cannot_read_exceptions(doctor, make_doctor, make_patient):
+    other = make_doctor(email="other@example.com")
+    assert _read(other.user.email, doctor).status_code == 403
+    assert _read(make_patient().user.email, doctor).status_code == 403
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from app import models, schemas
+from conftest import auth_cookies
+from main import app
+
+START = datetime(2030, 1, 7, 9, 0)
+
+
+@pytest.fixture
+def client(make_admin):
+    return TestClient(app, cookies=auth_cookies(make_admin().user.email))
+
+
+@pytest.fixture
+def rows(db, make_doctor, make_patient):
+    doctor = make_doctor()
+    patient = make_patient()
+    appointments = [
+        models.Appointment(
+            patient_id=patient.patient_id, doctor_id=doctor.doctor_id, status=status,
+            appointment_time=START + timedelta(hours=i), duration_minutes=30,
+            reason="Checkup" if i % 2 else None,
+        )
+        for i, status in enumerate(models.AppointmentStatus)
+    ]
+    db.add_all(appointments)
+    db.flush()
+    db.add_all(
+        models.HealthRecord(
+            patient_id=patient.patient_id, doctor_id=doctor.doctor_id, appointment_id=appointment.appointment_id,
+            symptoms="Cough", diagnosis=None, notes="Rest" if i % 2 else None,
+        )
+        for i, appointment in enumerate(appointments)
+    )
+    db.add_all(
+        models.Billing(
+            patient_id=patient.patient_id, appointment_id=appointment.appointment_id,
+            amount=50 + i + 0.25, status=status, payment_method="card" if i % 2 else None,
+        )
+        for i, (appointment, status) in enumerate(zip(appointments, models.BillingStatus))
+    )
+    db.commit()
+
+
+def _response_model_output(schema, objects):
+    # What FastAPI returns for response_model=List[schema] from ORM objects
+    return jsonable_encoder([schema.model_validate(obj) for obj in objects])
+
+
+@pytest.mark.parametrize("path, model, response_schema, order", [
+    ("/api/appointments", models.Appointment, schemas.AppointmentResponse,
+     (models.Appointment.appointment_time, models.Appointment.appointment_id)),
+    ("/api/health-records", models.HealthRecord, schemas.HealthRecordResponse,
+     (models.HealthRecord.created_at, models.HealthRecord.record_id)),
+    ("/api/billing", models.Billing, schemas.BillingResponse, (models.Billing.billing_id,)),
+])
+def test_fast_path_matches_response_model(db, client, rows, path, model, response_schema, order):
+    response = client.get(path)
+    assert response.status_code == 200
+    expected = _response_model_output(response_schema, db.query(model).order_by(*order).all())
+    assert len(expected) >= 4
+    assert response.json() == expected
+
+
+def test_enum_status_is_its_value(client, rows):
+    statuses = [appointment["status"] for appointment in client.get("/api/appointments").json()]
+    assert statuses == [status.value for status in models.AppointmentStatus]
+    statuses = [billing["status"] for billing in client.get("/api/billing").json()]
+    assert statuses == [status.value for status in models.BillingStatus]
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func, select
+
+from app import crud, models, schemas
+from app.database import engine
+from conftest import auth_cookies
+from main import app
+
+
+@pytest.fixture
+def commits():
+    counted = []
+
+    def on_commit(connection):
+        counted.append(connection)
+
+    event.listen(engine, "commit", on_commit)
+    yield counted
+    event.remove(engine, "commit", on_commit)
+
+
+def _count(db, model):
+    return db.scalar(select(func.count()).select_from(model))
+
+
+def _book(client, doctor):
+    return client.post(
+        "/patients/appointments/book",
+        data={"doctor_id": doctor.doctor_id, "appointment_date": "2030-01-07", "appointment_time": "10:00"},
+        follow_redirects=False,
+    )
+
+
+def test_booking_commits_once(db, commits, make_doctor, make_patient):
+    doctor = make_doctor()
+    patient = make_patient()
+    client = TestClient(app, cookies=auth_cookies(patient.user.email))
+
+    commits.clear()
+    response = _book(client, doctor)
+    assert response.status_code == 303
+    print(f"\nPOST /patients/appointments/book: {len(commits)} commit(s)")
+    assert len(commits) == 1
+    assert (_count(db, models.Appointment), _count(db, models.Billing), _count(db, models.Notification)) == (1, 1, 1)
+
+
+def test_health_record_commits_once(db, commits, make_doctor, make_patient):
+    doctor = make_doctor()
+    patient = make_patient()
+    appointment = crud.create_appointment(db, schemas.AppointmentCreate(
+        patient_id=patient.patient_id, doctor_id=doctor.doctor_id, appointment_time=datetime(2030, 1, 7, 10, 0),
+    ))
+    client = TestClient(app, cookies=auth_cookies(doctor.user.email))
+
+    commits.clear()
+    response = client.post("/doctors/health-records/create", data={
+        "patient_id": patient.patient_id,
+        "appointment_id": appointment.appointment_id,
+        "diagnosis": "Flu",
+        "prescriptions[0][medication_name]": "A",
+        "prescriptions[1][medication_name]": "B",
+        "prescriptions[2][medication_name]": "C",
+    }, follow_redirects=False)
+    assert response.status_code == 303
+    print(f"\nPOST /doctors/health-records/create (3 prescriptions): {len(commits)} commit(s)")
+    assert len(commits) == 1
+    assert (_count(db, models.HealthRecord), _count(db, models.Prescription)) == (1, 3)
+
+
+def test_failed_booking_writes_nothing(db, monkeypatch, make_doctor, make_patient):
+    doctor = make_doctor()
+    patient = make_patient()
+
+    def fail(db, billing):
+        raise RuntimeError("billing is down")
+
+    monkeypatch.setattr(crud, "create_billing", fail)
+    client = TestClient(app, cookies=auth_cookies(patient.user.email), raise_server_exceptions=False)
+    assert _book(client, doctor).status_code == 500
+    assert (_count(db, models.Appointment), _count(db, models.SlotReservation)) == (0, 0)
@@ -0,0 +1,154 @@
+from datetime import date, time, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app import availability_cache, availability_horizon, models
+from app.database import engine
+from conftest import auth_cookies
+from main import app
+
+
+def _entry(day, start, end, **fields):
+    return {"day": day, "start_time": start, "end_time": end, **fields}
+
+
+def _put_template(email, schedules, path="/api/doctors/schedule/template", **body):
+    client = TestClient(app, cookies=auth_cookies(email))
+    return client.put(path, json={"schedules": schedules, **body})
+
+
+def _week(db, doctor_id):
+    db.expire_all()
+    return db.execute(
+        select(
+            models.DoctorSchedule.schedule_id,
+            models.DoctorSchedule.day,
+            models.DoctorSchedule.start_time,
+            models.DoctorSchedule.end_time,
+        )
+        .where(models.DoctorSchedule.doctor_id == doctor_id)
+        .order_by(models.DoctorSchedule.day, models.DoctorSchedule.start_time)
+    ).all()
+
+
+def _windows(db, doctor_id):
+    return [(row.day, row.start_time, row.end_time) for row in _week(db, doctor_id)]
+
+
+@pytest.fixture
+def doctor(make_doctor):
+    return make_doctor(schedules=[
+        ("monday", time(9, 0), time(12, 0)),
+        ("tuesday", time(9, 0), time(12, 0)),
+        ("wednesday", time(14, 0), time(16, 0)),
+    ])
+
+
+def test_template_keeps_unchanged_rows_and_moves_windows_in_place(db, doctor):
+    before = {(row.day, row.start_time): row.schedule_id for row in _week(db, doctor.doctor_id)}
+
+    response = _put_template(doctor.user.email, [
+        _entry("monday", "09:00", "12:00"),
+        _entry("tuesday", "13:00", "17:00"),
+    ])
+
+    assert response.status_code == 200
+    assert response.json() == {"doctors": 1, "inserted": 0, "updated": 1, "deleted": 1, "unchanged": 1}
+    after = _week(db, doctor.doctor_id)
+    assert [(row.day, row.start_time, row.end_time) for row in after] == [
+        ("monday", time(9, 0), time(12, 0)),
+        ("tuesday", time(13, 0), time(17, 0)),
+    ]
+    assert after[0].schedule_id == before[("monday", time(9, 0))]
+    # The moved window reuses one of the rows it replaces
+    assert after[1].schedule_id in {before[("tuesday", time(9, 0))], before[("wednesday", time(14, 0))]}
+
+
+def test_template_deletes_extra_rows_and_inserts_new_ones(db, doctor):
+    response = _put_template(doctor.user.email, [
+        _entry("monday", "09:00", "12:00"),
+        _entry("monday", "13:00", "15:00", slot_duration_minutes=15),
+        _entry("tuesday", "09:00", "12:00"),
+        _entry("wednesday", "14:00", "16:00"),
+        _entry("friday", "08:00", "10:00"),
+    ])
+    assert response.json() == {"doctors": 1, "inserted": 2, "updated": 0, "deleted": 0, "unchanged": 3}
+
+    response = _put_template(doctor.user.email, [_entry("friday", "08:00", "10:00")])
+    assert response.json() == {"doctors": 1, "inserted": 0, "updated": 0, "deleted": 4, "unchanged": 1}
+    assert _windows(db, doctor.doctor_id) == [("friday", time(8, 0), time(10, 0))]
+
+
+def test_admin_applies_the_template_to_several_doctors(db, doctor, make_doctor, make_admin):
+    other = make_doctor(email="other@example.com", schedules=[("thursday", time(10, 0), time(11, 0))])
+    admin = make_admin()
+    schedules = [_entry("monday", "09:00", "12:00"), _entry("thursday", "10:00", "12:00")]
+
+    response = _put_template(
+        admin.user.email, schedules, path="/api/admins/schedule-template",
+        doctor_ids=[doctor.doctor_id, other.doctor_id],
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"doctors": 2, "inserted": 1, "updated": 2, "deleted": 1, "unchanged": 1}
+    expected = [("monday", time(9, 0), time(12, 0)), ("thursday", time(10, 0), time(12, 0))]
+    assert _windows(db, doctor.doctor_id) == expected
+    assert _windows(db, other.doctor_id) == expected
+
+
+def test_admin_template_rejects_unknown_doctors(db, doctor, make_admin):
+    before = _windows(db, doctor.doctor_id)
+    response = _put_template(
+        make_admin().user.email, [_entry("monday", "09:00", "10:00")], path="/api/admins/schedule-template",
+        doctor_ids=[doctor.doctor_id, doctor.doctor_id + 100],
+    )
+    assert response.status_code == 404
+    assert str(doctor.doctor_id + 100) in response.json()["detail"]
+    assert _windows(db, doctor.doctor_id) == before
+
+
+def test_overlapping_windows_are_rejected(db, doctor):
+    before = _windows(db, doctor.doctor_id)
+    response = _put_template(doctor.user.email, [
+        _entry("monday", "09:00", "12:00"),
+        _entry("monday", "11:00", "13:00"),
+    ])
+    assert response.status_code == 422
+    assert _windows(db, doctor.doctor_id) == before
+
+
+def test_template_change_reaches_cached_and_materialized_availability(db, make_doctor):
+    doctor = make_doctor(schedules=[("monday", time(9, 0), time(10, 0))])
+    today = date.today()
+    monday = today + timedelta(days=7 - today.weekday())
+    with engine.begin() as connection:
+        availability_horizon.extend(connection, today)
+    availability_horizon.refresh_all()
+
+    def monday_slots():
+        client = TestClient(app)
+        response = client.get(
+            f"/api/appointments/doctor/{doctor.doctor_id}/availability",
+            params={"from": monday.isoformat(), "to": monday.isoformat()},
+        )
+        return [slot["start"] for slot in response.json()[monday.isoformat()]]
+
+    # Cache the old week as well
+    assert monday_slots() == ["09:00", "09:30"]
+    assert monday_slots() == ["09:00", "09:30"]
+
+    _put_template(doctor.user.email, [_entry("monday", "14:00", "15:00")])
+
+    assert monday_slots() == ["14:00", "14:30"]
+    stale = db.scalars(
+        select(models.AvailabilityDay.is_stale).where(models.AvailabilityDay.doctor_id == doctor.doctor_id)
+    ).all()
+    assert stale and all(stale)
+
+    availability_horizon.refresh_all()
+    slots = db.scalar(select(models.AvailabilityDay.slots).where(
+        models.AvailabilityDay.doctor_id == doctor.doctor_id, models.AvailabilityDay.day == monday
+    ))
+    assert availability_cache.decode(slots) == [(14 * 60, 14 * 60 + 30), (14 * 60 + 30, 15 * 60)]